@@ -0,0 +1,70 @@
+"""
+Device throughput against micro-batching settings.
+
+Keeps a window of concurrent callers on a single device so pending calls are
+available to batch, and reports items/sec for each max_batch_size/max_wait_us
+pair.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stand_in import stand_in_config
+
+from streamliner.fleet import MultiDeviceFleet
+
+
+def run(batching, calls, window, call_overhead_us, per_item_us):
+    config = stand_in_config(
+        batching=batching, call_overhead_us=call_overhead_us, per_item_us=per_item_us
+    )
+    fleet = MultiDeviceFleet(
+        [0], {"class": "LocalBuilder", "init_params": {"config": config}}
+    )
+    fleet_callable = fleet.fleet_callable
+    call_dict = {"model_name": "stand_in", "method_name": None, "kwargs": {}}
+
+    fleet_callable({**call_dict, "args": (0,)})  # build the model outside the timing
+
+    with ThreadPoolExecutor(window) as executor:
+        start = time.perf_counter()
+        list(
+            executor.map(
+                lambda i: fleet_callable({**call_dict, "args": (i,)}), range(calls)
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+    fleet.stop()
+    return calls / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--window", type=int, default=64)
+    parser.add_argument("--call-overhead-us", type=int, default=2000)
+    parser.add_argument("--per-item-us", type=int, default=50)
+    args = parser.parse_args()
+
+    settings = [None] + [
+        {"max_batch_size": size, "max_wait_us": wait}
+        for size in (4, 16, 64)
+        for wait in (100, 1000, 5000)
+    ]
+    print(f"{'max_batch_size':>14} {'max_wait_us':>11} {'items/sec':>10}")
+    for batching in settings:
+        throughput = run(
+            batching,
+            args.calls,
+            args.window,
+            args.call_overhead_us,
+            args.per_item_us,
+        )
+        size = batching["max_batch_size"] if batching else 1
+        wait = batching["max_wait_us"] if batching else 0
+        print(f"{size:>14} {wait:>11} {throughput:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Fleet call rate ceiling with a no-op model, against the Manager-based fleet.
+
+Every call to the no-op stand-in model is pure coordination: picking a device,
+sending the call and getting its reply. The legacy implementation routes each
+call through a multiprocessing.Manager server, acquiring a per-device Manager
+Lock and waiting on and clearing a Manager Event, so every call costs several
+round trips to one single-threaded broker and one call per device is in flight.
+The current fleet coordinates through shared memory and native locks and
+pipelines calls per device. Callers are threads in one process, or with
+--processes child processes each handed the ModelProxy as an argument.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Array, Event, Lock, Manager, Pipe, Process, Queue, Value
+
+from stand_in import stand_in_config
+
+from streamliner.fleet import ModelProxy, MultiDeviceFleet, SingleDeviceFleet
+from streamliner.model_builder import build_object_by_name, load_or_pass_config
+from streamliner.worker import reconstruct_and_call
+
+
+class LegacyLoadBalancer:
+    def __init__(self, main_pipes, events, device_locks, device_indices):
+        self.main_pipes = main_pipes
+        self.events = events
+        self.device_locks = device_locks
+        self.device_indices = device_indices
+        self.round_robin_index = Value("i", 0)
+        self.round_robin_lock = Lock()
+        self.device_availability = Array("b", [True] * len(device_indices))
+        self.availability_lock = Lock()
+
+    def _select_device(self):
+        with self.availability_lock, self.round_robin_lock:
+            available = [i for i, free in enumerate(self.device_availability) if free]
+            index = self.round_robin_index.value
+            selected = (
+                available[index % len(available)]
+                if available
+                else index % len(self.device_indices)
+            )
+            self.round_robin_index.value += 1
+            self.device_availability[selected] = False
+        return selected
+
+    def __call__(self, call_dict):
+        device = self._select_device()
+        self.device_locks[device].acquire()
+        try:
+            self.main_pipes[device].send(call_dict)
+            self.events[device].wait()
+            return self.main_pipes[device].recv()
+        finally:
+            self.events[device].clear()
+            self.device_locks[device].release()
+            with self.availability_lock:
+                self.device_availability[device] = True
+
+
+def legacy_worker(device_id, conn, event, model_builder_config):
+    fleet = SingleDeviceFleet(
+        build_object_by_name(
+            model_builder_config["class"],
+            **model_builder_config["init_params"],
+            device=device_id,
+        )
+    )
+    while True:
+        call_dict = conn.recv()
+        if call_dict is None:
+            break
+        conn.send(reconstruct_and_call(fleet, call_dict))
+        event.set()
+
+
+class LegacyFleet:
+    def __init__(self, device_indices, model_builder_config):
+        self.config = load_or_pass_config(model_builder_config["init_params"]["config"])
+        self.manager = Manager()
+        self.pipes, self.events, self.workers = [], [], []
+        for device_id in device_indices:
+            main_conn, worker_conn = Pipe()
+            event = self.manager.Event()
+            worker = Process(
+                target=legacy_worker,
+                args=(device_id, worker_conn, event, model_builder_config),
+            )
+            worker.start()
+            self.pipes.append(main_conn)
+            self.events.append(event)
+            self.workers.append(worker)
+        self.model_proxy = ModelProxy(
+            self.config["models"],
+            LegacyLoadBalancer(
+                self.pipes,
+                self.events,
+                [self.manager.Lock() for _ in device_indices],
+                device_indices,
+            ),
+        )
+
+    def prewarm(self):
+        for _ in self.pipes:
+            self.model_proxy.stand_in(0)
+
+    def stop(self):
+        for pipe in self.pipes:
+            pipe.send(None)
+        for worker in self.workers:
+            worker.join()
+        self.manager.shutdown()
+
+
+def call_many(proxy, calls):
+    for i in range(calls):
+        proxy.stand_in(i)
+    return calls
+
+
+def process_caller(proxy, calls, go, done):
+    call_many(proxy, 1)  # Connect to the workers before the clock starts.
+    done.put(None)
+    go.wait()
+    call_many(proxy, calls)
+    done.put(time.perf_counter())
+
+
+def calls_per_second(fleet, callers, calls, processes):
+    per_caller = max(calls // callers, 1)
+    if not processes:
+        with ThreadPoolExecutor(callers) as pool:
+            list(pool.map(call_many, [fleet.model_proxy] * callers, [1] * callers))
+            start = time.perf_counter()
+            total = sum(
+                pool.map(
+                    call_many, [fleet.model_proxy] * callers, [per_caller] * callers
+                )
+            )
+            return total / (time.perf_counter() - start)
+
+    go, done = Event(), Queue()
+    children = [
+        Process(
+            target=process_caller, args=(fleet.model_proxy, per_caller, go, done)
+        )
+        for _ in range(callers)
+    ]
+    for child in children:
+        child.start()
+    for _ in children:
+        done.get()
+    start = time.perf_counter()
+    go.set()
+    end = max(done.get() for _ in children)
+    for child in children:
+        child.join()
+    return callers * per_caller / (end - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--calls", type=int, default=4000)
+    parser.add_argument("--devices", type=int, default=2)
+    parser.add_argument("--callers", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--processes", action="store_true")
+    args = parser.parse_args()
+
+    config = {
+        "class": "LocalBuilder",
+        "init_params": {
+            "config": stand_in_config(call_overhead_us=0, per_item_us=0)
+        },
+    }
+    devices = list(range(args.devices))
+    print(f"{'control plane':>14} {'callers':>7} {'calls/sec':>10}")
+    for label, fleet_class in (("manager", LegacyFleet), ("native", MultiDeviceFleet)):
+        fleet = fleet_class(devices, config)
+        fleet.prewarm()
+        for callers in args.callers:
+            rate = calls_per_second(fleet, callers, args.calls, args.processes)
+            print(f"{label:>14} {callers:>7} {rate:>10.0f}")
+        fleet.stop()
+
+
+if __name__ == "__main__":
+    main()
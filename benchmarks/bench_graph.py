@@ -0,0 +1,81 @@
+"""
+A two-model pipeline run from the caller against the same pipeline as a graph.
+
+Each request sends a small input to two models in parallel, each returning a
+large payload, and reduces both to a small summary. From the caller, both
+intermediate payloads come back to this process before the reduction; as a
+graph registered with the fleet, the worker running it collects them and only
+the summary returns.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stand_in import stand_in_config
+
+from streamliner.fleet import MultiDeviceFleet
+from streamliner.registry import register as REGISTER
+
+
+@REGISTER
+def total_bytes(*payloads):
+    return sum(len(payload) for payload in payloads)
+
+
+GRAPH = {
+    "custom_import": "bench_graph",
+    "inputs": ["x"],
+    "nodes": {
+        "a": {"model": "stand_in", "args": [{"ref": "x"}]},
+        "b": {"model": "stand_in", "args": [{"ref": "x"}]},
+        "summary": {"function": "total_bytes", "args": [{"ref": "a"}, {"ref": "b"}]},
+    },
+    "output": {"ref": "summary"},
+}
+
+
+def from_caller(fleet_proxy, x):
+    a = fleet_proxy.stand_in.submit(x)
+    b = fleet_proxy.stand_in.submit(x)
+    return total_bytes(a.result(), b.result())
+
+
+def measure(function, calls, callers):
+    function(0)
+    with ThreadPoolExecutor(callers) as executor:
+        start = time.perf_counter()
+        list(executor.map(function, range(calls)))
+        return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--callers", type=int, default=8)
+    parser.add_argument("--compute-us", type=int, default=1000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 512, 4096])
+    args = parser.parse_args()
+
+    print(f"{'payload':>9} {'caller us/req':>14} {'graph us/req':>13}")
+    for size_kb in args.sizes:
+        config = stand_in_config(
+            call_overhead_us=args.compute_us,
+            per_item_us=0,
+            payload_bytes=size_kb * 1024,
+        )
+        config["graphs"] = {"pipeline": GRAPH}
+        fleet = MultiDeviceFleet(
+            [0, 1], {"class": "LocalBuilder", "init_params": {"config": config}}
+        )
+        fleet.prewarm()
+        proxy = fleet.model_proxy
+        caller = measure(lambda x: from_caller(proxy, x), args.calls, args.callers)
+        graph = measure(
+            lambda x: fleet.run_graph("pipeline", x=x), args.calls, args.callers
+        )
+        fleet.stop()
+        print(f"{size_kb:>7}KB {caller * 1e6:>14.0f} {graph * 1e6:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Tail latency with and without hedging when one device stalls now and then.
+
+Runs the stand-in model on two devices, one of which stalls for `--stall-ms`
+on a fraction of its calls, and reports p50/p99/p99.9 latency under concurrent
+callers, along with how many duplicate calls hedging sent and how many of them
+answered first.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stand_in import stand_in_config
+
+from streamliner.fleet import MultiDeviceFleet
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def run(hedging, args):
+    config = stand_in_config(
+        call_overhead_us=args.compute_us,
+        per_item_us=0,
+        stall_ms=args.stall_ms,
+        stall_probability=args.stall_probability,
+        stall_devices=[0],
+    )
+    if hedging:
+        config["models"]["stand_in"]["hedging"] = {
+            "percentile": args.percentile,
+            "budget": args.budget,
+        }
+    fleet = MultiDeviceFleet(
+        [0, 1],
+        {"class": "LocalBuilder", "init_params": {"config": config}},
+        scheduler=args.scheduler,
+    )
+    fleet.prewarm()
+    proxy = fleet.model_proxy
+
+    def timed_call(i):
+        start = time.perf_counter()
+        proxy.stand_in(i)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(args.callers) as executor:
+        latencies = list(executor.map(timed_call, range(args.calls)))
+    hedges = fleet.stats()["hedges"].get("stand_in", {"sent": 0, "won": 0})
+    fleet.stop()
+    return latencies, hedges
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=3000)
+    parser.add_argument("--callers", type=int, default=1)
+    parser.add_argument("--compute-us", type=int, default=1000)
+    parser.add_argument("--stall-ms", type=int, default=50)
+    parser.add_argument("--stall-probability", type=float, default=0.02)
+    parser.add_argument("--percentile", type=float, default=0.95)
+    parser.add_argument("--budget", type=float, default=0.1)
+    parser.add_argument("--scheduler", default="RoundRobinScheduler")
+    args = parser.parse_args()
+
+    print(f"{'hedging':>8} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} {'hedges':>7}")
+    for hedging in (False, True):
+        latencies, hedges = run(hedging, args)
+        print(
+            f"{'on' if hedging else 'off':>8} "
+            f"{percentile(latencies, 0.5) * 1e3:>8.2f} "
+            f"{percentile(latencies, 0.99) * 1e3:>8.2f} "
+            f"{percentile(latencies, 0.999) * 1e3:>9.2f} "
+            f"{hedges['won']:>3}/{hedges['sent']:<3}"
+        )
+
+
+if __name__ == "__main__":
+    main()
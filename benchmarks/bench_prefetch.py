@@ -0,0 +1,85 @@
+"""
+DataPrefetch throughput on tiny items against the Manager-list implementation.
+
+Each source is an int and the loader returns it unchanged, so the numbers
+measure work distribution and result publishing rather than loading. The legacy
+implementation pops sources off a Manager list and publishes through a Manager
+queue; it runs on fewer items because each pop is O(n) inside the manager.
+"""
+import argparse
+import time
+from multiprocessing import Manager, Process
+from queue import Empty
+
+from streamliner.data_acquisition import DataPrefetch
+
+
+def load(src):
+    return src
+
+
+class LegacyDataPrefetch:
+    def __init__(self, data_sources, data_loader_callable, worker_count=2):
+        manager = Manager()
+        self.data_source_list = manager.list(data_sources)
+        self.data_loader_callable = data_loader_callable
+        self.worker_count = worker_count
+        self.prefetched_data_queue = manager.Queue(50)
+
+    def worker_task(self):
+        while self.data_source_list:
+            try:
+                src = self.data_source_list.pop(0)
+                self.prefetched_data_queue.put((self.data_loader_callable(src), src))
+            except IndexError:
+                break
+
+    def __iter__(self):
+        for _ in range(self.worker_count):
+            worker = Process(target=self.worker_task)
+            worker.daemon = True
+            worker.start()
+        while True:
+            try:
+                yield self.prefetched_data_queue.get(timeout=1)
+            except Empty:
+                return
+
+
+def measure(prefetch, items):
+    start = time.perf_counter()
+    count = sum(1 for _ in prefetch)
+    elapsed = time.perf_counter() - start
+    assert count == items, (count, items)
+    return items / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--legacy-items", type=int, default=20_000)
+    parser.add_argument("--worker-count", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{'implementation':>24} {'items':>9} {'items/sec':>11}")
+    legacy = measure(
+        LegacyDataPrefetch(range(args.legacy_items), load, args.worker_count),
+        args.legacy_items,
+    )
+    print(f"{'manager list':>24} {args.legacy_items:>9} {legacy:>11.0f}")
+    for chunk_size in (1, 64, 1024):
+        throughput = measure(
+            DataPrefetch(
+                range(args.items),
+                load,
+                worker_count=args.worker_count,
+                chunk_size=chunk_size,
+            ),
+            args.items,
+        )
+        label = f"chunk_size={chunk_size}"
+        print(f"{label:>24} {args.items:>9} {throughput:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
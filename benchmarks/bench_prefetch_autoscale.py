@@ -0,0 +1,92 @@
+"""
+DataPrefetch on an I/O-bound loader: backends, fixed and autoscaled workers.
+
+The loader waits `--load-ms` per item like a remote read, and the consumer
+spends `--fast-us` per item for the first half of the run and `--slow-us` for
+the second, so the number of workers needed drops partway through. Reports
+items/sec, the average and largest worker count seen, and the seconds the
+autoscaler found the loader to be the bottleneck.
+"""
+import argparse
+import asyncio
+import time
+
+from streamliner.data_acquisition import DataPrefetch
+
+LOAD_SECONDS = 0.0
+
+
+def load(src):
+    time.sleep(LOAD_SECONDS)
+    return src
+
+
+async def async_load(src):
+    await asyncio.sleep(LOAD_SECONDS)
+    return src
+
+
+def run(args, backend, worker_count, max_workers=None):
+    prefetch = DataPrefetch(
+        range(args.items),
+        async_load if backend == "asyncio" else load,
+        worker_count=worker_count,
+        backend=backend,
+        max_workers=max_workers,
+        autoscale_interval=args.interval,
+    )
+    worker_counts = []
+    next_sample = 0.0
+    start = time.perf_counter()
+    for i, _ in enumerate(prefetch):
+        wait = (args.fast_us if i < args.items // 2 else args.slow_us) / 1e6
+        end = time.perf_counter() + wait
+        while time.perf_counter() < end:
+            pass
+        if time.perf_counter() >= next_sample:
+            worker_counts.append(prefetch.stats()["workers"])
+            next_sample = time.perf_counter() + 0.05
+    elapsed = time.perf_counter() - start
+    stats = prefetch.stats()
+    return (
+        args.items / elapsed,
+        sum(worker_counts) / len(worker_counts),
+        max(worker_counts),
+        stats.get("loader_bound_seconds", 0.0),
+    )
+
+
+def main():
+    global LOAD_SECONDS
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=4000)
+    parser.add_argument("--load-ms", type=float, default=5.0)
+    parser.add_argument("--fast-us", type=int, default=100)
+    parser.add_argument("--slow-us", type=int, default=1000)
+    parser.add_argument("--max-workers", type=int, default=32)
+    parser.add_argument("--interval", type=float, default=0.1)
+    args = parser.parse_args()
+    LOAD_SECONDS = args.load_ms / 1e3
+
+    configs = (
+        ("processes", 2, None),
+        ("processes", 8, None),
+        ("threads", 8, None),
+        ("threads", 1, args.max_workers),
+        ("asyncio", 1, args.max_workers),
+    )
+    print(
+        f"{'backend':>10} {'workers':>8} {'items/sec':>10} {'mean':>6} {'peak':>5} "
+        f"{'loader-bound s':>15}"
+    )
+    for backend, worker_count, max_workers in configs:
+        workers = f"1-{max_workers}" if max_workers else str(worker_count)
+        throughput, mean, peak, bound = run(args, backend, worker_count, max_workers)
+        print(
+            f"{backend:>10} {workers:>8} {throughput:>10.0f} {mean:>6.1f} "
+            f"{peak:>5} {bound:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Interactive latency while a bulk backfill saturates the fleet.
+
+A backfill keeps `--backfill-depth` calls outstanding at all times while an
+interactive caller makes serial calls. Reports the interactive p50/p99 with
+both classes at the same priority and with the backfill at a lower one, and how
+many backfill calls finished, so the cost to the backfill is visible too.
+"""
+import argparse
+import threading
+import time
+
+from stand_in import stand_in_config
+
+from streamliner.fleet import MultiDeviceFleet
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def run(proxy, backfill_priority, args):
+    backfill = proxy.stand_in.with_options(priority=backfill_priority)
+    interactive = proxy.stand_in.with_options(priority=0)
+    stop = threading.Event()
+    slots = threading.Semaphore(args.backfill_depth)
+    completed = []
+
+    def on_done(future):
+        completed.append(1)
+        slots.release()
+
+    def feed_backfill():
+        while not stop.is_set():
+            slots.acquire()
+            backfill.submit(0).add_done_callback(on_done)
+
+    feeder = threading.Thread(target=feed_backfill, daemon=True)
+    feeder.start()
+    time.sleep(0.2)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(args.calls):
+        called = time.perf_counter()
+        interactive(i)
+        latencies.append(time.perf_counter() - called)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    slots.release()
+    feeder.join()
+    return latencies, len(completed) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--compute-us", type=int, default=2000)
+    parser.add_argument("--backfill-depth", type=int, default=64)
+    parser.add_argument("--devices", type=int, default=2)
+    args = parser.parse_args()
+
+    config = stand_in_config(call_overhead_us=args.compute_us, per_item_us=0)
+    fleet = MultiDeviceFleet(
+        list(range(args.devices)),
+        {"class": "LocalBuilder", "init_params": {"config": config}},
+    )
+    fleet.prewarm()
+    proxy = fleet.model_proxy
+
+    print(f"{'backfill':>12} {'p50 ms':>8} {'p99 ms':>8} {'backfill/s':>11}")
+    for label, backfill_priority in (("same class", 0), ("lower class", -1)):
+        latencies, backfill_rate = run(proxy, backfill_priority, args)
+        time.sleep(0.5)  # Let the previous backfill drain.
+        print(
+            f"{label:>12} {percentile(latencies, 0.5) * 1e3:>8.2f} "
+            f"{percentile(latencies, 0.99) * 1e3:>8.2f} {backfill_rate:>11.0f}"
+        )
+    fleet.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+End-to-end DataPrefetch -> AccelProcessMap -> fleet throughput.
+
+Loader processes spend `load_us` per item to stand in for reading and decoding,
+sleeping like I/O-bound loading or spinning with --busy-load, and the stand-in
+model sleeps for each forward pass like a host thread waiting on an
+accelerator. Adding loaders helps until the devices are saturated and adding
+devices helps until the loaders are. Reports items/sec for every worker_count
+and device count pair.
+"""
+import argparse
+import time
+from multiprocessing import Manager
+
+from stand_in import stand_in_config
+
+from streamliner.data_acquisition import DataPrefetch
+from streamliner.fleet import MultiDeviceFleet
+from streamliner.process_map import AccelProcessMap
+
+LOAD_SECONDS = 0.0
+BUSY_LOAD = False
+
+
+def load(src):
+    if not BUSY_LOAD:
+        time.sleep(LOAD_SECONDS)
+        return src
+    end = time.perf_counter() + LOAD_SECONDS
+    while time.perf_counter() < end:
+        pass
+    return src
+
+
+def run(manager, fleet, items, worker_count, max_in_flight, chunk_size):
+    prefetch = DataPrefetch(
+        range(items),
+        load,
+        manager=manager,
+        worker_count=worker_count,
+        chunk_size=chunk_size,
+    )
+    start = time.perf_counter()
+    count = sum(
+        1
+        for _ in AccelProcessMap(
+            fleet.fleet_callable, prefetch, "stand_in", max_in_flight=max_in_flight
+        )
+    )
+    elapsed = time.perf_counter() - start
+    assert count == items, (count, items)
+    return items / elapsed
+
+
+def main():
+    global LOAD_SECONDS, BUSY_LOAD
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--load-us", type=int, default=2000)
+    parser.add_argument("--busy-load", action="store_true")
+    parser.add_argument("--call-overhead-us", type=int, default=2000)
+    parser.add_argument("--per-item-us", type=int, default=0)
+    parser.add_argument("--worker-counts", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--device-counts", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    args = parser.parse_args()
+    LOAD_SECONDS = args.load_us / 1e6
+    BUSY_LOAD = args.busy_load
+
+    config = stand_in_config(
+        call_overhead_us=args.call_overhead_us, per_item_us=args.per_item_us
+    )
+    manager = Manager()
+    print(f"{'devices':>7} {'worker_count':>12} {'items/sec':>10}")
+    for device_count in args.device_counts:
+        fleet = MultiDeviceFleet(
+            list(range(device_count)),
+            {"class": "LocalBuilder", "init_params": {"config": config}},
+        )
+        fleet.prewarm()
+        for worker_count in args.worker_counts:
+            throughput = run(
+                manager,
+                fleet,
+                args.items,
+                worker_count,
+                args.max_in_flight,
+                args.chunk_size,
+            )
+            print(f"{device_count:>7} {worker_count:>12} {throughput:>10.0f}")
+        fleet.stop()
+
+
+if __name__ == "__main__":
+    main()
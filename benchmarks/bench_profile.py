@@ -0,0 +1,70 @@
+"""
+Cost of profiling the workers, and what a profile of the stand-in looks like.
+
+Measures calls/sec to the stand-in model with profiling off, while the workers
+sample stacks, and while they run cProfile, then prints the heaviest collapsed
+stacks from the sampling run.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stand_in import stand_in_config
+
+from streamliner.fleet import MultiDeviceFleet
+from streamliner.profiling import collapsed_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--callers", type=int, default=8)
+    parser.add_argument("--compute-us", type=int, default=200)
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    config = stand_in_config(call_overhead_us=args.compute_us, per_item_us=0, busy=True)
+    fleet = MultiDeviceFleet(
+        [0, 1], {"class": "LocalBuilder", "init_params": {"config": config}}
+    )
+    fleet.prewarm()
+    proxy = fleet.model_proxy
+
+    def calls_per_second(profile_mode):
+        calls = [0] * args.callers
+        stop = threading.Event()
+        profile = {}
+
+        def caller(index):
+            while not stop.is_set():
+                proxy.stand_in(index)
+                calls[index] += 1
+
+        with ThreadPoolExecutor(args.callers) as executor:
+            list(executor.map(lambda i: None, range(args.callers)))
+            futures = [executor.submit(caller, i) for i in range(args.callers)]
+            start = time.perf_counter()
+            if profile_mode is None:
+                time.sleep(args.seconds)
+            else:
+                profile = fleet.profile(duration=args.seconds, mode=profile_mode)
+            elapsed = time.perf_counter() - start
+            stop.set()
+            for future in futures:
+                future.result()
+        return sum(calls) / elapsed, profile
+
+    print(f"{'profiling':>10} {'calls/sec':>10}")
+    for mode in (None, "sample", "cprofile"):
+        rate, profile = calls_per_second(mode)
+        print(f"{mode or 'off':>10} {rate:>10.0f}")
+        if mode == "sample":
+            stacks = profile["stacks"]
+    fleet.stop()
+    print()
+    print("".join(collapsed_text(stacks).splitlines(keepends=True)[: args.top]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Throughput of a CPU-bound model against the number of CPU replica workers.
+
+Runs the busy stand-in model on the "cpu" device with 1, 2, 4, ... replicas
+and reports calls per second with enough concurrent callers to keep every
+replica busy. Throughput should grow with replicas up to the number of cores.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stand_in import stand_in_config
+
+from streamliner.fleet import MultiDeviceFleet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--compute-us", type=int, default=5000)
+    parser.add_argument(
+        "--replicas", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1]
+    )
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores")
+    print(f"{'replicas':>8} {'calls/sec':>10}")
+    for replicas in sorted(set(args.replicas)):
+        config = stand_in_config(
+            call_overhead_us=args.compute_us, per_item_us=0, busy=True
+        )
+        config["replicas"] = replicas
+        fleet = MultiDeviceFleet(
+            ["cpu"],
+            {"class": "LocalBuilder", "init_params": {"config": config}},
+            scheduler="LeastOutstandingScheduler",
+        )
+        fleet.prewarm()
+        proxy = fleet.model_proxy
+        with ThreadPoolExecutor(2 * replicas) as executor:
+            start = time.perf_counter()
+            list(executor.map(proxy.stand_in, range(args.calls)))
+            elapsed = time.perf_counter() - start
+        fleet.stop()
+        print(f"{replicas:>8} {args.calls / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
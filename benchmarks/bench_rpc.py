@@ -0,0 +1,76 @@
+"""
+Remote fleet calls over the binary RPC transport against in-process calls.
+
+Starts an RPCServer over a MultiDeviceFleet on localhost and reports serial
+latency and concurrent throughput for a no-op model, with array payloads of
+several sizes, through RPCClient and through the fleet_callable directly.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from stand_in import stand_in_config
+
+from streamliner.fleet import MultiDeviceFleet
+from streamliner.rpc import RPCClient, RPCServer
+
+
+def serial_latency(fleet_callable, payload, calls):
+    call_dict = {"model_name": "stand_in", "method_name": "identity", "kwargs": {}}
+    fleet_callable({**call_dict, "args": (payload,)})
+    start = time.perf_counter()
+    for _ in range(calls):
+        fleet_callable({**call_dict, "args": (payload,)})
+    return (time.perf_counter() - start) / calls
+
+
+def throughput(fleet_callable, payload, calls, callers):
+    call_dict = {"model_name": "stand_in", "method_name": "identity", "kwargs": {}}
+    with ThreadPoolExecutor(callers) as executor:
+        start = time.perf_counter()
+        list(
+            executor.map(
+                lambda _: fleet_callable({**call_dict, "args": (payload,)}),
+                range(calls),
+            )
+        )
+        return calls / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--callers", type=int, default=16)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 16, 512])
+    args = parser.parse_args()
+
+    config = stand_in_config(call_overhead_us=0, per_item_us=0)
+    fleet = MultiDeviceFleet(
+        [0, 1], {"class": "LocalBuilder", "init_params": {"config": config}}
+    )
+    fleet.prewarm()
+    server = RPCServer(fleet.fleet_callable).start()
+    callables = {
+        "in-process": fleet.fleet_callable,
+        "rpc": RPCClient(server.address, pool_size=args.pool_size),
+    }
+
+    print(f"{'transport':>10} {'array':>9} {'us/call':>9} {'calls/sec':>10}")
+    for size in args.sizes:
+        payload = np.random.rand(size, size).astype(np.float32) if size else 0
+        for name, fleet_callable in callables.items():
+            calls = args.calls if size < 256 else args.calls // 10
+            latency = serial_latency(fleet_callable, payload, calls)
+            rate = throughput(fleet_callable, payload, calls, args.callers)
+            label = f"{size}x{size}" if size else "scalar"
+            print(f"{name:>10} {label:>9} {latency * 1e6:>9.0f} {rate:>10.0f}")
+
+    callables["rpc"].close()
+    server.close()
+    fleet.stop()
+
+
+if __name__ == "__main__":
+    main()
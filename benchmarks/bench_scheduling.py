@@ -0,0 +1,96 @@
+"""
+Simulated p50/p99 latency of the fleet schedulers under a skewed model mix.
+
+Requests for Zipf-distributed models arrive as a Poisson stream at a fleet of
+FIFO devices, one of them slower than the rest. The first request for a model on
+a device pays that model's build time. The schedulers make their decisions from
+the same SchedulerState the fleet maintains, using plain lists.
+"""
+import argparse
+import heapq
+import random
+
+from streamliner.scheduling import SchedulerState, build_scheduler
+
+SCHEDULERS = [
+    "RoundRobinScheduler",
+    "LeastOutstandingScheduler",
+    "PowerOfTwoChoicesScheduler",
+    "ModelAffinityScheduler",
+]
+
+
+def simulate(scheduler_name, args, seed):
+    rng = random.Random(seed)
+    random.seed(seed)  # the schedulers break ties with the random module
+
+    model_names = [f"model_{i:02d}" for i in range(args.models)]
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(args.models)]
+    service = {
+        name: rng.uniform(0.5, 1.5) * args.service_ms / 1e3 for name in model_names
+    }
+    speed = [args.slow_factor if i == 0 else 1.0 for i in range(args.devices)]
+
+    scheduler = build_scheduler(scheduler_name)
+    state = SchedulerState(args.devices, model_names, shared=False)
+    device_free_at = [0.0] * args.devices
+    built = [set() for _ in range(args.devices)]
+    events = []  # (time, kind, device, payload)
+
+    capacity = args.devices / (args.service_ms / 1e3)
+    now = 0.0
+    latencies = []
+    for _ in range(args.requests):
+        now += rng.expovariate(args.load * capacity)
+        while events and events[0][0] <= now:
+            _, kind, device, payload = heapq.heappop(events)
+            if kind == "done":
+                state.finish(device, *payload)
+            else:
+                state.mark_resident(device, *payload)
+
+        model_name = rng.choices(model_names, weights)[0]
+        model_index = state.model_index(model_name)
+        device = scheduler.select(state, model_index)
+        ahead = state.begin(device, model_index)
+
+        start = max(now, device_free_at[device])
+        if model_name not in built[device]:
+            built[device].add(model_name)
+            start += args.build_s
+            heapq.heappush(
+                events, (start, "resident", device, (model_name, args.build_s))
+            )
+        done = start + service[model_name] * speed[device]
+        device_free_at[device] = done
+        heapq.heappush(events, (done, "done", device, (done - now, ahead)))
+        latencies.append(done - now)
+
+    latencies.sort()
+    return (
+        latencies[len(latencies) // 2],
+        latencies[int(len(latencies) * 0.99)],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--models", type=int, default=24)
+    parser.add_argument("--zipf", type=float, default=1.2)
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--load", type=float, default=0.3)
+    parser.add_argument("--service-ms", type=float, default=10.0)
+    parser.add_argument("--build-s", type=float, default=2.0)
+    parser.add_argument("--slow-factor", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'scheduler':>28} {'p50 ms':>9} {'p99 ms':>9}")
+    for scheduler_name in SCHEDULERS:
+        p50, p99 = simulate(scheduler_name, args, args.seed)
+        print(f"{scheduler_name:>28} {p50 * 1e3:>9.1f} {p99 * 1e3:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
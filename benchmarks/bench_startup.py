@@ -0,0 +1,90 @@
+"""
+Fleet cold start and worker memory against worker count.
+
+Starts a fleet of CPU replica workers that each load the same weight file, and
+reports the time to start and prewarm it along with the workers' total RSS and
+PSS (resident memory with shared pages split between the processes sharing
+them). Compares spawn workers reading private copies of the weights against
+forkserver workers with preloaded modules and memory-mapped weights. Set
+--import-ms to model a framework import such as torch in every worker.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+from streamliner.fleet import MultiDeviceFleet
+
+
+def memory_kb(pid):
+    """RSS and PSS of a process in KiB, from /proc."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as file:
+        for line in file:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0])
+    return values["Rss"], values["Pss"]
+
+
+def run(workers, mapped, preload, model_dir):
+    config = {
+        "model_dir": model_dir,
+        "replicas": workers,
+        "models": {
+            "weights": {
+                "model_class": "WeightsStandIn",
+                "custom_import": "stand_in",
+                "init_files": {"weights": "weights.bin"},
+                "mmap_files": mapped,
+            }
+        },
+    }
+    start = time.perf_counter()
+    fleet = MultiDeviceFleet(
+        ["cpu"],
+        {"class": "LocalBuilder", "init_params": {"config": config}},
+        preload=preload,
+    )
+    fleet.prewarm()
+    elapsed = time.perf_counter() - start
+    usage = [memory_kb(worker.pid) for worker in fleet.per_device_workers]
+    fleet.stop()
+    return elapsed, sum(rss for rss, _ in usage), sum(pss for _, pss in usage)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--weights-mb", type=int, default=256)
+    parser.add_argument("--import-ms", type=int, default=0)
+    args = parser.parse_args()
+    os.environ["STAND_IN_IMPORT_MS"] = str(args.import_ms)
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        os.makedirs(os.path.join(model_dir, "weights"))
+        with open(os.path.join(model_dir, "weights", "weights.bin"), "wb") as file:
+            file.write(os.urandom(args.weights_mb << 20))
+
+        print(
+            f"{'mode':>22} {'workers':>7} {'start s':>8} {'RSS MB':>8} {'PSS MB':>8}"
+        )
+        modes = (
+            ("spawn, private", "spawn", False, False),
+            ("forkserver, preloaded", "forkserver", True, True),
+        )
+        for label, start_method, preload, mapped in modes:
+            mp.set_start_method(start_method, force=True)
+            for workers in args.workers:
+                elapsed, rss, pss = run(workers, mapped, preload, model_dir)
+                print(
+                    f"{label:>22} {workers:>7} {elapsed:>8.2f} "
+                    f"{rss / 1024:>8.0f} {pss / 1024:>8.0f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
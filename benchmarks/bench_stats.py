@@ -0,0 +1,76 @@
+"""
+Cost of fleet latency instrumentation.
+
+Times FleetStats.record on its own, plus the share of the batched flush each
+record costs later on the timer thread, then the round trip of a no-op call
+through fleet_callable from a single caller with stats enabled and disabled. The
+difference is the per-call overhead of the caller- and worker-side records.
+"""
+import argparse
+import time
+
+from stand_in import stand_in_config
+
+from streamliner.fleet import MultiDeviceFleet
+from streamliner.stats import FleetStats, flush
+
+
+def time_record(iterations):
+    stats = FleetStats(1, ["stand_in"], flush_interval=3600)
+    phases = ("schedule", "send", "recv", "total")
+    seconds = (1e-5, 2e-5, 1e-5, 1e-4)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        stats.record(0, "stand_in", phases, seconds)
+    recorded = time.perf_counter()
+    flush()
+    flushed = time.perf_counter()
+    return (recorded - start) / iterations, (flushed - recorded) / iterations
+
+
+def time_calls(calls, repeats):
+    """Best us/call with stats off and on, alternating runs to share any noise."""
+    config = stand_in_config(call_overhead_us=0, per_item_us=0)
+    fleets = {
+        stats: MultiDeviceFleet(
+            [0],
+            {"class": "LocalBuilder", "init_params": {"config": config}},
+            stats=stats,
+        )
+        for stats in (False, True)
+    }
+    call_dict = {"model_name": "stand_in", "method_name": None, "kwargs": {}}
+    best = dict.fromkeys(fleets, float("inf"))
+    for _ in range(repeats):
+        for stats, fleet in fleets.items():
+            fleet_callable = fleet.fleet_callable
+            fleet_callable({**call_dict, "args": (0,)})
+            start = time.perf_counter()
+            for i in range(calls):
+                fleet_callable({**call_dict, "args": (i,)})
+            best[stats] = min(best[stats], (time.perf_counter() - start) / calls)
+    for fleet in fleets.values():
+        fleet.stop()
+    return best[False], best[True]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=7)
+    args = parser.parse_args()
+
+    record, flushed = time_record(args.iterations)
+    print(f"FleetStats.record with 4 phases: {record * 1e6:.2f} us")
+    print(f"flush, per record: {flushed * 1e6:.2f} us")
+
+    disabled, enabled = time_calls(args.calls, args.repeats)
+    print(f"{'stats':>8} {'us/call':>9}")
+    print(f"{'off':>8} {disabled * 1e6:>9.1f}")
+    print(f"{'on':>8} {enabled * 1e6:>9.1f}")
+    print(f"overhead: {(enabled - disabled) * 1e6:.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Round-trip latency of image-sized arrays with pickled vs shared-memory transport.
+
+Each call sends an HxWx3 uint8 image to a stand-in model that returns it, so the
+array crosses the process boundary in both directions.
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+from stand_in import stand_in_config
+
+from streamliner.fleet import MultiDeviceFleet
+
+
+def run(shared_memory, sizes, calls):
+    config = stand_in_config(call_overhead_us=0, per_item_us=0)
+    fleet = MultiDeviceFleet(
+        [0],
+        {"class": "LocalBuilder", "init_params": {"config": config}},
+        shared_memory=shared_memory,
+    )
+    identity = fleet.model_proxy.stand_in.identity
+
+    latencies = {}
+    for size in sizes:
+        image = np.random.randint(0, 255, (size, size, 3), dtype=np.uint8)
+        for _ in range(10):  # warm up the model and the shared memory pool
+            identity(image)
+        samples = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            result = identity(image)
+            samples.append(time.perf_counter() - start)
+            del result
+        latencies[size] = statistics.median(samples)
+
+    fleet.stop()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[224, 512, 1024])
+    args = parser.parse_args()
+
+    pickled = run(False, args.sizes, args.calls)
+    shared = run(True, args.sizes, args.calls)
+
+    print(f"{'image':>10} {'pickle ms':>10} {'shm ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        print(
+            f"{f'{size}x{size}':>10} {pickled[size] * 1e3:>10.3f} "
+            f"{shared[size] * 1e3:>10.3f} {pickled[size] / shared[size]:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
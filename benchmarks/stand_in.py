@@ -0,0 +1,96 @@
+import os
+import random
+import time
+
+from streamliner.registry import register as REGISTER
+
+# Models importing a large framework, e.g. torch, at worker startup.
+time.sleep(float(os.environ.get("STAND_IN_IMPORT_MS", 0)) / 1e3)
+
+
+@REGISTER
+class StandInModel:
+    """
+    CPU stand-in for an accelerator model.
+
+    Each forward pass costs a fixed launch overhead plus a per-item cost, so a
+    batch of N items is much cheaper than N single calls, like on a GPU. With
+    busy=False the time is spent sleeping, which models a host thread waiting on
+    a device; busy=True spins to model CPU-bound inference. `build_ms` is spent
+    in the constructor to model loading weights. On `stall_devices`, a call
+    stalls for an extra `stall_ms` with probability `stall_probability`, like a
+    GC pause or a throttled device.
+    """
+
+    def __init__(
+        self,
+        call_overhead_us=2000,
+        per_item_us=100,
+        payload_bytes=0,
+        busy=False,
+        build_ms=0,
+        stall_ms=0,
+        stall_probability=0.0,
+        stall_devices=(),
+        device=0,
+    ):
+        self.call_overhead = call_overhead_us / 1e6
+        self.per_item = per_item_us / 1e6
+        self.payload = b"\0" * payload_bytes
+        self.busy = busy
+        self.device = device
+        self.stall = stall_ms / 1e3 if device in stall_devices else 0.0
+        self.stall_probability = stall_probability
+        self._compute(build_ms / 1e3)
+
+    def _compute(self, seconds):
+        if self.stall and random.random() < self.stall_probability:
+            seconds += self.stall
+        if seconds <= 0:
+            return
+        if not self.busy:
+            time.sleep(seconds)
+            return
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+    def __call__(self, item):
+        self._compute(self.call_overhead + self.per_item)
+        return self.payload
+
+    def identity(self, item):
+        self._compute(self.call_overhead + self.per_item)
+        return item
+
+    def batch(self, items):
+        self._compute(self.call_overhead + self.per_item * len(items))
+        return [self.payload] * len(items)
+
+
+@REGISTER
+class WeightsStandIn:
+    """Holds a weight file, read into private memory or mapped as given."""
+
+    def __init__(self, weights, device=0):
+        if isinstance(weights, str):
+            with open(weights, "rb") as file:
+                weights = bytearray(file.read())
+        self.weights = memoryview(weights).cast("B")
+        # Touch every page, as copying weights to a device would.
+        self.checksum = sum(self.weights[::4096])
+
+    def __call__(self, item):
+        return self.checksum
+
+
+def stand_in_config(batching=None, **init_params):
+    model_cfg = {
+        "model_class": "StandInModel",
+        "custom_import": "stand_in",
+        "proxy_methods": ["identity"],
+        "init_params": init_params,
+    }
+    if batching:
+        model_cfg["batching"] = batching
+    return {"model_dir": "./models/", "models": {"stand_in": model_cfg}}
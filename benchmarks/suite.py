@@ -0,0 +1,240 @@
+"""
+Hot-path benchmark suite with machine-readable results and regression checks.
+
+Measures per-call overhead of SingleDeviceFleet, ModelProxy over a
+MultiDeviceFleet and DataPrefetch in both modes, throughput against device
+count, p50/p99 latency under concurrent callers and cold-start build time,
+using the registry's StandInModel. Results are written as JSON:
+
+    python suite.py --output results.json
+    python suite.py --output new.json --compare results.json --tolerance 0.15
+
+With --compare, every metric that moved the wrong way by more than the
+tolerance is reported and the exit status is 1.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Manager
+
+from stand_in import stand_in_config
+
+from streamliner.data_acquisition import DataPrefetch
+from streamliner.fleet import MultiDeviceFleet, SingleDeviceFleet
+from streamliner.model_builder import LocalBuilder
+
+BENCHMARKS = {}
+
+
+def benchmark(function):
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+def metric(value, unit, better):
+    return {"value": value, "unit": unit, "better": better}
+
+
+def fleet_config(**init_params):
+    config = stand_in_config(**init_params)
+    return {"class": "LocalBuilder", "init_params": {"config": config}}
+
+
+def load(src):
+    return src
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def timed_calls(function, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        function(i)
+    return (time.perf_counter() - start) / calls
+
+
+@benchmark
+def single_device_fleet(args):
+    fleet = SingleDeviceFleet(
+        LocalBuilder(stand_in_config(call_overhead_us=0, per_item_us=0))
+    )
+    model = fleet["stand_in"]
+    direct = timed_calls(model, args.calls * 10)
+    through_fleet = timed_calls(lambda i: fleet["stand_in"](i), args.calls * 10)
+    return {
+        "single_device_fleet.overhead_us": metric(
+            (through_fleet - direct) * 1e6, "us", "lower"
+        )
+    }
+
+
+@benchmark
+def model_proxy(args):
+    fleet = MultiDeviceFleet([0], fleet_config(call_overhead_us=0, per_item_us=0))
+    fleet.prewarm()
+    proxy = fleet.model_proxy
+    proxy.stand_in(0)
+    seconds = timed_calls(proxy.stand_in, args.calls)
+    fleet.stop()
+    return {"model_proxy.call_us": metric(seconds * 1e6, "us", "lower")}
+
+
+@benchmark
+def data_prefetch(args):
+    items = args.calls * 20
+    results = {}
+    for chunk_size in (1, 64):
+        start = time.perf_counter()
+        count = sum(1 for _ in DataPrefetch(range(items), load, chunk_size=chunk_size))
+        assert count == items
+        elapsed = time.perf_counter() - start
+        results[f"data_prefetch.iterable.chunk_{chunk_size}.items_per_sec"] = metric(
+            items / elapsed, "items/s", "higher"
+        )
+
+    manager = Manager()
+    items = args.calls
+    prefetch = DataPrefetch(range(items), load, manager=manager, worker_count=2)
+    start = time.perf_counter()
+    finished = 0
+    while finished < prefetch.worker_count:
+        if prefetch.prefetched_data_queue.get() is None:
+            finished += 1
+    elapsed = time.perf_counter() - start
+    manager.shutdown()
+    results["data_prefetch.queue.items_per_sec"] = metric(
+        items / elapsed, "items/s", "higher"
+    )
+    return results
+
+
+@benchmark
+def device_scaling(args):
+    results = {}
+    for device_count in args.device_counts:
+        fleet = MultiDeviceFleet(
+            list(range(device_count)),
+            fleet_config(call_overhead_us=args.compute_us, payload_bytes=args.payload),
+        )
+        fleet.prewarm()
+        proxy = fleet.model_proxy
+        with ThreadPoolExecutor(4 * device_count) as executor:
+            start = time.perf_counter()
+            list(executor.map(proxy.stand_in, range(args.calls)))
+            elapsed = time.perf_counter() - start
+        fleet.stop()
+        results[f"device_scaling.devices_{device_count}.calls_per_sec"] = metric(
+            args.calls / elapsed, "calls/s", "higher"
+        )
+    return results
+
+
+@benchmark
+def concurrent_latency(args):
+    fleet = MultiDeviceFleet(
+        [0, 1],
+        fleet_config(call_overhead_us=args.compute_us, payload_bytes=args.payload),
+    )
+    fleet.prewarm()
+    proxy = fleet.model_proxy
+
+    def timed_call(i):
+        start = time.perf_counter()
+        proxy.stand_in(i)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(args.callers) as executor:
+        latencies = list(executor.map(timed_call, range(args.calls)))
+    fleet.stop()
+    prefix = f"concurrent_latency.callers_{args.callers}"
+    return {
+        f"{prefix}.p50_ms": metric(percentile(latencies, 0.5) * 1e3, "ms", "lower"),
+        f"{prefix}.p99_ms": metric(percentile(latencies, 0.99) * 1e3, "ms", "lower"),
+    }
+
+
+@benchmark
+def cold_start(args):
+    start = time.perf_counter()
+    fleet = MultiDeviceFleet([0, 1], fleet_config(build_ms=args.build_ms))
+    started = time.perf_counter()
+    fleet.prewarm()
+    built = time.perf_counter()
+    fleet.stop()
+    return {
+        "cold_start.worker_start_ms": metric((started - start) * 1e3, "ms", "lower"),
+        "cold_start.prewarm_ms": metric((built - started) * 1e3, "ms", "lower"),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a line per metric that is more than `tolerance` worse than baseline."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or not previous["value"]:
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        if current["better"] == "higher":
+            change = -change
+        if change > tolerance:
+            regressions.append(
+                f"{name}: {previous['value']:.4g} -> {current['value']:.4g} "
+                f"{current['unit']} ({change:.1%} worse)"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS))
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--compute-us", type=int, default=1000)
+    parser.add_argument("--payload", type=int, default=0)
+    parser.add_argument("--device-counts", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--callers", type=int, default=16)
+    parser.add_argument("--build-ms", type=int, default=500)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        for metric_name, value in BENCHMARKS[name](args).items():
+            results[metric_name] = value
+            print(f"{metric_name:<60} {value['value']:>12.4g} {value['unit']}")
+
+    with open(args.output, "w") as file:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "time": time.time(),
+                "metrics": results,
+            },
+            file,
+            indent=2,
+        )
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["metrics"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.compare}.")
+
+
+if __name__ == "__main__":
+    main()
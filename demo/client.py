@@ -5,20 +5,14 @@ import requests
 from hft_src.high_freq_trading_logic import due_diligence
 
 from streamliner.fleet import ModelProxy
+from streamliner.rpc import RPCClient
 
 paths = glob.glob("./financial_statements/*.jpg")
 with open("model_cfg.json", "r") as file:
     model_config = json.load(file)["models"]
 
 
-def fleet_callable(call_dict):
-    url = "http://localhost:5000/fleet_server"
-
-    response = requests.post(url, json=call_dict)
-    if response.status_code == 200:
-        return response.json()["result"]
-    else:
-        return response.text
+fleet_callable = RPCClient(("127.0.0.1", 5001))
 
 
 def get_due_diligence(kwargs):
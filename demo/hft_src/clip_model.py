@@ -1,3 +1,4 @@
+import numpy as np
 import open_clip
 import torch
 from PIL import Image
@@ -9,43 +10,70 @@ torch.set_num_threads(1)
 
 @REGISTER
 class CLIPClassifier:
+    """
+    Scores images against groups of prompts, softmaxed within each group.
+
+    The prompts of every group are encoded once and packed into one normalized
+    text-feature matrix, so scoring a batch of images is one image forward, one
+    matmul and one device to host transfer. `batch` is the entry point for fleet
+    batching; `__call__` takes one image or a list of them. device is a CUDA
+    index or "cpu".
+    """
+
     def __init__(self, texts, arch, pretrain_source, device=0, **kwargs):
-        self.device = device
+        self.device = torch.device("cpu" if device == "cpu" else f"cuda:{device}")
         self.model, _, self.preprocess = open_clip.create_model_and_transforms(
-            arch, pretrain_source, device=f"cuda:{device}"
+            arch, pretrain_source, device=self.device
         )
         self.texts = texts
-        self.text_classifiers = self._create_text_classifiers(texts, arch)
+        self.text_features, self.group_slices = self._pack_text_features(texts, arch)
 
-    def _create_text_classifiers(self, texts, arch):
+    def _pack_text_features(self, texts, arch):
         tokenizer = open_clip.get_tokenizer(arch)
+        tokenized_text = tokenizer([text for group in texts for text in group])
+        with torch.no_grad():
+            text_features = self.model.encode_text(tokenized_text.to(self.device))
+        text_features /= text_features.norm(dim=-1, keepdim=True)
 
-        text_classifiers = []
-        for text in texts:
-            tokenized_text = tokenizer(text).cuda(self.device)
-            text_features = self.model.encode_text(tokenized_text)
-            text_features /= text_features.norm(dim=-1, keepdim=True)
-            text_classifiers.append(text_features)
-
-        return text_classifiers
+        group_slices, offset = [], 0
+        for group in texts:
+            group_slices.append(slice(offset, offset + len(group)))
+            offset += len(group)
+        return text_features, group_slices
 
-    def __call__(self, image):
+    def _load(self, image):
         if isinstance(image, str):
             image = Image.open(image)
         else:
             image = Image.fromarray(image)
+        return self.preprocess(image)
 
-        image = self.preprocess(image).unsqueeze(0).cuda(self.device)
+    def batch(self, images):
+        images = torch.stack([self._load(image) for image in images]).to(self.device)
 
-        with torch.no_grad(), torch.cuda.amp.autocast():
-            image_features = self.model.encode_image(image)
+        with torch.no_grad(), torch.autocast(
+            self.device.type, enabled=self.device.type == "cuda"
+        ):
+            image_features = self.model.encode_image(images)
             image_features /= image_features.norm(dim=-1, keepdim=True)
+            logits = 100.0 * image_features @ self.text_features.T
+            probs = torch.cat(
+                [logits[:, group].softmax(dim=-1) for group in self.group_slices],
+                dim=-1,
+            )
+        probs = probs.float().cpu().numpy()
 
-            results = []
-            for text_features, text in zip(self.text_classifiers, self.texts):
-                text_probs = (100.0 * image_features @ text_features.T).softmax(dim=-1)
-                text_probs = text_probs[0].cpu().numpy().tolist()
-                result = dict(text=text, scores=text_probs)
-                results.append(result)
+        return [
+            [
+                dict(text=text, scores=image_probs[group].tolist())
+                for group, text in zip(self.group_slices, self.texts)
+            ]
+            for image_probs in probs
+        ]
 
-            return results
+    def __call__(self, image):
+        if isinstance(image, (list, tuple)) or (
+            isinstance(image, np.ndarray) and image.ndim == 4
+        ):
+            return self.batch(image)
+        return self.batch([image])[0]
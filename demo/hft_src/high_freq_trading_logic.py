@@ -1,16 +1,18 @@
+import asyncio
 from statistics import mean
 
+from streamliner.registry import register as REGISTER
+
+
+def _rating(counterparty_risk, controls_over_financial_reporting):
+    counterparty_score = counterparty_risk["scores"][0]
+    controls_score = controls_over_financial_reporting["scores"][0]
+    return mean([counterparty_score, controls_score])
+
 
 def due_diligence(fleet, financial_statement, extra_due_diligence=True):
     def _due_diligence(model_name):
-        counterparty_risk, controls_over_financial_reporting = fleet[model_name](
-            financial_statement
-        )
-        counterparty_score = counterparty_risk["scores"][0]
-        controls_score = controls_over_financial_reporting["scores"][0]
-        due_diligence_rating = mean([counterparty_score, controls_score])
-
-        return due_diligence_rating
+        return _rating(*fleet[model_name](financial_statement))
 
     due_diligence_rating = _due_diligence("due_diligence")
 
@@ -20,3 +22,23 @@ def due_diligence(fleet, financial_statement, extra_due_diligence=True):
         )
 
     return due_diligence_rating
+
+
+@REGISTER
+def average_rating(*results):
+    return mean(_rating(*result) for result in results)
+
+
+@REGISTER
+async def async_due_diligence(fleet, financial_statement, extra_due_diligence=True):
+    """due_diligence for an AsyncModelProxy; both models run at the same time."""
+    model_names = ["due_diligence"]
+    if extra_due_diligence:
+        model_names.append("due_diligence_extra")
+
+    results = await asyncio.gather(
+        *(fleet[model_name](financial_statement) for model_name in model_names)
+    )
+    ratings = [_rating(*result) for result in results]
+
+    return ratings[0] if len(ratings) == 1 else mean(ratings)
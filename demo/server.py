@@ -1,9 +1,9 @@
 import multiprocessing as mp
 
-from flask import Flask, jsonify, request
-from hft_src.high_freq_trading_logic import due_diligence
+from flask import Flask, Response, jsonify, request
 
 from streamliner.fleet import MultiDeviceFleet
+from streamliner.rpc import RPCServer
 
 app = Flask(__name__)
 
@@ -20,12 +20,19 @@ def process_request():
 @app.route("/server_side_due_diligence", methods=["POST"])
 def run_due_diligence():
     kwargs = request.get_json()
-    fleet = app.config["fleet"]
-    result = due_diligence(fleet, **kwargs)
+    # Runs inside the fleet: both models' results stay on the workers.
+    result = app.config["md_fleet"].run_graph("due_diligence", **kwargs)
 
     return jsonify({"result": result})
 
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    text = app.config["md_fleet"].prometheus_text()
+
+    return Response(text, mimetype="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     mp.set_start_method("spawn")
     model_builder_cfg = {
@@ -34,9 +41,13 @@ if __name__ == "__main__":
     }
 
     device_indices = [0, 1]
-    md_fleet = MultiDeviceFleet(device_indices, model_builder_cfg)
+    md_fleet = MultiDeviceFleet(device_indices, model_builder_cfg, shared_cache=True)
 
+    app.config["md_fleet"] = md_fleet
     app.config["fleet_callable"] = md_fleet.fleet_callable
-    app.config["fleet"] = md_fleet.model_proxy
 
-    app.run(debug=True)
+    # Binary RPC endpoint for remote fleet callables; see demo/client.py.
+    RPCServer(md_fleet.fleet_callable, port=5001).start()
+
+    # The reloader would run this block twice, starting a second fleet and server.
+    app.run(debug=True, use_reloader=False)
@@ -0,0 +1,126 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def default_cache_dir():
+    return Path(
+        os.environ.get(
+            "STREAMLINER_ARTIFACT_CACHE",
+            Path.home() / ".cache" / "streamliner" / "artifacts",
+        )
+    )
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on `path` against other processes and threads."""
+    with open(path, "a+b") as file:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+def parse_checksum(checksum):
+    """Split "algorithm:digest" into its parts; a bare digest is taken as sha256."""
+    algorithm, _, digest = checksum.rpartition(":")
+    return algorithm or "sha256", digest.lower()
+
+
+def file_digest(path, algorithm="sha256", chunk_size=1 << 20):
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_key(checksum, source):
+    """Name a file in the cache by its checksum, or by its source without one."""
+    if checksum is not None:
+        algorithm, digest = parse_checksum(checksum)
+        return f"{algorithm}-{digest}"
+    return "source-" + hashlib.blake2b(source.encode(), digest_size=20).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Node-wide store of model files, shared by every worker, process and restart.
+
+    A file with a checksum is stored under that checksum, so models sharing
+    weights share one copy and a file is fetched at most once per node. A file
+    without one is stored under its source and is trusted once cached. Fetches
+    happen under a per-file lock into a temporary file beside the cache entry,
+    which is verified and then renamed into place, so readers never see a
+    partial file and concurrent workers wait for one download instead of
+    starting their own.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+
+    def path(self, key):
+        return self.cache_dir / key[-2:] / key
+
+    def get(self, key, fetch, checksum=None):
+        """Return the cached file for `key`, calling fetch(path) to fill it if needed.
+
+        Raises ValueError when the fetched file does not match `checksum`.
+        """
+        path = self.path(key)
+        if path.exists():
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(path.parent / f".{key}.lock"):
+            if path.exists():
+                return path
+            fd, partial = tempfile.mkstemp(dir=path.parent, prefix=f".{key}.")
+            os.close(fd)
+            try:
+                fetch(partial)
+                if checksum is not None:
+                    algorithm, expected = parse_checksum(checksum)
+                    actual = file_digest(partial, algorithm)
+                    if actual != expected:
+                        raise ValueError(
+                            f"Checksum mismatch for {key}: expected {expected}, "
+                            f"got {actual}."
+                        )
+                os.replace(partial, path)
+            finally:
+                if os.path.exists(partial):
+                    os.unlink(partial)
+        return path
+
+    def discard(self, key):
+        """Remove a cached file, e.g. one found corrupted, so it is fetched again."""
+        path = self.path(key)
+        if not path.parent.exists():
+            return
+        with file_lock(path.parent / f".{key}.lock"):
+            if path.exists():
+                path.unlink()
+
+
+def place(source, destination):
+    """Atomically put a cached file at `destination`, hard-linked where possible."""
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    fd, partial = tempfile.mkstemp(dir=destination.parent, prefix=".placing-")
+    os.close(fd)
+    os.unlink(partial)
+    try:
+        try:
+            os.link(source, partial)
+        except OSError:  # Different file systems, or links unsupported.
+            shutil.copyfile(source, partial)
+        os.replace(partial, destination)
+    finally:
+        if os.path.exists(partial):
+            os.unlink(partial)
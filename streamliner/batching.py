@@ -0,0 +1,92 @@
+from queue import Empty
+from time import perf_counter
+
+
+class BatchPolicy:
+    """
+    Gathers pending calls for one model into a single forward pass.
+
+    Models opt in through a "batching" entry in their config:
+
+        "batching": {"max_batch_size": 16, "max_wait_us": 2000, "batch_method": "batch"}
+
+    A call is batchable when it targets `method_name` (None for the model itself)
+    with a single positional argument and no keyword arguments. The batched entry
+    point receives the list of those arguments and must return a list of results
+    in the same order. An argument that is already a batch, a list or tuple or an
+    array with more than `max_item_ndim` dimensions, is left to the model itself.
+    """
+
+    def __init__(
+        self,
+        max_batch_size=8,
+        max_wait_us=1000,
+        method_name=None,
+        batch_method="batch",
+        max_item_ndim=3,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_us / 1e6
+        self.method_name = method_name
+        self.batch_method = batch_method
+        self.max_item_ndim = max_item_ndim
+
+    def accepts(self, call_dict):
+        if not (
+            call_dict["method_name"] == self.method_name
+            and len(call_dict["args"]) == 1
+            and not call_dict["kwargs"]
+        ):
+            return False
+        (item,) = call_dict["args"]
+        if isinstance(item, (list, tuple)):
+            return False
+        return getattr(item, "ndim", 0) <= self.max_item_ndim
+
+    def gather(self, first_request, get):
+        """Collect pending requests until the batch is full or max_wait elapses.
+
+        `get(timeout=...)` returns the next pending request and raises queue.Empty
+        once the timeout expires. The first request that cannot join the batch, a
+        call to another model or a request that is not a call at all, is returned
+        alongside it so the caller can run it next and keep arrival order.
+        """
+        batch = [first_request]
+        model_name = first_request.call_dict["model_name"]
+        deadline = perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                request = get(timeout=max(deadline - perf_counter(), 0))
+            except Empty:
+                break
+            if not (
+                request is not None
+                and request.op == "call"
+                and request.call_dict["model_name"] == model_name
+                and self.accepts(request.call_dict)
+            ):
+                return batch, [request]
+            batch.append(request)
+        return batch, []
+
+    def execute(self, model, batch):
+        results = getattr(model, self.batch_method)(
+            [call_dict["args"][0] for call_dict in batch]
+        )
+        results = list(results)
+        if len(results) != len(batch):
+            raise ValueError(
+                f"Batched method '{self.batch_method}' returned {len(results)} results "
+                f"for a batch of {len(batch)}."
+            )
+        return results
+
+
+def batch_policies(config):
+    return {
+        model_name: BatchPolicy(**model_cfg["batching"])
+        for model_name, model_cfg in config["models"].items()
+        if model_cfg.get("batching")
+    }
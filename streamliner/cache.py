@@ -0,0 +1,310 @@
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from multiprocessing.managers import BaseManager
+
+try:
+    import numpy as np
+except ImportError:  # Arrays are hashed through pickle without numpy.
+    np = None
+
+
+def call_key(call_dict, hash_paths=False):
+    """Content hash of a call's model, method and arguments.
+
+    Arrays and buffers are hashed from their raw bytes, and os.PathLike
+    arguments by path, size and modification time, so a rewritten file misses.
+    With hash_paths=True, strings naming existing files are treated the same way.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    _update(digest, call_dict["model_name"], hash_paths)
+    _update(digest, call_dict["method_name"], hash_paths)
+    _update(digest, call_dict["args"], hash_paths)
+    _update(digest, call_dict["kwargs"], hash_paths)
+    return digest.digest()
+
+
+def _update(digest, obj, hash_paths):
+    if obj is None or isinstance(obj, (bool, int, float, complex)):
+        digest.update(f"{type(obj).__name__}:{obj!r};".encode())
+    elif isinstance(obj, str):
+        if hash_paths and os.path.isfile(obj):
+            _update_path(digest, obj)
+        else:
+            digest.update(b"str:%d:" % len(obj))
+            digest.update(obj.encode("utf-8", "surrogatepass"))
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        view = memoryview(obj)
+        if not view.c_contiguous:
+            view = memoryview(view.tobytes())
+        digest.update(b"bytes:%d:" % view.nbytes)
+        digest.update(view.cast("B"))
+    elif isinstance(obj, (tuple, list)):
+        digest.update(b"%s:%d(" % (type(obj).__name__.encode(), len(obj)))
+        for item in obj:
+            _update(digest, item, hash_paths)
+        digest.update(b")")
+    elif isinstance(obj, dict):
+        digest.update(b"dict:%d{" % len(obj))
+        for key in sorted(obj, key=repr):
+            _update(digest, key, hash_paths)
+            _update(digest, obj[key], hash_paths)
+        digest.update(b"}")
+    elif isinstance(obj, os.PathLike):
+        _update_path(digest, os.fspath(obj))
+    elif np is not None and isinstance(obj, np.ndarray) and not obj.dtype.hasobject:
+        digest.update(f"ndarray:{obj.dtype.str}:{obj.shape};".encode())
+        digest.update(memoryview(np.ascontiguousarray(obj)).cast("B"))
+    else:
+        digest.update(b"pickle:")
+        digest.update(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _update_path(digest, path):
+    stat = os.stat(path)
+    digest.update(f"path:{os.path.abspath(path)}:{stat.st_size}:".encode())
+    digest.update(f"{stat.st_mtime_ns};".encode())
+
+
+def result_nbytes(obj):
+    """Rough in-memory size of a result, used against a cache's byte budget."""
+    if np is not None and isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(result_nbytes(item) for item in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            result_nbytes(key) + result_nbytes(value) for key, value in obj.items()
+        )
+    return sys.getsizeof(obj)
+
+
+class ResultCache:
+    """
+    Per-model LRU store of call results.
+
+    Models opt in through a "cache" entry in their config:
+
+        "cache": {"max_entries": 1024, "max_bytes": 268435456, "ttl_seconds": 600}
+
+    Every limit is optional. The least recently used results are evicted once a
+    model holds more than `max_entries` results or `max_bytes` of them, and a
+    result older than `ttl_seconds` is dropped when it is next looked up. With
+    "hash_paths": true, string arguments naming files are keyed by the file's
+    modification time as well. Hits, misses and evictions are counted per model.
+    """
+
+    def __init__(self, models_config):
+        self.settings = {
+            model_name: model_cfg["cache"]
+            for model_name, model_cfg in models_config.items()
+            if model_cfg.get("cache")
+        }
+        self.entries = {model_name: OrderedDict() for model_name in self.settings}
+        self.nbytes = dict.fromkeys(self.settings, 0)
+        self.counters = {
+            model_name: {"hits": 0, "misses": 0, "evictions": 0, "coalesced": 0}
+            for model_name in self.settings
+        }
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def caches(self, model_name):
+        return model_name in self.settings
+
+    def hash_paths(self, model_name):
+        return self.settings[model_name].get("hash_paths", False)
+
+    def get(self, model_name, key):
+        """Return (True, result) for a cached call, otherwise (False, None)."""
+        with self.lock:
+            entries = self.entries[model_name]
+            entry = entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.time():
+                self._remove(model_name, key)
+                self.counters[model_name]["evictions"] += 1
+                entry = None
+            if entry is None:
+                self.counters[model_name]["misses"] += 1
+                return False, None
+            entries.move_to_end(key)
+            self.counters[model_name]["hits"] += 1
+            return True, entry[0]
+
+    def put(self, model_name, key, result):
+        settings = self.settings[model_name]
+        nbytes = result_nbytes(result)
+        max_bytes = settings.get("max_bytes")
+        if max_bytes is not None and nbytes > max_bytes:
+            return
+        ttl = settings.get("ttl_seconds")
+        expires = time.time() + ttl if ttl is not None else None
+        with self.lock:
+            entries = self.entries[model_name]
+            if key in entries:
+                self._remove(model_name, key)
+            entries[key] = (result, nbytes, expires)
+            self.nbytes[model_name] += nbytes
+            max_entries = settings.get("max_entries")
+            while (max_entries is not None and len(entries) > max_entries) or (
+                max_bytes is not None and self.nbytes[model_name] > max_bytes
+            ):
+                self._remove(model_name, next(iter(entries)))
+                self.counters[model_name]["evictions"] += 1
+
+    def count_coalesced(self, model_name):
+        with self.lock:
+            self.counters[model_name]["coalesced"] += 1
+
+    def _remove(self, model_name, key):
+        _, nbytes, _ = self.entries[model_name].pop(key)
+        self.nbytes[model_name] -= nbytes
+
+    def clear(self, model_name=None):
+        with self.lock:
+            for name in self.entries if model_name is None else [model_name]:
+                self.entries[name].clear()
+                self.nbytes[name] = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                model_name: {
+                    **counters,
+                    "entries": len(self.entries[model_name]),
+                    "bytes": self.nbytes[model_name],
+                }
+                for model_name, counters in self.counters.items()
+            }
+
+
+class ResultCacheManager(BaseManager):
+    """Serves one ResultCache to every process holding a proxy to it."""
+
+
+ResultCacheManager.register(
+    "ResultCache",
+    ResultCache,
+    exposed=(
+        "caches",
+        "hash_paths",
+        "get",
+        "put",
+        "count_coalesced",
+        "clear",
+        "stats",
+    ),
+)
+
+
+class CachedFleetCallable:
+    """
+    Serves repeated calls to caching models from a ResultCache.
+
+    Wraps a fleet callable such as a DeviceLoadBalancer. Calls to models
+    without a "cache" config pass straight through. Identical calls that arrive
+    while the first is still running share its future, so they cost one device
+    execution; this coalescing happens within each process. Results come back as
+    stored, so callers should not mutate them.
+
+    A plain ResultCache is copied into each process the callable is sent to; a
+    proxy from ResultCacheManager shares one cache between all of them.
+    """
+
+    def __init__(self, fleet_callable, cache):
+        self.fleet_callable = fleet_callable
+        self.cache = cache
+        self.cached_models = {}
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["in_flight"] = {}
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _caches(self, model_name):
+        if model_name not in self.cached_models:
+            self.cached_models[model_name] = (
+                self.cache.hash_paths(model_name)
+                if self.cache.caches(model_name)
+                else None
+            )
+        return self.cached_models[model_name]
+
+    def submit(self, call_dict):
+        from .fleet import submit_call
+
+        model_name = call_dict["model_name"]
+        hash_paths = self._caches(model_name)
+        if hash_paths is None:
+            return submit_call(self.fleet_callable, call_dict)
+
+        key = call_key(call_dict, hash_paths)
+        with self.lock:
+            future = self.in_flight.get(key)
+        if future is not None:
+            self.cache.count_coalesced(model_name)
+            return future
+
+        found, result = self.cache.get(model_name, key)
+        if found:
+            future = Future()
+            future.set_result(result)
+            return future
+
+        with self.lock:
+            future = self.in_flight.get(key)
+            if future is None:
+                future = self.in_flight[key] = Future()
+                coalesced = False
+            else:
+                coalesced = True
+        if coalesced:
+            self.cache.count_coalesced(model_name)
+            return future
+
+        def on_done(call_future):
+            exception = call_future.exception()
+            if exception is None:
+                self.cache.put(model_name, key, call_future.result())
+            with self.lock:
+                self.in_flight.pop(key, None)
+            if exception is None:
+                future.set_result(call_future.result())
+            else:
+                future.set_exception(exception)
+
+        # Submitting can block, e.g. on a model build barrier, so it happens
+        # outside the lock with later identical calls waiting on `future`.
+        try:
+            submit_call(self.fleet_callable, call_dict).add_done_callback(on_done)
+        except BaseException as e:
+            with self.lock:
+                self.in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+        return future
+
+    def __call__(self, call_dict):
+        return self.submit(call_dict).result()
@@ -0,0 +1,127 @@
+import itertools
+import struct
+import threading
+from concurrent.futures import Future
+from multiprocessing.reduction import ForkingPickler
+from time import perf_counter
+
+from .errors import RemoteError, decode_error
+
+# Replies arrive as this header, then the pickled payload in a message of its own,
+# so one that fails to unpickle still says which request it answers.
+REPLY_HEADER = struct.Struct("!q?")
+
+
+class RequestChannel:
+    """
+    Multiplexes concurrent requests over one connection.
+
+    Requests go out as (request_id, op, payload) and replies come back as a
+    REPLY_HEADER of (request_id, ok) followed by the payload, or by an
+    `encode_error` description when ok is False. A dispatcher thread reads replies
+    and resolves the matching future, so any number of callers can have work
+    outstanding on the same connection at once.
+
+    With a SharedMemoryTransport, large arrays in payloads travel through shared
+    memory. Argument slots are freed when the reply arrives, and result slots are
+    handed back to the worker with a "release" message once their views are gone.
+
+    Each future carries its `request_id`, which `cancel` takes, and once resolved
+    `recv_seconds`, the time spent unpickling and loading its reply.
+    """
+
+    def __init__(self, conn, transport=None):
+        self.conn = conn
+        self.transport = transport
+        self.pending = {}
+        self.request_ids = itertools.count()
+        self.send_lock = threading.Lock()
+        self.closed = False
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def submit(self, op, payload):
+        future = Future()
+        request_id = future.request_id = next(self.request_ids)
+        slots, released = [], []
+        if self.transport is not None:
+            released = self.transport.take_released()
+            payload = self.transport.export(payload, slots)
+        self.pending[request_id] = (future, slots)
+        try:
+            with self.send_lock:
+                if released:
+                    self.conn.send((None, "release", released))
+                self.conn.send((request_id, op, payload))
+        except BaseException:
+            self.pending.pop(request_id, None)
+            self._free(slots)
+            raise
+        if self.closed:
+            self._fail_pending()
+        return future
+
+    def cancel(self, request_id):
+        """Ask the worker to drop a request it has not started yet.
+
+        The request's future then fails with CancelledError; one already running
+        completes as usual.
+        """
+        if request_id in self.pending:
+            self.send((None, "cancel", request_id))
+
+    def send(self, message):
+        """Send a message that expects no reply."""
+        with self.send_lock:
+            self.conn.send(message)
+
+    def _dispatch(self):
+        try:
+            while True:
+                try:
+                    header = self.conn.recv_bytes()
+                    message = self.conn.recv_bytes()
+                except (EOFError, OSError):
+                    break
+                received = perf_counter()
+                request_id, ok = REPLY_HEADER.unpack(header)
+                future, slots = self.pending.pop(request_id, (None, None))
+                if future is None:
+                    continue
+                self._free(slots)
+                try:
+                    payload = ForkingPickler.loads(message)
+                    if not ok:
+                        payload = decode_error(payload)
+                    elif self.transport is not None:
+                        payload = self.transport.load(payload, track_release=True)
+                except Exception as e:
+                    ok, payload = False, RemoteError(type(e).__name__, str(e))
+                if future.done():
+                    continue  # Cancelled by the caller, e.g. an asyncio timeout.
+                if ok:
+                    future.recv_seconds = perf_counter() - received
+                    future.set_result(payload)
+                else:
+                    future.set_exception(payload)
+        finally:
+            self.closed = True
+            self._fail_pending()
+
+    def _free(self, slots):
+        for slot in slots:
+            self.transport.pool.free(slot)
+
+    def _fail_pending(self):
+        while self.pending:
+            try:
+                _, (future, slots) = self.pending.popitem()
+            except KeyError:
+                break
+            self._free(slots)
+            if not future.done():
+                future.set_exception(RuntimeError("Connection to worker closed."))
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
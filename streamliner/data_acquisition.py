@@ -1,5 +1,21 @@
-from multiprocessing import Manager, Process
+import asyncio
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from inspect import iscoroutinefunction
+from multiprocessing import Array, Process, Queue, Semaphore, Value
 from queue import Empty
+from queue import Queue as ThreadQueue
+from threading import Thread
+
+try:
+    import numpy as np
+except ImportError:  # Batches are collated as lists without numpy.
+    np = None
+
+BACKENDS = ("processes", "threads", "asyncio")
+STARTED, FINISHED, RETIRING = range(3)  # Indices into DataPrefetch.pool.
 
 
 class DataPrefetch:
@@ -27,11 +43,55 @@ class DataPrefetch:
 
     Parameters:
     -----------
-    data_sources (list): A list of sources from which data will be loaded.
+    data_sources: The sources from which data will be loaded. A list (or other
+        sequence), any iterable such as a generator or a file-listing iterator, or
+        a live queue of sources ended by putting None.
     data_loader_callable (callable): A function to load data given a source.
     manager (optional): An instance of multiprocessing.Manager for queue-based operation.
-    worker_count (int, optional): The number of worker processes for data loading.
+    worker_count (int, optional): The number of workers for data loading, or the
+        number to start with when autoscaling.
     queue_max_size (int, optional): The maximum size of the data queue.
+    chunk_size (int, optional): The number of consecutive sources a worker claims at
+        a time. Larger chunks amortize coordination for tiny items; in iterable
+        mode a chunk's results are also delivered as one message.
+    batch_size (int, optional): Yield collated batches of this many items instead
+        of single items. Batches are assembled by the workers with `collate_fn`,
+        which by default stacks NumPy arrays into one contiguous array, and come
+        out as (batch_data, batch_srcs). Overrides chunk_size.
+    collate_fn (callable, optional): Turns a list of loaded items into a batch.
+    ordered (bool, optional): Yield items in source order. Iterable mode only.
+    reorder_window (int, optional): The most chunks (or batches) that may be
+        loaded ahead of the next one due when ordered. Defaults to twice the
+        worker count.
+    backend (str, optional): How workers run: "processes" (the default) for
+        CPU-bound loaders, "threads" for loaders that release the GIL such as
+        remote reads or image decoding, or "asyncio" for a coroutine function
+        loader, run as concurrent tasks on one event loop thread. A chunk's
+        sources are loaded concurrently under "asyncio".
+    max_workers (int, optional): Autoscale the workers between `min_workers` and
+        this many with a PrefetchAutoscaler; see `stats` for how it sees them.
+    min_workers (int, optional): The fewest workers when autoscaling.
+    autoscale_interval (float, optional): Seconds between autoscaling decisions.
+
+    Workers claim chunks of an immutable copy of a sequence through a shared
+    counter, so no process serves the work list. Iterables and queues are
+    streamed instead: a feeder thread hands chunks to the workers through a small
+    bounded queue, so memory stays bounded and a slow consumer stalls the source.
+    In iterable mode results flow through a multiprocessing.Queue; in queue
+    filling mode they go to the manager's queue so consumers in other processes
+    can share it.
+
+    Chunks are numbered as they are claimed. When ordered, chunks that finish
+    early wait in the consumer until their turn, and a semaphore stops workers
+    from claiming more than `reorder_window` chunks past the oldest one pending.
+
+    Each worker puts None on the data queue when it runs out of work or is
+    retired by the autoscaler, so iteration ends once a None has arrived for
+    every worker started rather than on a timeout; consumers of the queue check
+    with `all_finished`. A loader error is raised from the iterator; in queue
+    filling mode it is put on the queue as (exception, src) in place of the item,
+    or with a src of None if it did not come from loading one, and loading goes
+    on.
     """
 
     def __init__(
@@ -41,34 +101,351 @@ class DataPrefetch:
         manager=None,
         worker_count=2,
         queue_max_size=50,
+        chunk_size=1,
+        batch_size=None,
+        collate_fn=None,
+        ordered=False,
+        reorder_window=None,
+        backend="processes",
+        max_workers=None,
+        min_workers=1,
+        autoscale_interval=0.5,
     ):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {', '.join(BACKENDS)}.")
+        if (backend == "asyncio") != iscoroutinefunction(data_loader_callable):
+            raise ValueError(
+                'The "asyncio" backend, and only it, takes a coroutine function.'
+            )
+        self.autoscaler = None
+        if max_workers is not None:
+            if not 1 <= min_workers <= worker_count <= max_workers:
+                raise ValueError(
+                    "Workers must satisfy 1 <= min_workers <= worker_count "
+                    "<= max_workers."
+                )
+            if queue_max_size < 1:
+                raise ValueError("Autoscaling needs a bounded queue.")
+            self.autoscaler = PrefetchAutoscaler(
+                min_workers, max_workers, queue_max_size, autoscale_interval
+            )
+        self.most_workers = most_workers = max_workers or worker_count
+        self.backend = backend
+        # Threads and tasks share this process, so plain queues will do.
+        local_queue = Queue if backend == "processes" else ThreadQueue
         self.is_iterable_mode = (
             not manager
         )  # Automatically determine mode based on manager presence.
-        manager = manager if manager else Manager()
-        self.data_source_list = manager.list(data_sources)
-        self.total_items = len(data_sources)
+        if ordered and not self.is_iterable_mode:
+            raise ValueError("Ordered output is only supported in iterable mode.")
+        self.is_streaming = not (
+            hasattr(data_sources, "__len__") and hasattr(data_sources, "__getitem__")
+        )
+        if self.is_streaming:
+            self.data_sources = None
+            self.source_iterator = (
+                iter(data_sources.get, None)
+                if hasattr(data_sources, "get")
+                else iter(data_sources)
+            )
+            self.source_queue = local_queue(2 * most_workers)
+            self.total_items = None
+        else:
+            self.data_sources = list(data_sources)
+            self.total_items = len(self.data_sources)
+            self.next_index = Value("q", 0)
         self.data_loader_callable = data_loader_callable
         self.worker_count = worker_count
-        self.prefetched_data_queue = manager.Queue(queue_max_size)
+        self.batch_size = batch_size
+        self.chunk_size = batch_size or chunk_size
+        self.collate_fn = collate_fn or collate_batch
+        self.ordered = ordered
+        self.reorder_window = (
+            Semaphore(reorder_window or 2 * most_workers) if ordered else None
+        )
+        # Workers started, finished and due to retire, then messages loaded and
+        # the seconds spent loading them, which are only counted when autoscaling.
+        self.pool = Array("i", 3)
+        self.loaded = Array("d", 2, lock=False)
+        self.workers = []
+        self.received = 0
+        if self.is_iterable_mode:
+            self.prefetched_data_queue = local_queue(queue_max_size)
+            self.loaded_chunk = deque()
+            self.finished_workers = 0
+            self.pending_chunks = {}
+            self.next_chunk = 0
+        else:
+            self.prefetched_data_queue = manager.Queue(queue_max_size)
 
         if not self.is_iterable_mode:
             self.start_workers()
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Only the parent process reads the source and tracks the workers.
+        for attribute in ("source_iterator", "feeder", "workers", "controller"):
+            state.pop(attribute, None)
+        return state
+
     def start_workers(self):
+        if self.is_streaming:
+            self.feeder = Thread(target=self.feed_sources, daemon=True)
+            self.feeder.start()
+        if self.backend == "asyncio":
+            self.loop = asyncio.new_event_loop()
+            self.executor = ThreadPoolExecutor(self.most_workers + 1)
+            self.tasks = set()
+            self.workers.append(Thread(target=self.run_loop, daemon=True))
+            self.workers[0].start()
         for _ in range(self.worker_count):
-            worker = Process(target=self.worker_task)
-            worker.daemon = True
-            worker.start()
+            self.add_worker()
+        if self.autoscaler is not None:
+            self.controller = Thread(target=self.control_workers, daemon=True)
+            self.controller.start()
 
-    def worker_task(self):
-        while self.data_source_list:
+    def add_worker(self):
+        """Start a worker, or keep one due to retire, unless every worker is done.
+
+        Returns False once all workers have finished, as the data has run out.
+        """
+        with self.pool.get_lock():
+            started, finished, retiring = self.pool
+            if retiring:
+                self.pool[RETIRING] -= 1
+                return True
+            if started and finished == started:
+                return False
+            self.pool[STARTED] += 1
+        if self.backend == "asyncio":
+            self.loop.call_soon_threadsafe(self.start_task)
+            return True
+        worker_class = Process if self.backend == "processes" else Thread
+        worker = worker_class(target=self.worker_task, daemon=True)
+        worker.start()
+        self.workers.append(worker)
+        return True
+
+    def retire_worker(self):
+        """Have one worker exit once it finishes its current chunk."""
+        with self.pool.get_lock():
+            self.pool[RETIRING] += 1
+
+    def live_workers(self):
+        with self.pool.get_lock():
+            started, finished, retiring = self.pool
+        return started - finished - retiring
+
+    def all_finished(self, sentinels):
+        """True once `sentinels` Nones taken off the data queue cover every worker.
+
+        A worker counts itself finished before putting its None, and no worker
+        starts after all have finished, so the count cannot grow past this point.
+        """
+        if not sentinels:
+            return False
+        with self.pool.get_lock():
+            return sentinels >= self.pool[STARTED]
+
+    def control_workers(self):
+        autoscaler = self.autoscaler
+        while True:
+            time.sleep(autoscaler.interval)
+            with self.pool.get_lock():
+                started, finished, retiring = self.pool
+                messages, load_seconds = self.loaded
+            if finished == started or not any(
+                worker.is_alive() for worker in self.workers
+            ):
+                return
+            if self.is_iterable_mode:
+                queued = messages - self.received
+            else:
+                queued = self.prefetched_data_queue.qsize()
+            workers = started - finished - retiring
+            target = autoscaler.update(
+                time.perf_counter(),
+                workers,
+                queued,
+                messages,
+                load_seconds,
+            )
+            for _ in range(target - workers):
+                if not self.add_worker():
+                    return
+            for _ in range(workers - target):
+                self.retire_worker()
+
+    def stats(self):
+        """The number of live workers and, when autoscaling, what the controller
+        last saw: how full the queue was, how fast the consumer drained it, the
+        seconds a worker spends loading each message, and whether the loader
+        is the bottleneck (see PrefetchAutoscaler).
+        """
+        stats = {"workers": self.live_workers()}
+        if self.autoscaler is not None:
+            stats.update(self.autoscaler.stats())
+        return stats
+
+    def feed_sources(self):
+        try:
+            chunk_index = 0
+            chunk = []
+            for src in self.source_iterator:
+                chunk.append(src)
+                if len(chunk) == self.chunk_size:
+                    self._feed_chunk(chunk_index, chunk)
+                    chunk_index += 1
+                    chunk = []
+            if chunk:
+                self._feed_chunk(chunk_index, chunk)
+        except Exception as e:
+            self.prefetched_data_queue.put(self.error_message(e))
+            raise
+        finally:
+            self.source_queue.put(None)
+
+    def _feed_chunk(self, chunk_index, chunk):
+        if self.reorder_window is not None:
+            self.reorder_window.acquire()
+        self.source_queue.put((chunk_index, chunk))
+
+    def claim_chunk(self):
+        if self.is_streaming:
+            claimed = self.source_queue.get()
+            if claimed is None:
+                self.source_queue.put(None)  # Leave the end for the other workers.
+                return None, []
+            return claimed
+        if self.reorder_window is not None:
+            self.reorder_window.acquire()
+        with self.next_index.get_lock():
+            start = self.next_index.value
+            self.next_index.value = start + self.chunk_size
+        chunk = self.data_sources[start : start + self.chunk_size]
+        if not chunk and self.reorder_window is not None:
+            self.reorder_window.release()
+        return start // self.chunk_size, chunk
+
+    def load_chunk(self, chunk):
+        loaded = []
+        for src in chunk:
             try:
-                src = self.data_source_list.pop(0)  # Safely pop from the beginning
-                loaded_data = self.data_loader_callable(src)
-                self.prefetched_data_queue.put((loaded_data, src))
-            except IndexError:  # No more data to acquire
-                break
+                loaded.append((self.data_loader_callable(src), src))
+            except Exception as e:
+                if self.is_iterable_mode:
+                    raise
+                loaded.append((e, src))
+        return self.collate_loaded(loaded)
+
+    def collate_loaded(self, loaded):
+        """Collate a chunk into a batch, leaving out items that failed to load."""
+        if self.batch_size is None:
+            return loaded
+        failed = [item for item in loaded if isinstance(item[0], Exception)]
+        loaded = [item for item in loaded if not isinstance(item[0], Exception)]
+        if not loaded:
+            return failed
+        batch_data, batch_srcs = zip(*loaded)
+        return failed + [(self.collate_fn(list(batch_data)), list(batch_srcs))]
+
+    def error_message(self, error):
+        return error if self.is_iterable_mode else (error, None)
+
+    def messages(self, chunk_index, loaded):
+        """The data queue messages for a loaded chunk.
+
+        Iterable mode sends a chunk as one message, numbered for ordering; queue
+        filling mode sends each item, or the batch, on its own.
+        """
+        if self.is_iterable_mode:
+            return [(chunk_index, loaded)]
+        return loaded
+
+    def record_load(self, message_count, seconds):
+        if self.autoscaler is not None:
+            with self.pool.get_lock():
+                self.loaded[0] += message_count
+                self.loaded[1] += seconds
+
+    def retiring(self):
+        if self.autoscaler is None:
+            return False
+        with self.pool.get_lock():
+            if self.pool[RETIRING]:
+                self.pool[RETIRING] -= 1
+                return True
+        return False
+
+    def finish(self):
+        """Count this worker finished, returning True if it was the last one."""
+        with self.pool.get_lock():
+            self.pool[FINISHED] += 1
+            return self.pool[FINISHED] == self.pool[STARTED]
+
+    def worker_task(self):
+        try:
+            while not self.retiring():
+                chunk_index, chunk = self.claim_chunk()
+                if not chunk:  # No more data to acquire
+                    break
+                start = time.perf_counter()
+                messages = self.messages(chunk_index, self.load_chunk(chunk))
+                self.record_load(len(messages), time.perf_counter() - start)
+                for message in messages:
+                    self.prefetched_data_queue.put(message)
+        except Exception as e:
+            self.prefetched_data_queue.put(self.error_message(e))
+            raise
+        finally:
+            self.finish()
+            self.prefetched_data_queue.put(None)
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+            self.executor.shutdown(wait=False)
+
+    def start_task(self):
+        # The loop only keeps weak references to its tasks.
+        task = self.loop.create_task(self.async_worker_task())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def async_worker_task(self):
+        # Claiming a chunk and putting a message can block, so they run on the
+        # executor rather than stalling the other tasks.
+        loop = asyncio.get_running_loop()
+        put = self.prefetched_data_queue.put
+        last = False
+        try:
+            while not self.retiring():
+                chunk_index, chunk = await loop.run_in_executor(
+                    self.executor, self.claim_chunk
+                )
+                if not chunk:  # No more data to acquire
+                    break
+                start = time.perf_counter()
+                data = await asyncio.gather(
+                    *map(self.data_loader_callable, chunk),
+                    return_exceptions=not self.is_iterable_mode,
+                )
+                loaded = self.collate_loaded(list(zip(data, chunk)))
+                messages = self.messages(chunk_index, loaded)
+                self.record_load(len(messages), time.perf_counter() - start)
+                for message in messages:
+                    await loop.run_in_executor(self.executor, put, message)
+        except Exception as e:
+            await loop.run_in_executor(self.executor, put, self.error_message(e))
+            raise
+        finally:
+            last = self.finish()
+            await loop.run_in_executor(self.executor, put, None)
+            if last:
+                loop.stop()
 
     def __iter__(self):
         if not self.is_iterable_mode:
@@ -81,10 +458,147 @@ class DataPrefetch:
     def __next__(self):
         if not self.is_iterable_mode:
             raise StopIteration
-        try:
-            return self.prefetched_data_queue.get(timeout=1)  # Adjust timeout as needed
-        except Empty:
-            raise StopIteration
+        while not self.loaded_chunk:
+            if self.all_finished(self.finished_workers):
+                raise StopIteration
+            try:
+                message = self.prefetched_data_queue.get(timeout=1)
+            except Empty:
+                # Workers that were killed never send their None.
+                if not any(worker.is_alive() for worker in self.workers):
+                    self.finished_workers = self.pool[STARTED]
+                continue
+            if message is None:
+                self.finished_workers += 1
+                continue
+            if isinstance(message, Exception):
+                raise message
+            self.received += 1
+            if not self.ordered:
+                self.loaded_chunk.extend(message[1])
+            else:
+                chunk_index, loaded = message
+                self.pending_chunks[chunk_index] = loaded
+                while self.next_chunk in self.pending_chunks:
+                    self.loaded_chunk.extend(self.pending_chunks.pop(self.next_chunk))
+                    self.next_chunk += 1
+                    self.reorder_window.release()
+        return self.loaded_chunk.popleft()
 
     def __len__(self):
+        if self.total_items is None:
+            raise TypeError("DataPrefetch over a streamed source has no length.")
+        if self.batch_size is not None:
+            return -(-self.total_items // self.batch_size)
         return self.total_items
+
+
+class PrefetchAutoscaler:
+    """
+    Sizes a DataPrefetch's workers to keep its queue non-empty with the fewest.
+
+    Every `interval` seconds DataPrefetch hands it a sample: the live workers, how
+    full the queue is, and running totals of messages loaded and the seconds
+    workers spent loading them. From consecutive samples it derives how fast the
+    consumer drains the queue and how long one worker takes per message, so
+    drain rate times load time is the number of workers the consumer needs.
+
+    A queue under `low_water` of its capacity means the consumer is waiting on
+    the loaders: the pool grows to that need plus `headroom`, by at least one
+    worker, and doubles when the queue is empty, since a starved consumer's drain
+    rate only shows what the loaders managed. A queue over `high_water` means
+    loaders are waiting on the consumer, whose drain rate is then its real
+    demand: the pool shrinks to the need plus headroom. In between it is left
+    alone. A queue running low with `max_workers` already loading means the
+    loader is the bottleneck, reported as "loader_bound" by `stats`, with the
+    time spent that way in "loader_bound_seconds".
+    """
+
+    def __init__(
+        self,
+        min_workers,
+        max_workers,
+        queue_size,
+        interval=0.5,
+        low_water=0.25,
+        high_water=0.75,
+        headroom=1.25,
+    ):
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.interval = interval
+        self.low_water = low_water
+        self.high_water = high_water
+        self.headroom = headroom
+        self.previous = None
+        self.fill = 0.0
+        self.drain_rate = 0.0
+        self.load_seconds = None
+        self.loader_bound = False
+        self.loader_bound_seconds = 0.0
+
+    def update(self, now, workers, queued, messages, load_seconds):
+        """Take a sample and return the number of workers the pool should have."""
+        previous, self.previous = self.previous, (now, queued, messages, load_seconds)
+        if previous is None:
+            return workers
+        then, previous_queued, previous_messages, previous_seconds = previous
+        elapsed = now - then
+        produced = messages - previous_messages
+        if produced:
+            self.load_seconds = (load_seconds - previous_seconds) / produced
+        # Whatever was loaded and did not stay in the queue was drained from it.
+        self.drain_rate = max(produced - (queued - previous_queued), 0) / elapsed
+        self.fill = fill = min(queued / self.queue_size, 1.0)
+        needed = workers
+        if self.load_seconds is not None:
+            needed = math.ceil(self.drain_rate * self.load_seconds * self.headroom)
+
+        target = workers
+        if fill < self.low_water:
+            target = max(needed, workers + 1, 2 * workers if not queued else 0)
+        elif fill > self.high_water:
+            target = min(needed, workers)
+        self.loader_bound = fill < self.low_water and workers >= self.max_workers
+        if self.loader_bound:
+            self.loader_bound_seconds += elapsed
+        return min(max(target, self.min_workers), self.max_workers)
+
+    def stats(self):
+        return {
+            "fill": self.fill,
+            "drain_per_sec": self.drain_rate,
+            "load_seconds_per_message": self.load_seconds,
+            "loader_bound": self.loader_bound,
+            "loader_bound_seconds": self.loader_bound_seconds,
+        }
+
+
+def collate_batch(items):
+    """Stack NumPy arrays of one shape and dtype into a single contiguous array.
+
+    Tuples and dicts are collated field by field; anything else is returned as a
+    list.
+    """
+    first = items[0]
+    if (
+        np is not None
+        and isinstance(first, np.ndarray)
+        and all(
+            isinstance(item, np.ndarray)
+            and item.shape == first.shape
+            and item.dtype == first.dtype
+            for item in items
+        )
+    ):
+        return np.stack(items)
+    if isinstance(first, tuple) and all(
+        isinstance(item, tuple) and len(item) == len(first) for item in items
+    ):
+        return tuple(collate_batch(list(field)) for field in zip(*items))
+    if isinstance(first, dict) and all(
+        isinstance(item, dict) and item.keys() == first.keys() for item in items
+    ):
+        return {key: collate_batch([item[key] for item in items]) for key in first}
+    return items
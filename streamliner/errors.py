@@ -0,0 +1,48 @@
+import builtins
+import pickle
+
+
+class RemoteError(RuntimeError):
+    """An exception raised in another process that could not be rebuilt here."""
+
+    def __init__(self, type_name, message):
+        super().__init__(f"{type_name}: {message}")
+        self.type_name = type_name
+        self.message = message
+
+    def __reduce__(self):
+        return type(self), (self.type_name, self.message)
+
+
+def encode_error(error):
+    """Describe an exception natively, with a pickled copy where it pickles."""
+    cls = type(error)
+    described = {"type": f"{cls.__module__}.{cls.__qualname__}", "message": str(error)}
+    try:
+        described["pickled"] = pickle.dumps(error, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        pass
+    return described
+
+
+def decode_error(described, allow_pickle=True):
+    """Rebuild an exception from `encode_error`.
+
+    The pickled copy is used when allowed and it loads; otherwise built-in
+    exception types are recreated from their message and anything else becomes a
+    RemoteError naming the original type. Exceptions whose __init__ takes other
+    arguments than their message, for one, pickle but do not unpickle.
+    """
+    if allow_pickle and "pickled" in described:
+        try:
+            return pickle.loads(described["pickled"])
+        except Exception:
+            pass
+    module, _, name = described["type"].rpartition(".")
+    cls = getattr(builtins, name, None) if module == "builtins" else None
+    if isinstance(cls, type) and issubclass(cls, Exception):
+        try:
+            return cls(described["message"])
+        except Exception:
+            pass
+    return RemoteError(described["type"], described["message"])
@@ -1,30 +1,126 @@
-from multiprocessing import Array, Lock, Manager, Pipe, Process, Value
+import asyncio
+import gc
+import itertools
+import logging
+import os
+import sys
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from multiprocessing import (
+    Array,
+    Condition,
+    Pipe,
+    Process,
+    Value,
+    get_start_method,
+    resource_tracker,
+    set_forkserver_preload,
+)
+from multiprocessing.connection import Client
+from threading import Lock as ThreadLock
+from time import perf_counter, time
 
+from .cache import CachedFleetCallable, ResultCache, ResultCacheManager
+from .channel import RequestChannel
+from .graph import GraphRunner, load_graphs
+from .hedging import hedge_policies
 from .model_builder import (
     LocalBuilder,
     RemoteBuilder,
     build_object_by_name,
+    import_to_register,
     load_or_pass_config,
 )
+from .profiling import PROFILE_MODES, merge_profiles
 from .registry import streamliner_registry
+from .scheduling import SchedulerState, build_scheduler
+from .stats import FleetStats, prometheus_text
+from .timer import Timer, timer
+from .transport import SharedMemoryTransport
+from .worker import DeviceWorker, check_number, reconstruct_and_call
+
+logger = logging.getLogger(__name__)
+
+_connect_lock = ThreadLock()
+_build_waiters_lock = ThreadLock()
+_executor_lock = ThreadLock()
+_executor = None
+
+
+def submit_call(fleet_callable, call_dict):
+    """Submit a call without blocking, returning a concurrent.futures.Future.
+
+    Fleet callables without their own `submit`, such as an HTTP client function,
+    run on a shared thread pool.
+    """
+    if hasattr(fleet_callable, "submit"):
+        return fleet_callable.submit(call_dict)
+
+    return _shared_executor().submit(fleet_callable, call_dict)
+
+
+def _shared_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(thread_name_prefix="streamliner")
+    return _executor
 
 
 class SingleDeviceFleet:
-    def __init__(self, model_builder):
+    """
+    Lazily builds and holds the models of one device.
+
+    The top-level "device_memory_bytes" config entry sets a memory budget, either
+    one number for every device or a mapping from device to bytes. A model's size
+    is its "memory_bytes" config entry, or is measured once it is built from its
+    `memory_bytes()` method or the parameters and arrays it holds. Space for a
+    model of known size is reserved before it is built, evicting resident models
+    least recently used first, or least frequently used with a top-level
+    "eviction": "lfu", so the budget holds at peak. Measured sizes outlive
+    eviction; only the first build of a model without "memory_bytes" is
+    accounted for after it returns. Models with "pinned": true in their config
+    are never evicted. `on_build` and `on_evict` report residency changes, e.g.
+    to a scheduler. A fleet that is one of a device's `replicas` workers gets an
+    even share of its budget.
+    """
+
+    def __init__(
+        self, model_builder, on_build=None, on_evict=None, eviction=None, replicas=1
+    ):
         if not isinstance(model_builder, LocalBuilder):
             raise ValueError(
                 "model_builder must be an instance of LocalBuilder or its subclasses."
             )
+        eviction = eviction or model_builder.config.get("eviction", "lru")
+        if eviction not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy: {eviction}")
         self.model_builder = model_builder
+        self.on_build = on_build
+        self.on_evict = on_evict
+        self.eviction = eviction
         self.loaded_models = {}
+        self.build_locks = {}
+        self.build_locks_lock = ThreadLock()
+
+        budget = model_builder.config.get("device_memory_bytes")
+        if isinstance(budget, dict):
+            device = model_builder.device
+            budget = budget.get(str(device), budget.get(device))
+        if budget is not None:
+            budget //= replicas
+        self.memory_budget = budget
+        self.model_bytes = {}  # Resident models and builds holding a reservation.
+        self.measured_bytes = {}  # Last measured size of every model built here.
+        self.last_used = {}
+        self.use_counts = {}
+        self.use_clock = itertools.count()
+        self.memory_lock = ThreadLock()
 
     def __getitem__(self, model_name):
         return self.load_model(model_name)
 
     def __getattr__(self, model_name):
-        if model_name not in self.loaded_models:
-            self.loaded_models[model_name] = self.model_builder.build(model_name)
-        model = self.loaded_models[model_name]
+        model = self.load_model(model_name)
 
         def model_accessor(*args, **kwargs):
             if args or kwargs:
@@ -35,9 +131,165 @@ class SingleDeviceFleet:
         return model_accessor
 
     def load_model(self, model_name):
-        if model_name not in self.loaded_models:
-            self.loaded_models[model_name] = self.model_builder.build(model_name)
-        return self.loaded_models[model_name]
+        model = self.loaded_models.get(model_name)
+        if model is None:
+            with self.build_locks_lock:
+                build_lock = self.build_locks.setdefault(model_name, ThreadLock())
+            with build_lock:
+                model = self.loaded_models.get(model_name)
+                if model is None:
+                    model = self._build(model_name)
+        if self.memory_budget is not None:
+            self.last_used[model_name] = next(self.use_clock)
+            self.use_counts[model_name] = self.use_counts.get(model_name, 0) + 1
+        return model
+
+    def _build(self, model_name):
+        model_cfg = self.model_builder.config["models"].get(model_name, {})
+        configured_bytes = model_cfg.get("memory_bytes")
+        known_bytes = (
+            configured_bytes
+            if configured_bytes is not None
+            else self.measured_bytes.get(model_name)
+        )
+        if self.memory_budget is not None and known_bytes is not None:
+            self._reserve(model_name, known_bytes, strict=True)
+        start = perf_counter()
+        try:
+            model = self.model_builder.build(model_name)
+        except BaseException:
+            with self.memory_lock:
+                self.model_bytes.pop(model_name, None)
+            raise
+        build_seconds = perf_counter() - start
+        if self.memory_budget is not None and configured_bytes is None:
+            nbytes = self.measured_bytes[model_name] = model_memory_bytes(model)
+            self._reserve(model_name, nbytes, strict=False)
+        self.loaded_models[model_name] = model
+        if self.on_build is not None:
+            self.on_build(model_name, build_seconds)
+        return model
+
+    def _reserve(self, model_name, nbytes, strict):
+        """Account for a model, evicting others until it fits the budget.
+
+        A strict reservation, made before building, fails rather than exceed it.
+        """
+        evicted = []
+        with self.memory_lock:
+            self.model_bytes[model_name] = nbytes
+            while sum(self.model_bytes.values()) > self.memory_budget:
+                victim = self._eviction_candidate(model_name)
+                if victim is None:
+                    break
+                del self.loaded_models[victim]
+                del self.model_bytes[victim]
+                evicted.append(victim)
+            fits = sum(self.model_bytes.values()) <= self.memory_budget
+            if strict and not fits:
+                del self.model_bytes[model_name]
+        if self.on_evict is not None:
+            for victim in evicted:
+                self.on_evict(victim)
+        if evicted:
+            release_device_memory()
+        if strict and not fits:
+            raise RuntimeError(
+                f"Model '{model_name}' needs {nbytes} bytes, which does not fit the "
+                f"device's {self.memory_budget} byte budget beside pinned and "
+                "building models."
+            )
+
+    def _eviction_candidate(self, building_model):
+        models_config = self.model_builder.config["models"]
+        candidates = [
+            name
+            for name in self.loaded_models
+            if name != building_model and not models_config[name].get("pinned")
+        ]
+        if not candidates:
+            return None
+        if self.eviction == "lfu":
+            return min(
+                candidates,
+                key=lambda name: (
+                    self.use_counts.get(name, 0),
+                    self.last_used.get(name, -1),
+                ),
+            )
+        return min(candidates, key=lambda name: self.last_used.get(name, -1))
+
+
+def model_memory_bytes(model):
+    """Bytes held by a model's parameters, buffers and arrays.
+
+    Models can report their own size with a `memory_bytes()` method; otherwise
+    torch-style modules and NumPy arrays among the model's attributes are summed.
+    """
+    if hasattr(model, "memory_bytes"):
+        return model.memory_bytes()
+    total = 0
+    for value in vars(model).values() if hasattr(model, "__dict__") else []:
+        if hasattr(value, "parameters") and hasattr(value, "buffers"):
+            tensors = itertools.chain(value.parameters(), value.buffers())
+            total += sum(t.numel() * t.element_size() for t in tensors)
+        elif hasattr(value, "numel") and hasattr(value, "element_size"):
+            total += value.numel() * value.element_size()
+        elif hasattr(value, "nbytes") and hasattr(value, "dtype"):
+            total += value.nbytes
+    return total
+
+
+def replica_layout(device_indices, config):
+    """Worker slots as (device, replica) pairs, and the slots each model may use.
+
+    See MultiDeviceFleet for the "replicas" config entries.
+    """
+    models_config = config["models"]
+    replicas = config.get("replicas")
+    default = max([cfg.get("replicas", 1) for cfg in models_config.values()] or [1])
+    slots = []
+    for device in device_indices:
+        count = replicas
+        if isinstance(replicas, dict):
+            count = replicas.get(str(device), replicas.get(device))
+        if count is None:
+            count = default
+        if count < 1:
+            raise ValueError(f"Device {device} needs at least one replica.")
+        slots.extend((device, replica) for replica in range(count))
+    for model_name, model_cfg in models_config.items():
+        if model_cfg.get("replicas", 1) < 1:
+            raise ValueError(f"Model '{model_name}' needs at least one replica.")
+    eligible = {
+        model_name: [
+            position
+            for position, (_, replica) in enumerate(slots)
+            if replica < model_cfg["replicas"]
+        ]
+        for model_name, model_cfg in models_config.items()
+        if "replicas" in model_cfg
+    }
+    return slots, eligible
+
+
+def worker_names(worker_slots):
+    """Name workers by device, adding the replica where a device has several."""
+    counts = {}
+    for device, _ in worker_slots:
+        counts[device] = counts.get(device, 0) + 1
+    return [
+        device if counts[device] == 1 else f"{device}:{replica}"
+        for device, replica in worker_slots
+    ]
+
+
+def release_device_memory():
+    """Return memory freed by evicted models to the device where possible."""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
 
 
 class ModelProxy:
@@ -51,6 +303,9 @@ class ModelProxy:
                 f"Model '{model_name}' not found in model configuration."
             )
 
+        return self._method_proxy(model_name)
+
+    def _method_proxy(self, model_name):
         return ModelMethodProxy(
             self.fleet_callable, model_name, None, self.model_config[model_name]
         )
@@ -66,23 +321,60 @@ class ModelProxy:
 
 
 class ModelMethodProxy:
-    def __init__(self, fleet_callable, model_name, method_name, model_details):
+    def __init__(
+        self,
+        fleet_callable,
+        model_name,
+        method_name,
+        model_details,
+        priority=None,
+        timeout=None,
+    ):
         self.fleet_callable = fleet_callable
         self.model_name = model_name
         self.method_name = method_name
         self.model_details = model_details
+        self.priority = priority
+        self.timeout = timeout
 
-    def __call__(self, *args, **kwargs):
+    def with_options(self, priority=None, timeout=None):
+        """A proxy whose calls carry a priority and a deadline `timeout` from now.
+
+        Device workers serve higher priorities first and drop calls still queued
+        when their deadline passes, raising TimeoutError for them. Both must be
+        numbers.
+        """
+        check_number("priority", priority)
+        check_number("timeout", timeout)
+        return type(self)(
+            self.fleet_callable,
+            self.model_name,
+            self.method_name,
+            self.model_details,
+            priority,
+            timeout,
+        )
+
+    def _call_dict(self, args, kwargs):
         call_dict = {
             "model_name": self.model_name,
             "method_name": self.method_name,
             "args": args,
             "kwargs": kwargs,
         }
+        if self.priority is not None:
+            call_dict["priority"] = self.priority
+        if self.timeout is not None:
+            call_dict["deadline"] = time() + self.timeout
+        return call_dict
 
-        results = self.fleet_callable(call_dict)
+    def __call__(self, *args, **kwargs):
+        results = self.fleet_callable(self._call_dict(args, kwargs))
         return results
 
+    def submit(self, *args, **kwargs):
+        return submit_call(self.fleet_callable, self._call_dict(args, kwargs))
+
     def __getattr__(self, method_name):
         if (
             "proxy_methods" not in self.model_details
@@ -91,162 +383,769 @@ class ModelMethodProxy:
             raise AttributeError(
                 f"Method '{method_name}' not configured for proxy on model '{self.model_name}'."
             )
-        return ModelMethodProxy(
-            self.fleet_callable, self.model_name, method_name, self.model_details
+        return type(self)(
+            self.fleet_callable,
+            self.model_name,
+            method_name,
+            self.model_details,
+            self.priority,
+            self.timeout,
+        )
+
+
+class AsyncModelMethodProxy(ModelMethodProxy):
+    async def __call__(self, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(*args, **kwargs))
+
+
+class AsyncModelProxy(ModelProxy):
+    """ModelProxy whose model and method calls return awaitables.
+
+    Independent calls can be awaited together, e.g. with asyncio.gather, and run
+    concurrently across devices.
+    """
+
+    def _method_proxy(self, model_name):
+        return AsyncModelMethodProxy(
+            self.fleet_callable, model_name, None, self.model_config[model_name]
         )
 
 
+def _copy_outcome(source, target):
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class ModelBuildBarrier:
+    """
+    Lets the first call for a model through and holds the rest until it returns.
+
+    With a RemoteBuilder the first call acquires the model's files. Waiters sleep
+    on a shared Condition instead of polling. If the first call fails, the next
+    waiter becomes the builder.
+    """
+
+    UNBUILT, BUILDING, READY = 0, 1, 2
+
+    def __init__(self, model_names):
+        self.model_indices = {name: i for i, name in enumerate(model_names)}
+        self.states = Array("b", len(self.model_indices), lock=False)
+        self.condition = Condition()
+
+    def acquire(self, model_name, blocking=True):
+        """Return True if the caller is the one that must build the model.
+
+        With blocking=False, returns None instead of waiting on another build.
+        """
+        index = self.model_indices.get(model_name)
+        if index is None or self.states[index] == self.READY:
+            return False
+        with self.condition:
+            while self.states[index] == self.BUILDING:
+                if not blocking:
+                    return None
+                self.condition.wait()
+            if self.states[index] == self.READY:
+                return False
+            self.states[index] = self.BUILDING
+            return True
+
+    def release(self, model_name, built):
+        with self.condition:
+            self.states[self.model_indices[model_name]] = (
+                self.READY if built else self.UNBUILT
+            )
+            self.condition.notify_all()
+
+
 class DeviceLoadBalancer:
+    """
+    Routes calls to device workers with the fleet's scheduler.
+
+    Models with a HedgePolicy get a duplicate call on another device when the
+    first is slower than usual; the caller's future resolves with whichever
+    answers first and the other is cancelled if it has not started.
+    """
+
     def __init__(
         self,
-        main_pipes,
-        task_completion_events,
-        device_access_locks,
-        device_indices,
-        model_build_tracker,
+        main_channels,
+        worker_addresses,
+        authkey,
+        model_build_barrier,
+        scheduler,
+        scheduler_state,
+        shared_memory=False,
+        stats=None,
+        hedging=None,
     ):
-        self.main_pipes = main_pipes
-        self.task_completion_events = task_completion_events
-        self.device_access_locks = device_access_locks
-        self.device_indices = device_indices
-        self.model_build_tracker = model_build_tracker
+        self.channels = main_channels
+        self.channels_pid = os.getpid()
+        self.worker_addresses = worker_addresses
+        self.authkey = authkey
+        self.model_build_barrier = model_build_barrier
+        self.scheduler = scheduler
+        self.scheduler_state = scheduler_state
+        self.shared_memory = shared_memory
+        self.stats = stats
+        self.hedging = hedging or {}
+        self.build_waiters = {}  # Calls parked on a build, per model.
 
-        self.round_robin_index = Value("i", 0)
-        self.round_robin_lock = Lock()
-        self.device_availability = Array("b", [True] * len(device_indices))
-        self.availability_lock = Lock()
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["channels"] = None
+        state["channels_pid"] = None
+        state["build_waiters"] = {}
+        return state
 
-    def _select_device(self):
-        with self.availability_lock, self.round_robin_lock:
-            available_devices = [
-                i for i, available in enumerate(self.device_availability) if available
-            ]
-            if available_devices:
-                selected_index = available_devices[
-                    self.round_robin_index.value % len(available_devices)
-                ]
+    def _channel(self, device_position):
+        # Each process talks to the workers over its own connections so the
+        # dispatcher threads never compete for another process's replies.
+        if self.channels_pid != os.getpid():
+            with _connect_lock:
+                if self.channels_pid != os.getpid():
+                    self.channels = [
+                        RequestChannel(
+                            Client(address, authkey=self.authkey),
+                            SharedMemoryTransport() if self.shared_memory else None,
+                        )
+                        for address in self.worker_addresses
+                    ]
+                    self.channels_pid = os.getpid()
+        return self.channels[device_position]
+
+    def _select_device(self, model_name, avoid=None):
+        state = self.scheduler_state
+        model_index = state.model_index(model_name)
+        if avoid is None:
+            device_position = self.scheduler.select(state, model_index)
+        else:
+            # A hedge goes to the least loaded other device, preferring those
+            # that already hold the model.
+            device_position = min(
+                (i for i in state.candidates(model_index) if i != avoid),
+                key=lambda i: (
+                    model_index is not None
+                    and state.is_resident(i, model_index) != state.RESIDENT,
+                    state.outstanding[i],
+                ),
+            )
+        ahead = state.begin(device_position, model_index)
+        return device_position, ahead
+
+    def submit(self, call_dict):
+        requested = perf_counter()
+        builds_model = self.model_build_barrier is not None and (
+            self.model_build_barrier.acquire(call_dict["model_name"], blocking=False)
+        )
+        if builds_model is None:
+            return self._submit_after_build(call_dict, requested)
+        return self._submit(call_dict, requested, builds_model)
+
+    def _submit_after_build(self, call_dict, requested):
+        """Park the call until the model's build returns, then send it.
+
+        One pool thread per model waits on the barrier for every parked call, so
+        submit, the async proxy and RPC connection readers never block on a build.
+        """
+        model_name = call_dict["model_name"]
+        chained = Future()
+        with _build_waiters_lock:
+            waiters = self.build_waiters.get(model_name)
+            if waiters is None:
+                waiters = self.build_waiters[model_name] = []
+                _shared_executor().submit(self._wait_for_build, model_name)
+            waiters.append((call_dict, requested, chained))
+        return chained
+
+    def _wait_for_build(self, model_name):
+        while True:
+            try:
+                builds_model = self.model_build_barrier.acquire(model_name)
+            except BaseException as e:
+                builds_model, error = False, e
             else:
-                selected_index = self.round_robin_index.value % len(self.device_indices)
+                error = None
+            with _build_waiters_lock:
+                waiters = self.build_waiters[model_name]
+                # If the build failed, the first parked call builds the model and
+                # the rest wait for it in turn.
+                ready = [waiters.pop(0)] if builds_model else waiters[:]
+                finished = not builds_model or not waiters
+                if finished:
+                    del self.build_waiters[model_name]
+            for call_dict, requested, chained in ready:
+                if error is not None:
+                    chained.set_exception(error)
+                    continue
+                try:
+                    future = self._submit(call_dict, requested, builds_model)
+                except BaseException as e:
+                    chained.set_exception(e)
+                    continue
+                future.add_done_callback(
+                    lambda future, chained=chained: _copy_outcome(future, chained)
+                )
+            if finished:
+                return
+
+    def _submit(self, call_dict, requested, builds_model):
+        model_name = call_dict["model_name"]
+        future = self._send(call_dict, requested, builds_model)
+
+        policy = self.hedging.get(model_name)
+        state = self.scheduler_state
+        if (
+            policy is None
+            or builds_model
+            or len(state.candidates(state.model_index(model_name))) < 2
+        ):
+            return future
+        delay = policy.delay()
+        if delay is None:
+            future.add_done_callback(
+                lambda future: policy.record(perf_counter() - requested)
+            )
+            return future
+        return self._hedge(call_dict, future, requested, policy, delay)
 
-            self.round_robin_index.value += 1
-            self.device_availability[selected_index] = False
+    def _send(self, call_dict, requested, builds_model=False, avoid=None):
+        model_name = call_dict["model_name"]
+        start = perf_counter()
+        device_position, ahead = self._select_device(model_name, avoid)
+        scheduled = perf_counter()
+        try:
+            future = self._channel(device_position).submit("call", call_dict)
+        except BaseException:
+            self.scheduler_state.finish(device_position, 0, None)
+            self._abandon_build(device_position, model_name, ahead)
+            if builds_model:
+                self.model_build_barrier.release(model_name, built=False)
+            raise
+        sent = perf_counter()
+        future.device_position = device_position
 
-        return self.device_indices[selected_index]
+        def on_done(future):
+            done = perf_counter()
+            failed = True
+            try:
+                if future.cancelled():
+                    # The caller gave up, e.g. an asyncio timeout; drop the call
+                    # too if the worker has not started it.
+                    self._channel(device_position).cancel(future.request_id)
+                else:
+                    failed = future.exception() is not None
+            finally:
+                self.scheduler_state.finish(device_position, done - start, ahead)
+                if failed:
+                    self._abandon_build(device_position, model_name, ahead)
+                if builds_model:
+                    self.model_build_barrier.release(model_name, built=not failed)
+            if self.stats is not None and not future.cancelled():
+                self.stats.record(
+                    device_position,
+                    model_name,
+                    ("schedule", "send", "recv", "total"),
+                    (
+                        scheduled - requested,
+                        sent - scheduled,
+                        getattr(future, "recv_seconds", 0.0),
+                        done - requested,
+                    ),
+                )
 
-    def _mark_device_available(self, device):
-        with self.availability_lock:
-            self.device_availability[self.device_indices.index(device)] = True
+        future.add_done_callback(on_done)
+        return future
 
-    def _ensure_model_ready(self, model_name):
+    def _abandon_build(self, device_position, model_name, ahead):
+        # A failed request routed to a device without the model (ahead is None)
+        # may have been the build; clear its mark unless the model arrived.
+        if ahead is None:
+            state = self.scheduler_state
+            model_index = state.model_index(model_name)
+            if model_index is not None:
+                state.abandon_build(device_position, model_index)
 
-        if model_name not in self.model_build_tracker:
-            self.model_build_tracker[model_name] = False
-        else:
-            while not self.model_build_tracker[model_name]:
-                pass
+    def _hedge(self, call_dict, primary, requested, policy, delay):
+        """Resolve with the first of `primary` and a duplicate sent after `delay`.
+
+        A failure only wins once no other attempt is still running.
+        """
+        model_name = call_dict["model_name"]
+        hedged = Future()
+        attempts = [primary]
+        lock = ThreadLock()
+
+        def settle(attempt, sent):
+            exception = attempt.exception()
+            if not isinstance(exception, CancelledError):
+                policy.record(perf_counter() - sent)
+            with lock:
+                if hedged.done() or (
+                    exception is not None and not all(a.done() for a in attempts)
+                ):
+                    return
+                if exception is None:
+                    hedged.set_result(attempt.result())
+                else:
+                    hedged.set_exception(exception)
+                losers = [a for a in attempts if a is not attempt]
+            Timer.cancel(pending_hedge)
+            for loser in losers:
+                self._cancel(loser)
+            if attempt is not primary and exception is None and self.stats is not None:
+                self.stats.record_hedge(model_name, won=True)
+
+        def send_hedge():
+            if hedged.done() or not policy.take():
+                return
+            sent = perf_counter()
+            try:
+                attempt = self._send(call_dict, sent, avoid=primary.device_position)
+            except Exception:
+                # The primary call carries on; only the duplicate is lost.
+                logger.exception("Unable to send a hedge for %s.", model_name)
+                return
+            with lock:
+                attempts.append(attempt)
+                lost = hedged.done()
+            if self.stats is not None:
+                self.stats.record_hedge(model_name)
+            if lost:
+                self._cancel(attempt)
+            attempt.add_done_callback(lambda attempt: settle(attempt, sent))
+
+        pending_hedge = timer().call_later(delay, send_hedge)
+        primary.add_done_callback(lambda attempt: settle(attempt, requested))
+        return hedged
+
+    def _cancel(self, future):
+        if not future.done():
+            self._channel(future.device_position).cancel(future.request_id)
 
     def __call__(self, call_dict):
-        if self.model_build_tracker is not None:
-            model_name = call_dict["model_name"]
-            self._ensure_model_ready(model_name)
+        return self.submit(call_dict).result()
 
-        device = self._select_device()
-        self.device_access_locks[device].acquire()
-        try:
-            self.main_pipes[device].send(call_dict)
-            self.task_completion_events[device].wait()
-            results = self.main_pipes[device].recv()
-            if self.model_build_tracker is not None:
-                self.model_build_tracker[model_name] = True
-        finally:
-            self.task_completion_events[device].clear()
-            self.device_access_locks[device].release()
-            self._mark_device_available(device)
+    def submit_graph(self, graph_name, inputs):
+        """Run a registered graph on one of the workers, returning a Future.
 
-        return results
+        The worker makes the graph's model calls itself, so only the graph's
+        output comes back to this process.
+        """
+        device_position = self.scheduler.select(self.scheduler_state, None)
+        return self._channel(device_position).submit(
+            "graph", {"name": graph_name, "inputs": inputs}
+        )
 
 
 class MultiDeviceFleet:
-    def __init__(self, device_indices, model_builder_config):
+    """
+    Runs models on a pool of device workers, by default one process per device.
+
+    A top-level "replicas" config entry runs several workers per device, either
+    one number for every device or a mapping from device to a number, and each
+    worker is a separate slot for the scheduler. Without it, a device runs as many
+    workers as the largest per-model "replicas" entry. A model with "replicas": n
+    is served by the first n workers of each device, so small models can share an
+    accelerator while large ones keep a single copy. "cpu" is a valid device;
+    giving it one replica per core sidesteps the GIL for CPU-bound models. A
+    device's "device_memory_bytes" budget is split evenly between its workers.
+
+    With preload=True, the config's custom modules are imported once before the
+    workers start (see `preload_modules`), and models can share weight files
+    between workers through "mmap_files" (see model_builder.map_file).
+
+    Graphs declared under a top-level "graphs" config entry (see ModelGraph and
+    FunctionGraph) run inside the workers with `run_graph`, so a whole pipeline
+    costs the caller one round trip.
+
+    `profile` switches on a profiler inside the workers for a while and returns
+    where their calls spent the time.
+    """
+
+    def __init__(
+        self,
+        device_indices,
+        model_builder_config,
+        shared_memory=False,
+        scheduler="ModelAffinityScheduler",
+        shared_cache=False,
+        stats=True,
+        preload=False,
+    ):
         self.device_indices = device_indices
+        self.shared_memory = shared_memory
         self.config = load_or_pass_config(model_builder_config["init_params"]["config"])
+        self.worker_slots, eligible = replica_layout(device_indices, self.config)
+        self.worker_names = worker_names(self.worker_slots)
+        self.scheduler = build_scheduler(scheduler)
+        self.scheduler_state = SchedulerState(
+            len(self.worker_slots), self.config["models"], eligible=eligible
+        )
+        self.fleet_stats = (
+            FleetStats(len(self.worker_slots), self.config["models"])
+            if stats
+            else None
+        )
+        # Calls served by profiling workers, so `profile(calls=N)` counts the fleet.
+        self.profiled_calls = Value("i", 0)
+        # Shared by this process's load balancers so latencies seen through one
+        # proxy inform the others.
+        self.hedge_policies = hedge_policies(self.config)
+        self.authkey = os.urandom(32)
         self.per_device_workers = []
         self.main_pipes = []
-        self.task_completion_events = []
-        self.process_manager = Manager()
-        self.device_access_locks = [
-            self.process_manager.Lock() for _ in self.device_indices
-        ]
-        self.initialize_per_device_workers(model_builder_config)
+        self.worker_addresses = []
+        if shared_memory:
+            # Workers must share this process's tracker, or each one would track
+            # and try to clean up segments it merely attached to.
+            resource_tracker.ensure_running()
         remote_builder = issubclass(
             streamliner_registry.get(model_builder_config["class"]), RemoteBuilder
         )
-        self.model_build_tracker = (
-            self.process_manager.dict() if remote_builder else None
+        # Created before the workers start, since graphs running inside them use it.
+        self.model_build_barrier = (
+            ModelBuildBarrier(self.config["models"]) if remote_builder else None
         )
+        if preload:
+            self.preload_modules()
+        # Workers get the parsed config rather than parsing the file again.
+        model_builder_config = {
+            **model_builder_config,
+            "init_params": {
+                **model_builder_config["init_params"],
+                "config": self.config,
+            },
+        }
+        self.initialize_per_device_workers(model_builder_config)
+        self.main_channels = [
+            RequestChannel(pipe, SharedMemoryTransport() if shared_memory else None)
+            for pipe in self.main_pipes
+        ]
+        # Graphs call models on other workers, so every worker learns their addresses.
+        for channel in self.main_channels:
+            channel.send((None, "peers", self.worker_addresses))
+        self.initialize_result_cache(shared_cache)
+
+    def preload_modules(self):
+        """Import the config's custom modules once, before any worker starts.
+
+        Under the "forkserver" start method they are imported in the fork server,
+        which must not have started yet, and under "fork" in this process, so
+        workers start with the modules and their registered classes in place.
+        Under "spawn" each worker still imports them itself.
+        """
+        specs = list(self.config["models"].values())
+        specs += list(self.config.get("graphs", {}).values())
+        modules = sorted(
+            {spec["custom_import"] for spec in specs if "custom_import" in spec}
+        )
+        start_method = get_start_method()
+        if start_method == "forkserver":
+            set_forkserver_preload(["__main__", __name__, *modules])
+        elif start_method == "fork":
+            for module in modules:
+                import_to_register({"custom_import": module})
+
+    def initialize_result_cache(self, shared_cache):
+        """Cache results for models with a "cache" config.
+
+        With shared_cache, the cache lives in a manager process so every process
+        using this fleet's callables shares its results.
+        """
+        self.cache_manager = None
+        self.result_cache = None
+        self.cached_fleet_callable = None
+        if not any(cfg.get("cache") for cfg in self.config["models"].values()):
+            return
+        if shared_cache:
+            self.cache_manager = ResultCacheManager()
+            self.cache_manager.start()
+            self.result_cache = self.cache_manager.ResultCache(self.config["models"])
+        else:
+            self.result_cache = ResultCache(self.config["models"])
 
     def initialize_per_device_workers(self, model_builder_config):
-        for device_id in self.device_indices:
+        # Graph nodes call models through a load balancer inside each worker.
+        # Loading the graphs here reports config mistakes before any worker starts.
+        load_graphs(self.config)
+        graph_balancer = (
+            self._device_load_balancer(in_worker=True)
+            if self.config.get("graphs")
+            else None
+        )
+        replicas = {}
+        for device_id, _ in self.worker_slots:
+            replicas[device_id] = replicas.get(device_id, 0) + 1
+        for device_position, (device_id, _) in enumerate(self.worker_slots):
             main_conn, worker_conn = Pipe()
-            event = self.process_manager.Event()
             worker = Process(
                 target=self.per_device_worker_routine,
-                args=(device_id, worker_conn, event, model_builder_config),
+                args=(
+                    device_id,
+                    worker_conn,
+                    self.authkey,
+                    model_builder_config,
+                    self.shared_memory,
+                    self.scheduler_state,
+                    device_position,
+                    self.fleet_stats,
+                    graph_balancer,
+                    replicas[device_id],
+                    self.profiled_calls,
+                ),
             )
             worker.start()
             self.per_device_workers.append(worker)
             self.main_pipes.append(main_conn)
-            self.task_completion_events.append(event)
+
+        # Each worker reports the address other processes connect to once it is ready.
+        for main_conn in self.main_pipes:
+            self.worker_addresses.append(main_conn.recv())
 
     @staticmethod
-    def per_device_worker_routine(device_id, worker_conn, event, model_builder_config):
+    def per_device_worker_routine(
+        device_id,
+        worker_conn,
+        authkey,
+        model_builder_config,
+        shared_memory=False,
+        scheduler_state=None,
+        device_position=None,
+        stats=None,
+        graph_balancer=None,
+        replicas=1,
+        profiled_calls=None,
+    ):
+        if device_id == "cpu" and replicas > 1:
+            # Keep CPU replicas from each starting a thread per core.
+            threads = max((os.cpu_count() or 1) // replicas, 1)
+            for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+                os.environ.setdefault(variable, str(threads))
         model_builder = build_object_by_name(
             model_builder_config["class"],
             **model_builder_config["init_params"],
             device=device_id,
         )
-        fleet = SingleDeviceFleet(model_builder)
 
-        while True:
-            call_dict = worker_conn.recv()
-            if call_dict is None:
-                break
-            results = MultiDeviceFleet._reconstruct_and_call(fleet, call_dict)
-            worker_conn.send(results)
-            event.set()
+        def on_build(model_name, seconds):
+            if scheduler_state is not None:
+                scheduler_state.mark_resident(device_position, model_name, seconds)
+            if stats is not None:
+                stats.record(device_position, model_name, ("build",), (seconds,))
 
-    @staticmethod
-    def _reconstruct_and_call(fleet, call_dict):
-        model_name = call_dict["model_name"]
-        method_name = call_dict["method_name"]
-        args = call_dict["args"]
-        kwargs = call_dict["kwargs"]
+        def on_evict(model_name):
+            if scheduler_state is not None:
+                scheduler_state.mark_evicted(device_position, model_name)
 
-        if method_name:
-            result = getattr(fleet[model_name], method_name)(*args, **kwargs)
-        else:
-            result = fleet[model_name](*args, **kwargs)
+        fleet = SingleDeviceFleet(
+            model_builder, on_build=on_build, on_evict=on_evict, replicas=replicas
+        )
+        transport = SharedMemoryTransport() if shared_memory else None
+        graph_runner = None
+        if graph_balancer is not None:
+            models_config = model_builder.config["models"]
+            graph_runner = GraphRunner(
+                load_graphs(model_builder.config),
+                ModelProxy(models_config, graph_balancer),
+                AsyncModelProxy(models_config, graph_balancer),
+            )
+        DeviceWorker(
+            fleet,
+            worker_conn,
+            authkey,
+            transport,
+            stats=stats,
+            device_position=device_position,
+            graph_runner=graph_runner,
+            profiled_calls=profiled_calls,
+        ).run()
+
+    _reconstruct_and_call = staticmethod(reconstruct_and_call)
+
+    def prewarm(self, models=None, devices=None):
+        """Build models on device workers ahead of traffic.
+
+        Every worker builds its models concurrently, so startup takes about as long
+        as the slowest build rather than the sum. With a RemoteBuilder, one worker
+        acquires a model's files before the others build from them.
+        """
+        model_names = list(self.config["models"]) if models is None else models
+        devices = self.device_indices if devices is None else devices
+        state = self.scheduler_state
+
+        def build_everywhere(model_name):
+            positions = [
+                position
+                for position in state.candidates(state.model_index(model_name))
+                if self.worker_slots[position][0] in devices
+            ]
+            remaining = positions
+            barrier = self.model_build_barrier
+            if positions and barrier is not None and barrier.acquire(model_name):
+                built = False
+                try:
+                    self._build(positions[0], model_name).result()
+                    built = True
+                finally:
+                    barrier.release(model_name, built)
+                remaining = positions[1:]
+            for future in [self._build(p, model_name) for p in remaining]:
+                future.result()
+
+        with ThreadPoolExecutor(max(len(model_names), 1)) as executor:
+            list(executor.map(build_everywhere, model_names))
 
-        return result
+    def _build(self, device_position, model_name):
+        return self.main_channels[device_position].submit("build", model_name)
 
     def stop(self):
-        for pipe in self.main_pipes:
-            pipe.send(None)
+        for channel in self.main_channels:
+            channel.send(None)
         for worker in self.per_device_workers:
             worker.join()
+        for channel in self.main_channels:
+            channel.close()
+        if self.cache_manager is not None:
+            self.cache_manager.shutdown()
+
+    def cache_stats(self):
+        """Hit, miss, eviction and coalesced call counts per caching model."""
+        return {} if self.result_cache is None else self.result_cache.stats()
+
+    def stats(self):
+        """Snapshot of latency histograms, device utilization and cache counters.
+
+        Covers calls made from every process using this fleet's callables.
+        "phases" maps phase -> model -> device -> histogram summary (see
+        FleetStats.snapshot), and "devices" holds each device's in-flight
+        requests, builds in progress, busy seconds and requests shed after their
+        deadline passed. "shed" breaks the latter down as model -> device -> count,
+        and "hedges" counts duplicate calls sent and won per model. Devices with
+        several replica workers are reported per worker as "device:replica".
+        Records made in other processes may trail by up to FleetStats'
+        flush_interval.
+        """
+        state = self.scheduler_state
+        shed = (
+            self.fleet_stats.shed_counts(self.worker_names)
+            if self.fleet_stats is not None
+            else {}
+        )
+        return {
+            "phases": (
+                self.fleet_stats.snapshot(self.worker_names)
+                if self.fleet_stats is not None
+                else {}
+            ),
+            "devices": {
+                device: {
+                    "in_flight": state.outstanding[position],
+                    "pending_builds": state.pending_builds[position],
+                    "busy_seconds": (
+                        self.fleet_stats.busy_seconds[position]
+                        if self.fleet_stats is not None
+                        else 0.0
+                    ),
+                    "shed": sum(devices.get(device, 0) for devices in shed.values()),
+                }
+                for position, device in enumerate(self.worker_names)
+            },
+            "shed": shed,
+            "hedges": (
+                self.fleet_stats.hedge_counts() if self.fleet_stats is not None else {}
+            ),
+            "cache": self.cache_stats(),
+        }
+
+    def prometheus_text(self):
+        """The stats() snapshot in the Prometheus text exposition format."""
+        return prometheus_text(self.stats())
+
+    def profile(
+        self, duration=None, calls=None, mode="sample", interval=0.005, devices=None
+    ):
+        """Profile the calls workers run, for `duration` seconds or `calls` calls.
+
+        Every worker of `devices` (default all) profiles its own calls, labelled
+        "model.method", and the profiles come back merged (see
+        profiling.merge_profiles). `calls` counts calls across those workers, so
+        a worker the scheduler sends nothing to stops once the others have served
+        them; each call in a batch counts. With mode="sample", "stacks" maps
+        collapsed stacks to sample counts taken every `interval` seconds;
+        profiling.collapsed_text turns them into flame graph input. With
+        mode="cprofile", "stats" maps each label to a pstats.Stats.
+        """
+        if duration is None and calls is None:
+            raise ValueError("Give a duration, a number of calls or both.")
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(PROFILE_MODES)}.")
+        options = {
+            "mode": mode,
+            "duration": duration,
+            "calls": calls,
+            "interval": interval,
+        }
+        self.profiled_calls.value = 0
+        futures = {
+            self.worker_names[position]: self.main_channels[position].submit(
+                "profile", options
+            )
+            for position, (device, _) in enumerate(self.worker_slots)
+            if devices is None or device in devices
+        }
+        return merge_profiles(
+            {name: future.result() for name, future in futures.items()}
+        )
+
+    def submit_graph(self, graph_name, **inputs):
+        if graph_name not in self.config.get("graphs", {}):
+            raise ValueError(f"Graph '{graph_name}' not found in configurations.")
+        return self._device_load_balancer().submit_graph(graph_name, inputs)
+
+    def run_graph(self, graph_name, **inputs):
+        """Run a registered graph inside the fleet and return its output."""
+        return self.submit_graph(graph_name, **inputs).result()
+
+    def _device_load_balancer(self, in_worker=False):
+        # A balancer sent to a worker connects to its peers over fresh channels
+        # once the fleet has told it their addresses.
+        return DeviceLoadBalancer(
+            None if in_worker else self.main_channels,
+            [] if in_worker else self.worker_addresses,
+            self.authkey,
+            self.model_build_barrier,
+            self.scheduler,
+            self.scheduler_state,
+            self.shared_memory,
+            self.fleet_stats,
+            self.hedge_policies,
+        )
 
     @property
     def fleet_callable(self):
-        device_load_balancer = DeviceLoadBalancer(
-            self.main_pipes,
-            self.task_completion_events,
-            self.device_access_locks,
-            self.device_indices,
-            self.model_build_tracker,
-        )
-        return device_load_balancer
+        device_load_balancer = self._device_load_balancer()
+        if self.result_cache is None:
+            return device_load_balancer
+        if self.cached_fleet_callable is None:
+            # One instance per fleet so identical calls coalesce across proxies.
+            self.cached_fleet_callable = CachedFleetCallable(
+                device_load_balancer, self.result_cache
+            )
+        return self.cached_fleet_callable
 
     @property
     def model_proxy(self):
         proxy = ModelProxy(self.config["models"], self.fleet_callable)
         return proxy
+
+    @property
+    def async_model_proxy(self):
+        proxy = AsyncModelProxy(self.config["models"], self.fleet_callable)
+        return proxy
@@ -0,0 +1,217 @@
+import asyncio
+import inspect
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from .model_builder import import_to_register
+from .registry import streamliner_registry
+
+
+def resolve(template, values):
+    """Replace every {"ref": name} in nested lists, tuples and dicts with its value."""
+    if isinstance(template, dict):
+        if set(template) == {"ref"}:
+            return values[template["ref"]]
+        return {key: resolve(value, values) for key, value in template.items()}
+    if isinstance(template, (list, tuple)):
+        return type(template)(resolve(item, values) for item in template)
+    return template
+
+
+def references(template):
+    if isinstance(template, dict):
+        if set(template) == {"ref"}:
+            yield template["ref"]
+            return
+        for value in template.values():
+            yield from references(value)
+    elif isinstance(template, (list, tuple)):
+        for item in template:
+            yield from references(item)
+
+
+class ModelGraph:
+    """
+    A declarative DAG of model calls and functions, run inside the fleet.
+
+    Graphs are declared under a top-level "graphs" entry of the model config:
+
+        "graphs": {
+            "rate": {
+                "custom_import": "hft_src.high_freq_trading_logic",
+                "inputs": ["statement"],
+                "nodes": {
+                    "a": {"model": "due_diligence", "args": [{"ref": "statement"}]},
+                    "b": {"model": "due_diligence_extra",
+                          "args": [{"ref": "statement"}]},
+                    "rating": {"function": "average_rating",
+                               "args": [{"ref": "a"}, {"ref": "b"}]}
+                },
+                "output": {"ref": "rating"}
+            }
+        }
+
+    A model node calls `model` (and `method`, if given) with `args` and `kwargs`;
+    a function node calls a registered function. {"ref": name} stands for a
+    graph input or another node's result. Every node starts as soon as the
+    nodes it references have finished, so independent model calls run in
+    parallel on whichever devices the scheduler picks.
+    """
+
+    def __init__(self, name, spec, models_config):
+        self.name = name
+        self.inputs = list(spec.get("inputs", []))
+        self.nodes = spec["nodes"]
+        self.output = spec.get("output", {"ref": list(self.nodes)[-1]})
+        import_to_register(spec)
+
+        self.dependencies = {}
+        for node_name, node in self.nodes.items():
+            if ("model" in node) == ("function" in node):
+                raise ValueError(
+                    f"Node '{node_name}' of graph '{name}' needs either a model or "
+                    "a function."
+                )
+            if "model" in node and node["model"] not in models_config:
+                raise ValueError(
+                    f"Node '{node_name}' of graph '{name}' calls unknown model "
+                    f"'{node['model']}'."
+                )
+            if "function" in node and node["function"] not in streamliner_registry:
+                raise ValueError(
+                    f"Node '{node_name}' of graph '{name}' calls unregistered "
+                    f"function '{node['function']}'."
+                )
+            self.dependencies[node_name] = self._node_references(
+                node_name, [node.get("args", []), node.get("kwargs", {})]
+            )
+        self._node_references("output", self.output)
+        self._check_acyclic()
+
+    def _node_references(self, node_name, template):
+        names = set(references(template))
+        unknown = names - set(self.inputs) - set(self.nodes)
+        if unknown:
+            raise ValueError(
+                f"'{node_name}' of graph '{self.name}' references unknown "
+                f"{sorted(unknown)}."
+            )
+        return names & set(self.nodes)
+
+    def _check_acyclic(self):
+        finished, visiting = set(), set()
+
+        def visit(node_name):
+            if node_name in finished:
+                return
+            if node_name in visiting:
+                raise ValueError(f"Graph '{self.name}' has a cycle at '{node_name}'.")
+            visiting.add(node_name)
+            for dependency in self.dependencies[node_name]:
+                visit(dependency)
+            visiting.discard(node_name)
+            finished.add(node_name)
+
+        for node_name in self.nodes:
+            visit(node_name)
+
+    def run(self, model_proxy, async_model_proxy, inputs):
+        missing = set(self.inputs) - set(inputs)
+        if missing:
+            raise ValueError(
+                f"Graph '{self.name}' is missing inputs {sorted(missing)}."
+            )
+        values = dict(inputs)
+        waiting = dict(self.dependencies)
+        running = {}
+        while waiting or running:
+            ready = [name for name, deps in waiting.items() if deps.issubset(values)]
+            for node_name in ready:
+                del waiting[node_name]
+                node = self.nodes[node_name]
+                args = resolve(node.get("args", []), values)
+                kwargs = resolve(node.get("kwargs", {}), values)
+                if "function" in node:
+                    function = streamliner_registry[node["function"]]
+                    values[node_name] = function(*args, **kwargs)
+                    continue
+                call_dict = {
+                    "model_name": node["model"],
+                    "method_name": node.get("method"),
+                    "args": tuple(args),
+                    "kwargs": kwargs,
+                }
+                running[model_proxy.fleet_callable.submit(call_dict)] = node_name
+            if ready and not running:
+                continue  # Function nodes may have unblocked others.
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                values[running.pop(future)] = future.result()
+        return resolve(self.output, values)
+
+
+class FunctionGraph:
+    """
+    Business logic registered as a graph and run inside the fleet.
+
+        "graphs": {
+            "due_diligence": {
+                "custom_import": "hft_src.high_freq_trading_logic",
+                "function": "async_due_diligence"
+            }
+        }
+
+    The function is called as function(model_proxy, **inputs), like business
+    logic written against a ModelProxy; coroutine functions get an
+    AsyncModelProxy and run on an event loop of their own.
+    """
+
+    def __init__(self, name, spec):
+        self.name = name
+        import_to_register(spec)
+        if spec["function"] not in streamliner_registry:
+            raise ValueError(
+                f"Graph '{name}' calls unregistered function '{spec['function']}'."
+            )
+        self.function = streamliner_registry[spec["function"]]
+
+    def run(self, model_proxy, async_model_proxy, inputs):
+        if inspect.iscoroutinefunction(self.function):
+            return asyncio.run(self.function(async_model_proxy, **inputs))
+        return self.function(model_proxy, **inputs)
+
+
+def load_graphs(config):
+    return {
+        name: (
+            FunctionGraph(name, spec)
+            if "function" in spec
+            else ModelGraph(name, spec, config["models"])
+        )
+        for name, spec in config.get("graphs", {}).items()
+    }
+
+
+class GraphRunner:
+    """
+    Runs a fleet's registered graphs from inside one of its device workers.
+
+    Model calls made by a graph go straight from this worker to whichever worker
+    the scheduler picks, so intermediate results never travel back through the
+    process that asked for the graph; only the graph's output does.
+    """
+
+    def __init__(self, graphs, model_proxy, async_model_proxy):
+        self.graphs = graphs
+        self.model_proxy = model_proxy
+        self.async_model_proxy = async_model_proxy
+
+    def connect(self, worker_addresses):
+        """Learn where the other workers listen once the whole fleet is up."""
+        self.model_proxy.fleet_callable.worker_addresses[:] = worker_addresses
+
+    def run(self, graph_name, inputs):
+        if graph_name not in self.graphs:
+            raise ValueError(f"Graph '{graph_name}' not found in configurations.")
+        return self.graphs[graph_name].run(
+            self.model_proxy, self.async_model_proxy, inputs
+        )
@@ -0,0 +1,93 @@
+import threading
+from collections import deque
+
+
+class HedgePolicy:
+    """
+    Decides when a model's slow call gets a duplicate on another device.
+
+    Models opt in through a "hedging" entry in their config:
+
+        "hedging": {"percentile": 0.95, "budget": 0.05}
+
+    A call still running after the `percentile` latency of the model's last
+    `window` calls is sent again to a different device, and whichever answers
+    first wins. Nothing is hedged before `min_samples` latencies have been seen,
+    or sooner than `min_delay_us`. `budget` caps hedges at that fraction of
+    calls, with up to `burst` hedges banked for a stall that hits many calls at
+    once. Latencies are tracked per process.
+    """
+
+    def __init__(
+        self,
+        percentile=0.95,
+        budget=0.05,
+        window=1000,
+        min_samples=100,
+        min_delay_us=1000,
+        burst=10,
+    ):
+        if not 0 < percentile < 1:
+            raise ValueError("percentile must be between 0 and 1.")
+        if budget < 0:
+            raise ValueError("budget must not be negative.")
+        self.percentile = percentile
+        self.budget = budget
+        self.window = window
+        self.min_samples = min(min_samples, window)
+        self.min_delay = min_delay_us / 1e6
+        self.burst = burst
+        self._reset()
+
+    def _reset(self):
+        self.latencies = deque(maxlen=self.window)
+        self.recorded = 0
+        self.threshold = None
+        self.tokens = float(self.burst)
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("latencies", "recorded", "threshold", "tokens", "lock"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    def record(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.recorded += 1
+            refresh = max(self.window // 10, 1)
+            if len(self.latencies) >= self.min_samples and (
+                self.threshold is None or self.recorded % refresh == 0
+            ):
+                ordered = sorted(self.latencies)
+                index = min(int(self.percentile * len(ordered)), len(ordered) - 1)
+                self.threshold = ordered[index]
+
+    def delay(self):
+        """Seconds to wait before hedging a new call, or None not to hedge it."""
+        with self.lock:
+            self.tokens = min(self.tokens + self.budget, self.burst)
+            if self.threshold is None:
+                return None
+            return max(self.threshold, self.min_delay)
+
+    def take(self):
+        """Spend one hedge from the budget, returning False if none is left."""
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def hedge_policies(config):
+    return {
+        model_name: HedgePolicy(**model_cfg["hedging"])
+        for model_name, model_cfg in config["models"].items()
+        if model_cfg.get("hedging")
+    }
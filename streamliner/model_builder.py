@@ -1,9 +1,20 @@
 import importlib
 import json
+import mmap
+import shutil
 import sys
-from abc import ABC, abstractmethod
+from abc import ABC
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import quote
+from urllib.request import urlopen
 
+try:
+    import numpy as np
+except ImportError:  # Mapped files come back as memoryviews without numpy.
+    np = None
+
+from .artifacts import ArtifactCache, artifact_key, file_digest, parse_checksum, place
 from .registry import register as REGISTER
 from .registry import streamliner_registry
 
@@ -41,6 +52,23 @@ class LazyObject:
         return self._object(*args, **kwargs)
 
 
+def map_file(path):
+    """Map a weight file read-only, sharing its pages with every process mapping it.
+
+    Models list init_files keys under "mmap_files" (or give true for all of them)
+    to receive these instead of paths. .npy files come back as read-only NumPy
+    arrays and other files as read-only uint8 arrays, or memoryviews without
+    NumPy. Workers on a node then hold one copy of the weights in the page cache
+    rather than one each.
+    """
+    if np is not None:
+        if str(path).endswith(".npy"):
+            return np.load(path, mmap_mode="r")
+        return np.memmap(path, dtype=np.uint8, mode="r")
+    with open(path, "rb") as file:
+        return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+
 def import_to_register(config):
     try:
         if "custom_import" in config:
@@ -70,6 +98,11 @@ class LocalBuilder:
 
         init_files = model_cfg.get("init_files", {})
         full_init_files = self.join_paths(model_name, init_files)
+        mapped = model_cfg.get("mmap_files") or []
+        if mapped is True:
+            mapped = list(full_init_files)
+        for key in mapped:
+            full_init_files[key] = map_file(full_init_files[key])
         init_params = {**full_init_files, **init_params}
 
         return build_object_by_name(model_class_name, **init_params)
@@ -85,24 +118,134 @@ class LocalBuilder:
 
 
 class RemoteBuilder(LocalBuilder, ABC):
+    """
+    Builds models whose files are fetched from a remote source on first use.
+
+    Subclasses implement `_fetch_file`, or override `_acquire_files` to get a
+    model's missing files some other way. Missing files go through the node's
+    ArtifactCache, several at a time, and are then linked into
+    model_dir/model_name. A model's optional "checksums" config maps init_files
+    keys to "sha256:<hex>" (or any hashlib algorithm). Fetched files must match,
+    and files already in model_dir are checked too, once per builder while they
+    are unchanged, and fetched again if they do not. The cache lives in
+    `cache_dir`, the top-level "artifact_cache_dir" config entry or
+    ~/.cache/streamliner/artifacts.
+    """
+
+    def __init__(self, config, device=0, cache_dir=None, download_threads=4):
+        cls = type(self)
+        if (
+            cls._fetch_file is RemoteBuilder._fetch_file
+            and cls._acquire_files is RemoteBuilder._acquire_files
+        ):
+            raise TypeError(
+                f"{cls.__name__} must implement _fetch_file or _acquire_files."
+            )
+        super().__init__(config, device)
+        self.artifacts = ArtifactCache(
+            cache_dir or self.config.get("artifact_cache_dir")
+        )
+        self.download_threads = download_threads
+        self.verified = {}  # Path -> (inode, size, mtime) when last found intact.
 
-    @abstractmethod
     def _acquire_files(self, model_name, files):
-        """Logic to download files from remote source and situate them in the same folder
-        structure as expected by the LocalBuilder
-        """
-        pass
+        """Fetch a model's missing files through the artifact cache in parallel."""
+        if not files:
+            return
+        checksums = self.config["models"][model_name].get("checksums", {})
+        with ThreadPoolExecutor(min(len(files), self.download_threads)) as executor:
+            futures = [
+                executor.submit(
+                    self._acquire_file, model_name, file_name, checksums.get(key)
+                )
+                for key, file_name in files.items()
+            ]
+            for future in futures:
+                future.result()
+
+    def _acquire_file(self, model_name, file_name, checksum):
+        key = artifact_key(checksum, self._source(model_name, file_name))
+        cached = self.artifacts.get(
+            key, lambda path: self._fetch_file(model_name, file_name, path), checksum
+        )
+        place(cached, Path(self.config["model_dir"]) / model_name / file_name)
+
+    def _source(self, model_name, file_name):
+        """Identify a file at the remote, to cache files that have no checksum."""
+        return f"{type(self).__name__}:{model_name}/{file_name}"
+
+    def _fetch_file(self, model_name, file_name, path):
+        """Download one of a model's files from the remote source to `path`."""
+        raise NotImplementedError
+
+    def _present(self, model_name, file_name, checksum):
+        """Whether a file is in model_dir and, given a checksum, matches it."""
+        path = Path(self.config["model_dir"]) / model_name / file_name
+        if not path.exists():
+            return False
+        if checksum is None:
+            return True
+        stat = path.stat()
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if self.verified.get(path) == signature:
+            return True
+        algorithm, expected = parse_checksum(checksum)
+        if file_digest(path, algorithm) != expected:
+            # The file may be a link to the cached copy, so drop that as well.
+            self.artifacts.discard(
+                artifact_key(checksum, self._source(model_name, file_name))
+            )
+            return False
+        self.verified[path] = signature
+        return True
 
     def build(self, model_name):
         model_cfg = self.config["models"][model_name]
         init_files = model_cfg.get("init_files", {})
+        checksums = model_cfg.get("checksums", {})
 
         files_to_acquire = {
             key: val
             for key, val in init_files.items()
-            if not (Path(self.config["model_dir"]) / model_name / val).exists()
+            if not self._present(model_name, val, checksums.get(key))
         }
 
         self._acquire_files(model_name, files_to_acquire)
 
         return super().build(model_name)
+
+
+@REGISTER
+class DirectoryBuilder(RemoteBuilder):
+    """RemoteBuilder whose remote is a directory laid out like model_dir."""
+
+    def __init__(self, config, source_dir, **kwargs):
+        super().__init__(config, **kwargs)
+        self.source_dir = Path(source_dir)
+
+    def _source(self, model_name, file_name):
+        return str((self.source_dir / model_name / file_name).resolve())
+
+    def _fetch_file(self, model_name, file_name, path):
+        shutil.copyfile(self.source_dir / model_name / file_name, path)
+
+
+@REGISTER
+class HTTPBuilder(RemoteBuilder):
+    """RemoteBuilder that downloads base_url/model_name/file_name."""
+
+    def __init__(self, config, base_url, timeout=60, **kwargs):
+        super().__init__(config, **kwargs)
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _source(self, model_name, file_name):
+        return self._url(model_name, file_name)
+
+    def _url(self, model_name, file_name):
+        return f"{self.base_url}/{quote(model_name)}/{quote(file_name)}"
+
+    def _fetch_file(self, model_name, file_name, path):
+        url = self._url(model_name, file_name)
+        with urlopen(url, timeout=self.timeout) as response, open(path, "wb") as file:
+            shutil.copyfileobj(response, file, 1 << 20)
@@ -0,0 +1,143 @@
+from concurrent.futures import Future
+from queue import Empty, SimpleQueue
+from threading import Semaphore, Thread
+
+from .fleet import submit_call
+
+
+class AccelProcessMap:
+    """
+    Maps a fleet model over the data a queue-filling DataPrefetch produces.
+
+    A feeder thread takes (loaded_data, src) pairs off the prefetch queue and
+    submits `model_name.method_name(loaded_data)` to the fleet, keeping at most
+    `max_in_flight` calls outstanding, so loading, IPC and device compute
+    overlap. Iterating yields (result, src) pairs as calls complete, or in the
+    order items left the queue when ordered=True. With batch_size set on the
+    DataPrefetch, each call receives a collated batch and src is its list of
+    sources.
+
+    Example usage:
+    --------------
+    manager = multiprocessing.Manager()
+    prefetch = DataPrefetch(data_paths, cv2.imread, manager=manager)
+    for result, src in AccelProcessMap(md_fleet.fleet_callable, prefetch, "clip"):
+        pass
+
+    A failed call, or an item the DataPrefetch failed to load, raises from the
+    iterator, unless capture_errors=True, in which case its exception is yielded
+    in place of the result.
+    """
+
+    def __init__(
+        self,
+        fleet_callable,
+        data_prefetch,
+        model_name,
+        method_name=None,
+        max_in_flight=8,
+        ordered=False,
+        capture_errors=False,
+    ):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1.")
+        self.fleet_callable = fleet_callable
+        self.data_prefetch = data_prefetch
+        self.model_name = model_name
+        self.method_name = method_name
+        self.ordered = ordered
+        self.capture_errors = capture_errors
+        self.in_flight = Semaphore(max_in_flight)
+        self.completed = SimpleQueue()
+        self.pending_results = {}
+        self.next_result = 0
+        self.submitted = None  # Set by the feeder once the source is exhausted.
+        self.yielded = 0
+        self.feed_error = None
+        self.feeder = None
+
+    def __iter__(self):
+        if self.feeder is None:
+            self.feeder = Thread(target=self.feed_calls, daemon=True)
+            self.feeder.start()
+        return self
+
+    def _call_dict(self, loaded_data):
+        return {
+            "model_name": self.model_name,
+            "method_name": self.method_name,
+            "args": (loaded_data,),
+            "kwargs": {},
+        }
+
+    def _next_item(self):
+        queue = self.data_prefetch.prefetched_data_queue
+        while True:
+            try:
+                return queue.get(timeout=1)
+            except Empty:
+                # Loader workers that were killed never send their None.
+                workers = getattr(self.data_prefetch, "workers", None)
+                if workers and not any(worker.is_alive() for worker in workers):
+                    return None
+
+    def feed_calls(self):
+        index = 0
+        finished_loaders = 0
+        try:
+            while not self.data_prefetch.all_finished(finished_loaders):
+                item = self._next_item()
+                if item is None:
+                    finished_loaders += 1
+                    continue
+                loaded_data, src = item
+                self.in_flight.acquire()
+                if isinstance(loaded_data, Exception):
+                    future = Future()  # Failed to load, so it fails in its place.
+                    future.set_exception(loaded_data)
+                else:
+                    call_dict = self._call_dict(loaded_data)
+                    future = submit_call(self.fleet_callable, call_dict)
+                future.add_done_callback(self._on_done(index, src))
+                index += 1
+        except Exception as e:
+            self.feed_error = e
+        finally:
+            self.completed.put(index)
+
+    def _on_done(self, index, src):
+        def on_done(future):
+            if not self.ordered:
+                self.in_flight.release()
+            self.completed.put((index, future.exception(), src, future))
+
+        return on_done
+
+    def __next__(self):
+        while True:
+            if self.ordered and self.next_result in self.pending_results:
+                message = self.pending_results.pop(self.next_result)
+                self.next_result += 1
+                self.in_flight.release()
+                return self._unpack(message)
+            if self.submitted is not None and self.yielded == self.submitted:
+                raise StopIteration
+
+            message = self.completed.get()
+            if isinstance(message, int):
+                self.submitted = message
+                if self.feed_error is not None:
+                    raise self.feed_error
+            elif self.ordered:
+                self.pending_results[message[0]] = message
+            else:
+                return self._unpack(message)
+
+    def _unpack(self, message):
+        _, exception, src, future = message
+        self.yielded += 1
+        if exception is None:
+            return future.result(), src
+        if self.capture_errors:
+            return exception, src
+        raise exception
@@ -0,0 +1,186 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+PROFILE_MODES = ("sample", "cprofile")
+
+
+class WorkerProfiler:
+    """
+    Profiles the calls a device worker runs, labelled "model.method".
+
+    mode="sample" wakes every `interval` seconds on a background thread and
+    records the stack of the call running at that moment, from the worker's
+    execute step down, as a collapsed stack ("label;frame;...;frame") with a
+    count, the format flame graph tools read. mode="cprofile" runs cProfile
+    around each call instead, keeping deterministic per-function stats for each
+    label. Either way the profile covers the model, its Python preprocessing and
+    pickling the reply.
+
+    The sampler needs the GIL to read a stack, and a running call only gives it
+    up every switch interval or when it blocks, so samples would pile up where
+    calls block. While sampling, the switch interval is cut to a tenth of
+    `interval`, and it is restored on `stop`.
+
+    It is done after `calls` calls or `duration` seconds, whichever comes first;
+    the worker enforces the duration. Calls are counted in `shared_calls`, a
+    multiprocessing Value, when given, so several workers can stop at a total.
+    """
+
+    def __init__(
+        self,
+        mode="sample",
+        duration=None,
+        calls=None,
+        interval=0.005,
+        shared_calls=None,
+    ):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(PROFILE_MODES)}.")
+        self.mode = mode
+        self.duration = duration
+        self.calls = calls
+        self.interval = interval
+        self.shared_calls = shared_calls
+        self.call_counts = {}
+        self.call_seconds = {}
+        self.stacks = {}
+        self.profiles = {}
+        self.current = None  # (label, thread id, base frame) of the running call.
+        self.started = perf_counter()
+        self.stopped = threading.Event()
+        if mode == "sample":
+            self.switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(self.switch_interval, interval / 10))
+            self.sampler = threading.Thread(target=self._sample, daemon=True)
+            self.sampler.start()
+
+    @contextmanager
+    def measure(self, model_name, method_name):
+        label = f"{model_name}.{method_name or '__call__'}"
+        profile = None
+        if self.mode == "cprofile":
+            profile = self.profiles.get(label)
+            if profile is None:
+                profile = self.profiles[label] = cProfile.Profile()
+        self.current = (label, threading.get_ident(), sys._getframe(2))
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            self.current = None
+
+    def count(self, model_name, method_name, calls, seconds):
+        """Count `calls` run together, e.g. as one batch, taking `seconds` in all."""
+        label = f"{model_name}.{method_name or '__call__'}"
+        self.call_counts[label] = self.call_counts.get(label, 0) + calls
+        self.call_seconds[label] = self.call_seconds.get(label, 0.0) + seconds
+        if self.shared_calls is not None:
+            with self.shared_calls.get_lock():
+                self.shared_calls.value += calls
+
+    def done(self):
+        if self.calls is None:
+            return False
+        if self.shared_calls is not None:
+            return self.shared_calls.value >= self.calls
+        return sum(self.call_counts.values()) >= self.calls
+
+    def remaining(self):
+        """Seconds left of the duration, or None without one."""
+        if self.duration is None:
+            return None
+        return max(self.duration - (perf_counter() - self.started), 0.0)
+
+    def _sample(self):
+        while not self.stopped.wait(self.interval):
+            current = self.current
+            if current is None:
+                continue
+            label, thread_id, base = current
+            frame = sys._current_frames().get(thread_id)
+            frames = []
+            while frame is not None and frame is not base:
+                code = frame.f_code
+                frames.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                    f"{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if frame is None:
+                continue  # The call finished while the stack was being read.
+            stack = ";".join([label, *reversed(frames)])
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def stop(self):
+        """Stop profiling and return the profile, ready to send to the caller."""
+        self.stopped.set()
+        if self.mode == "sample":
+            self.sampler.join()
+            sys.setswitchinterval(self.switch_interval)
+        profile = {
+            "mode": self.mode,
+            "seconds": perf_counter() - self.started,
+            "calls": self.call_counts,
+            "call_seconds": self.call_seconds,
+        }
+        if self.mode == "sample":
+            profile["stacks"] = self.stacks
+        else:
+            stats = profile["stats"] = {}
+            for label, cprofile in self.profiles.items():
+                cprofile.create_stats()
+                stats[label] = cprofile.stats
+        return profile
+
+
+class _RawStats:
+    """Wraps a cProfile stats dict so pstats.Stats can load it."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def merge_profiles(profiles):
+    """Combine {worker name: profile} from WorkerProfiler.stop into one profile.
+
+    Stacks are summed across workers; cProfile stats become one pstats.Stats per
+    label. Per-worker seconds and call counts are kept under "workers".
+    """
+    merged = {"workers": {}}
+    for worker_name, profile in profiles.items():
+        merged["mode"] = profile["mode"]
+        merged["workers"][worker_name] = {
+            "seconds": profile["seconds"],
+            "calls": profile["calls"],
+            "call_seconds": profile["call_seconds"],
+        }
+        if "stacks" in profile:
+            stacks = merged.setdefault("stacks", {})
+            for stack, count in profile["stacks"].items():
+                stacks[stack] = stacks.get(stack, 0) + count
+        for label, stats in profile.get("stats", {}).items():
+            merged_stats = merged.setdefault("stats", {})
+            if label in merged_stats:
+                merged_stats[label].add(_RawStats(stats))
+            else:
+                merged_stats[label] = pstats.Stats(_RawStats(stats))
+    return merged
+
+
+def collapsed_text(stacks):
+    """Collapsed stacks as flamegraph.pl and speedscope read them, one per line."""
+    return "".join(
+        f"{stack} {count}\n"
+        for stack, count in sorted(stacks.items(), key=lambda item: -item[1])
+    )
@@ -0,0 +1,456 @@
+import itertools
+import os
+import pickle
+import socket
+import struct
+import threading
+from concurrent.futures import Future
+
+from .errors import decode_error, encode_error
+from .fleet import submit_call
+
+try:
+    import numpy as np
+except ImportError:  # Arrays are not encodable without numpy.
+    np = None
+
+CALL, RESULT, ERROR = 0, 1, 2
+_FRAME = struct.Struct("!QBII")  # request_id, kind, meta bytes, buffer count
+_LENGTH = struct.Struct("!I")
+_INT = struct.Struct("!q")
+_FLOAT = struct.Struct("!d")
+_MAX_PARTS = 512  # Below the usual IOV_MAX of 1024.
+MAX_FRAME_BYTES = 1 << 30
+
+
+def encode(obj, allow_pickle=True):
+    """Encode an object as (meta, buffers).
+
+    None, bools, ints, floats, strings, bytes, lists, tuples, dicts, NumPy arrays
+    and NumPy scalars are encoded natively. The contents of arrays and bytes
+    objects are returned as separate buffers so they can be written to a socket
+    without being copied. Other objects are pickled if allowed.
+    """
+    meta = bytearray()
+    buffers = []
+    _encode(obj, meta, buffers, allow_pickle)
+    return meta, buffers
+
+
+def _encode(obj, meta, buffers, allow_pickle):
+    if obj is None:
+        meta += b"N"
+    elif obj is True or obj is False:
+        meta += b"T" if obj else b"F"
+    elif type(obj) is int:
+        if -(1 << 63) <= obj < 1 << 63:
+            meta += b"i" + _INT.pack(obj)
+        else:
+            _encode_bytes(b"I", str(obj).encode(), meta)
+    elif type(obj) is float:
+        meta += b"f" + _FLOAT.pack(obj)
+    elif type(obj) is str:
+        _encode_bytes(b"s", obj.encode("utf-8", "surrogatepass"), meta)
+    elif type(obj) in (bytes, bytearray):
+        meta += b"b" + _LENGTH.pack(len(buffers))
+        buffers.append(memoryview(obj))
+    elif type(obj) in (list, tuple):
+        meta += (b"l" if type(obj) is list else b"t") + _LENGTH.pack(len(obj))
+        for item in obj:
+            _encode(item, meta, buffers, allow_pickle)
+    elif type(obj) is dict:
+        meta += b"d" + _LENGTH.pack(len(obj))
+        for key, value in obj.items():
+            _encode(key, meta, buffers, allow_pickle)
+            _encode(value, meta, buffers, allow_pickle)
+    elif np is not None and isinstance(obj, (np.ndarray, np.generic)) and (
+        not obj.dtype.hasobject
+    ):
+        array = np.asarray(obj)
+        if not array.flags.c_contiguous:
+            array = array.copy()
+        meta += b"a" if isinstance(obj, np.ndarray) else b"g"
+        _encode_bytes(b"", array.dtype.str.encode(), meta)
+        meta += _LENGTH.pack(array.ndim)
+        for size in array.shape:
+            meta += _INT.pack(size)
+        meta += _LENGTH.pack(len(buffers))
+        buffers.append(memoryview(array).cast("B") if array.nbytes else b"")
+    elif allow_pickle:
+        _encode_bytes(b"p", pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), meta)
+    else:
+        raise TypeError(f"Cannot encode {type(obj).__name__} without pickle.")
+
+
+def _encode_bytes(tag, data, meta):
+    meta += tag + _LENGTH.pack(len(data)) + data
+
+
+def decode(meta, buffers, allow_pickle=True):
+    """Decode (meta, buffers) from `encode`; arrays are views of the buffers."""
+    obj, _ = _decode(memoryview(meta), 0, buffers, allow_pickle)
+    return obj
+
+
+def _decode(meta, position, buffers, allow_pickle):
+    tag = meta[position : position + 1].tobytes()
+    position += 1
+    if tag == b"N":
+        return None, position
+    if tag in (b"T", b"F"):
+        return tag == b"T", position
+    if tag == b"i":
+        return _INT.unpack_from(meta, position)[0], position + _INT.size
+    if tag == b"f":
+        return _FLOAT.unpack_from(meta, position)[0], position + _FLOAT.size
+    if tag == b"b":
+        (index,) = _LENGTH.unpack_from(meta, position)
+        return bytes(buffers[index]), position + _LENGTH.size
+    if tag in (b"l", b"t"):
+        (count,) = _LENGTH.unpack_from(meta, position)
+        position += _LENGTH.size
+        items = []
+        for _ in range(count):
+            item, position = _decode(meta, position, buffers, allow_pickle)
+            items.append(item)
+        return (items if tag == b"l" else tuple(items)), position
+    if tag == b"d":
+        (count,) = _LENGTH.unpack_from(meta, position)
+        position += _LENGTH.size
+        result = {}
+        for _ in range(count):
+            key, position = _decode(meta, position, buffers, allow_pickle)
+            result[key], position = _decode(meta, position, buffers, allow_pickle)
+        return result, position
+
+    if tag in (b"a", b"g"):
+        if np is None:
+            raise TypeError("Decoding arrays requires numpy.")
+        dtype, position = _decode_bytes(meta, position)
+        (ndim,) = _LENGTH.unpack_from(meta, position)
+        position += _LENGTH.size
+        shape = struct.unpack_from(f"!{ndim}q", meta, position)
+        position += _INT.size * ndim
+        (index,) = _LENGTH.unpack_from(meta, position)
+        array = np.frombuffer(buffers[index], dtype=np.dtype(dtype.tobytes().decode()))
+        array = array.reshape(shape)
+        return (array if tag == b"a" else array[()]), position + _LENGTH.size
+
+    data, position = _decode_bytes(meta, position)
+    if tag == b"s":
+        return str(data, "utf-8", "surrogatepass"), position
+    if tag == b"I":
+        return int(str(data, "ascii")), position
+    if tag == b"p":
+        if not allow_pickle:
+            raise TypeError("Pickled values are not accepted.")
+        return pickle.loads(data), position
+    raise ValueError(f"Unknown tag {tag!r} in encoded message.")
+
+
+def _decode_bytes(meta, position):
+    (length,) = _LENGTH.unpack_from(meta, position)
+    position += _LENGTH.size
+    return meta[position : position + length], position + length
+
+
+def send_frame(sock, request_id, kind, meta, buffers):
+    """Write a frame with one gathering write where possible, copying no buffers."""
+    lengths = [memoryview(buffer).nbytes for buffer in buffers]
+    header = _FRAME.pack(request_id, kind, len(meta), len(buffers))
+    parts = [header + struct.pack(f"!{len(buffers)}Q", *lengths) + meta]
+    parts += [memoryview(b).cast("B") for b, n in zip(buffers, lengths) if n]
+    while parts:
+        sent = sock.sendmsg(parts[:_MAX_PARTS])
+        while parts and sent >= memoryview(parts[0]).nbytes:
+            sent -= memoryview(parts.pop(0)).nbytes
+        if sent:
+            parts[0] = memoryview(parts[0])[sent:]
+
+
+def recv_frame(reader, max_frame_bytes=MAX_FRAME_BYTES):
+    """Read one frame as (request_id, kind, meta, buffers) from a buffered reader.
+
+    Raises ValueError, before allocating anything for it, for a frame larger than
+    `max_frame_bytes`; the stream cannot be resynchronized after that.
+    """
+    request_id, kind, meta_length, buffer_count = _FRAME.unpack(
+        _read_exactly(reader, _FRAME.size)
+    )
+    size = meta_length + 8 * buffer_count
+    if size > max_frame_bytes:
+        raise ValueError(f"Frame of over {size} bytes exceeds max_frame_bytes.")
+    lengths = struct.unpack(
+        f"!{buffer_count}Q", _read_exactly(reader, 8 * buffer_count)
+    )
+    size += sum(lengths)
+    if size > max_frame_bytes:
+        raise ValueError(f"Frame of {size} bytes exceeds max_frame_bytes.")
+    meta = _read_exactly(reader, meta_length)
+    buffers = [_read_exactly(reader, length) for length in lengths]
+    return request_id, kind, meta, buffers
+
+
+def _read_exactly(reader, length):
+    buffer = bytearray(length)
+    if length and reader.readinto(buffer) != length:
+        raise EOFError("Connection closed.")
+    return buffer
+
+
+def _configure(sock):
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+class RPCServer:
+    """
+    Serves a fleet callable over TCP.
+
+    Each connection is read by its own thread, and every call is submitted to the
+    fleet callable without waiting for earlier ones, so a client can pipeline
+    any number of requests over one connection. Replies go back tagged with their
+    request id as calls complete. Requests may only contain natively encoded
+    values unless allow_pickle=True, since unpickling runs arbitrary code, and a
+    connection sending a frame over `max_frame_bytes` is closed.
+
+    Example usage:
+    --------------
+    server = RPCServer(md_fleet.fleet_callable, port=5001)
+    server.serve_forever()
+    """
+
+    def __init__(
+        self,
+        fleet_callable,
+        host="127.0.0.1",
+        port=0,
+        allow_pickle=False,
+        max_frame_bytes=MAX_FRAME_BYTES,
+    ):
+        self.fleet_callable = fleet_callable
+        self.allow_pickle = allow_pickle
+        self.max_frame_bytes = max_frame_bytes
+        self.listener = socket.create_server((host, port))
+        self.address = self.listener.getsockname()[:2]
+        self.closed = False
+
+    def start(self):
+        """Serve from a background thread and return the server."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        while not self.closed:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                break
+            threading.Thread(
+                target=self._serve_connection, args=(_configure(sock),), daemon=True
+            ).start()
+
+    def _serve_connection(self, sock):
+        send_lock = threading.Lock()
+
+        def reply(request_id, kind, payload):
+            try:
+                if kind == ERROR:
+                    payload = encode_error(payload)
+                meta, buffers = encode(payload)
+            except Exception as e:
+                kind = ERROR
+                meta, buffers = encode(encode_error(RuntimeError(repr(e))))
+            with send_lock:
+                try:
+                    send_frame(sock, request_id, kind, meta, buffers)
+                except OSError:
+                    pass  # The client has gone away.
+
+        def on_done(request_id):
+            def callback(future):
+                if future.exception() is None:
+                    reply(request_id, RESULT, future.result())
+                else:
+                    reply(request_id, ERROR, future.exception())
+
+            return callback
+
+        with sock, sock.makefile("rb") as reader:
+            while True:
+                try:
+                    request_id, _, meta, buffers = recv_frame(
+                        reader, self.max_frame_bytes
+                    )
+                except (EOFError, OSError, ValueError):
+                    break
+                try:
+                    call_dict = decode(meta, buffers, self.allow_pickle)
+                    future = submit_call(self.fleet_callable, call_dict)
+                except Exception as e:
+                    reply(request_id, ERROR, e)
+                    continue
+                future.add_done_callback(on_done(request_id))
+
+    def close(self):
+        self.closed = True
+        self.listener.close()
+
+
+class RPCConnection:
+    """One persistent connection with any number of requests in flight."""
+
+    def __init__(
+        self,
+        address,
+        timeout=None,
+        allow_pickle=False,
+        max_frame_bytes=MAX_FRAME_BYTES,
+    ):
+        self.allow_pickle = allow_pickle
+        self.max_frame_bytes = max_frame_bytes
+        self.sock = _configure(socket.create_connection(address, timeout=timeout))
+        self.sock.settimeout(None)
+        self.reader = self.sock.makefile("rb")
+        self.pending = {}
+        self.request_ids = itertools.count()
+        self.send_lock = threading.Lock()
+        self.closed = False
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def submit(self, call_dict):
+        future = Future()
+        request_id = next(self.request_ids)
+        meta, buffers = encode(call_dict)
+        self.pending[request_id] = future
+        try:
+            with self.send_lock:
+                send_frame(self.sock, request_id, CALL, meta, buffers)
+        except BaseException:
+            self.pending.pop(request_id, None)
+            self.closed = True
+            raise
+        if self.closed:
+            self._fail_pending()
+        return future
+
+    def _dispatch(self):
+        try:
+            while True:
+                try:
+                    request_id, kind, meta, buffers = recv_frame(
+                        self.reader, self.max_frame_bytes
+                    )
+                except (EOFError, OSError, ValueError):
+                    break
+                future = self.pending.pop(request_id, None)
+                if future is None:
+                    continue
+                try:
+                    payload = decode(meta, buffers, self.allow_pickle)
+                    if kind == ERROR:
+                        payload = decode_error(payload, self.allow_pickle)
+                except Exception as e:
+                    kind, payload = ERROR, e
+                if future.done():
+                    continue  # Cancelled by the caller.
+                if kind == RESULT:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(payload)
+        finally:
+            self.closed = True
+            self._fail_pending()
+
+    def _fail_pending(self):
+        while self.pending:
+            try:
+                _, future = self.pending.popitem()
+            except KeyError:
+                break
+            if not future.done():
+                future.set_exception(RuntimeError("Connection to RPC server closed."))
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class RPCClient:
+    """
+    Fleet callable for a remote RPCServer, usable wherever a fleet_callable is.
+
+    Keeps a pool of `pool_size` persistent connections, opened on first use and
+    reopened if one drops, and sends each call on the connection with the fewest
+    requests in flight. `submit` returns a concurrent.futures.Future, so one
+    thread can pipeline many calls and a ModelProxy or AsyncModelProxy can be
+    built on top. The client can be pickled into other processes, which open
+    their own connections. Like RPCServer, it only accepts natively encoded
+    results unless allow_pickle=True; errors come back as their built-in type,
+    or a RemoteError naming it, without pickle. Replies over `max_frame_bytes`
+    close the connection they arrive on.
+
+    Example usage:
+    --------------
+    fleet = ModelProxy(model_config, RPCClient(("127.0.0.1", 5001)))
+    """
+
+    def __init__(
+        self,
+        address,
+        pool_size=2,
+        timeout=10.0,
+        allow_pickle=False,
+        max_frame_bytes=MAX_FRAME_BYTES,
+    ):
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1.")
+        self.address = tuple(address)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.allow_pickle = allow_pickle
+        self.max_frame_bytes = max_frame_bytes
+        self.connections = []
+        self.connections_pid = None
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["connections"] = []
+        state["connections_pid"] = None
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _connection(self):
+        with self.lock:
+            if self.connections_pid != os.getpid():
+                self.connections = []
+                self.connections_pid = os.getpid()
+            self.connections = [c for c in self.connections if not c.closed]
+            if len(self.connections) < self.pool_size:
+                connection = RPCConnection(
+                    self.address, self.timeout, self.allow_pickle, self.max_frame_bytes
+                )
+                self.connections.append(connection)
+                return connection
+            return min(self.connections, key=lambda c: len(c.pending))
+
+    def submit(self, call_dict):
+        return self._connection().submit(call_dict)
+
+    def __call__(self, call_dict):
+        return self.submit(call_dict).result()
+
+    def close(self):
+        with self.lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections = []
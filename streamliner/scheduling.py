@@ -0,0 +1,228 @@
+import random
+from multiprocessing import Array, Lock, Value
+
+from .model_builder import build_object_by_name
+from .registry import register as REGISTER
+
+
+class SchedulerState:
+    """
+    Per-device load and residency shared by every DeviceLoadBalancer of a fleet.
+
+    Tracks outstanding requests and builds in progress per device, a moving
+    average of per-request service time, which models are resident (or being
+    built) on which device, the last measured build time of each model and a
+    cursor for rotating schedulers. With shared=False plain lists are used, e.g.
+    for simulations.
+
+    Devices here are schedulable slots, such as one replica worker of a device.
+    `eligible` maps model names to the slots allowed to serve them; models
+    missing from it may run anywhere.
+
+    The arrays live in shared memory without per-array locks. Schedulers read
+    them without locking, since a count a moment out of date only skews one
+    choice, and updates take a single shared `lock`, so routing a call costs one
+    uncontended lock instead of a lock per element read.
+    """
+
+    BUILDING = 2
+    RESIDENT = 1
+
+    def __init__(
+        self, device_count, model_names, shared=True, smoothing=0.2, eligible=None
+    ):
+        self.device_count = device_count
+        self.model_indices = {name: i for i, name in enumerate(sorted(model_names))}
+        self.smoothing = smoothing
+        every_device = list(range(device_count))
+        eligible = eligible or {}
+        self.eligible = [
+            list(eligible.get(name, every_device)) for name in self.model_indices
+        ]
+        self.every_device = every_device
+        model_count = len(self.model_indices)
+        if shared:
+            self.lock = Lock()
+            self.outstanding = Array("i", device_count, lock=False)
+            self.pending_builds = Array("i", device_count, lock=False)
+            self.service_time = Array("d", device_count, lock=False)
+            self.resident = Array("b", device_count * model_count, lock=False)
+            self.build_time = Array("d", model_count, lock=False)
+            self.cursor = Value("i", 0, lock=False)
+        else:
+            self.lock = _NoLock()
+            self.outstanding = [0] * device_count
+            self.pending_builds = [0] * device_count
+            self.service_time = [0.0] * device_count
+            self.resident = [0] * (device_count * model_count)
+            self.build_time = [0.0] * model_count
+            self.cursor = _LocalValue()
+
+    def model_index(self, model_name):
+        return self.model_indices.get(model_name)
+
+    def candidates(self, model_index):
+        """Device positions that may serve the model."""
+        return self.every_device if model_index is None else self.eligible[model_index]
+
+    def begin(self, device_position, model_index=None):
+        """Count a request routed to a device and return how many were ahead of it.
+
+        Returns None if the model is not yet resident there; the model is then
+        marked as building so followers queue behind the build instead of
+        starting another one elsewhere.
+        """
+        with self.lock:
+            ahead = self.outstanding[device_position]
+            self.outstanding[device_position] += 1
+            if model_index is None:
+                return ahead
+            residency = self.is_resident(device_position, model_index)
+            if not residency:
+                self._set_residency(device_position, model_index, self.BUILDING)
+        return ahead if residency == self.RESIDENT else None
+
+    def finish(self, device_position, seconds, ahead=0):
+        """Record a completed request that waited behind `ahead` others.
+
+        Requests that waited on a build (ahead is None) leave the service time
+        estimate alone, since the build would swamp it.
+        """
+        with self.lock:
+            self.outstanding[device_position] -= 1
+            if ahead is None:
+                return
+            seconds /= ahead + 1
+            previous = self.service_time[device_position]
+            self.service_time[device_position] = (
+                seconds
+                if not previous
+                else previous + self.smoothing * (seconds - previous)
+            )
+
+    def is_resident(self, device_position, model_index):
+        return self.resident[device_position * len(self.model_indices) + model_index]
+
+    def _set_residency(self, device_position, model_index, residency):
+        index = device_position * len(self.model_indices) + model_index
+        previous, self.resident[index] = self.resident[index], residency
+        if previous != residency == self.BUILDING:
+            self.pending_builds[device_position] += 1
+        elif previous == self.BUILDING != residency:
+            self.pending_builds[device_position] -= 1
+
+    def mark_resident(self, device_position, model_name, build_seconds=None):
+        model_index = self.model_indices[model_name]
+        with self.lock:
+            self._set_residency(device_position, model_index, self.RESIDENT)
+        if build_seconds is not None:
+            self.build_time[model_index] = build_seconds
+
+    def mark_evicted(self, device_position, model_name):
+        model_index = self.model_indices[model_name]
+        with self.lock:
+            self._set_residency(device_position, model_index, 0)
+
+    def abandon_build(self, device_position, model_index):
+        """Clear a building mark left by a request that failed."""
+        with self.lock:
+            if self.is_resident(device_position, model_index) == self.BUILDING:
+                self._set_residency(device_position, model_index, 0)
+
+
+class _NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _LocalValue:
+    def __init__(self, value=0):
+        self.value = value
+
+
+@REGISTER
+class RoundRobinScheduler:
+    """Rotates over idle devices, falling back to all devices when none are idle."""
+
+    def select(self, state, model_index):
+        devices = state.candidates(model_index)
+        with state.lock:
+            idle = [i for i in devices if not state.outstanding[i]]
+            candidates = idle or devices
+            selected = candidates[state.cursor.value % len(candidates)]
+            state.cursor.value += 1
+        return selected
+
+
+@REGISTER
+class LeastOutstandingScheduler:
+    """Picks the device with the fewest outstanding requests."""
+
+    def select(self, state, model_index):
+        devices = state.candidates(model_index)
+        outstanding = state.outstanding[:]
+        fewest = min(outstanding[i] for i in devices)
+        candidates = [i for i in devices if outstanding[i] == fewest]
+        return random.choice(candidates)
+
+
+@REGISTER
+class PowerOfTwoChoicesScheduler:
+    """Samples two devices and picks the one with fewer outstanding requests."""
+
+    def select(self, state, model_index):
+        devices = state.candidates(model_index)
+        if len(devices) == 1:
+            return devices[0]
+        first, second = random.sample(devices, 2)
+        return min(
+            first,
+            second,
+            key=lambda i: (state.outstanding[i], state.service_time[i]),
+        )
+
+
+@REGISTER
+class ModelAffinityScheduler:
+    """
+    Prefers devices that already hold the model.
+
+    Each device is scored by its expected wait, (outstanding + 1) * service time
+    plus the builds already queued on it, and the model's own build time is added
+    where it is not resident. A warm device is therefore used until its queue
+    costs more than building the model elsewhere. Build time is the last one
+    measured for the model, or `default_build_seconds` before any build has
+    finished. Ties go to the device with fewer outstanding requests.
+    """
+
+    def __init__(self, default_build_seconds=1.0):
+        self.default_build_seconds = default_build_seconds
+
+    def select(self, state, model_index):
+        build_seconds = self.default_build_seconds
+        if model_index is not None:
+            build_seconds = state.build_time[model_index] or build_seconds
+        outstanding = state.outstanding[:]
+        service_time = state.service_time[:]
+        pending_builds = state.pending_builds[:]
+
+        def cost(i):
+            wait = (outstanding[i] + 1) * service_time[i]
+            wait += pending_builds[i] * build_seconds
+            if model_index is not None and not state.is_resident(i, model_index):
+                wait += build_seconds
+            return wait, outstanding[i]
+
+        devices = state.candidates(model_index)
+        costs = [cost(i) for i in devices]
+        lowest = min(costs)
+        return random.choice([i for i, c in zip(devices, costs) if c == lowest])
+
+
+def build_scheduler(scheduler):
+    if isinstance(scheduler, str):
+        scheduler = {"class": scheduler}
+    return build_object_by_name(scheduler["class"], **scheduler.get("init_params", {}))
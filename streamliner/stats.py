@@ -0,0 +1,289 @@
+import os
+import threading
+from collections import deque
+from multiprocessing import Array, Lock
+
+from .timer import timer
+
+try:
+    import numpy as np
+except ImportError:  # Records are bucketed one at a time without numpy.
+    np = None
+
+PHASES = ("schedule", "send", "queue", "exec", "reply", "recv", "total", "build")
+BUCKETS = 32  # Bucket i counts durations below 2**i microseconds.
+
+
+class FleetStats:
+    """
+    Latency histograms per phase, model and device, shared by a fleet's processes.
+
+    Callers record how long scheduling, sending, receiving and the whole call
+    took; device workers record time spent queued, executing, replying and
+    building models, along with per-device busy time. Every process writes into
+    the same shared arrays, so a snapshot taken anywhere covers the whole fleet.
+    Histogram buckets are powers of two in microseconds.
+
+    A record only queues its durations in the recording process. Every
+    `flush_interval` seconds that process's timer thread buckets what was queued,
+    with numpy where available, and adds it to the shared arrays under one lock
+    per device, so the call path never touches shared memory. A snapshot flushes
+    this process's records first; other processes' may be up to `flush_interval`
+    behind.
+
+    Requests a worker drops because their deadline passed are counted per model
+    and device as well, and hedged calls per model.
+    """
+
+    def __init__(self, device_count, model_names, flush_interval=0.05):
+        self.device_count = device_count
+        self.flush_interval = flush_interval
+        self.model_names = sorted(model_names)
+        self.model_indices = {name: i for i, name in enumerate(self.model_names)}
+        self.phase_indices = {phase: i for i, phase in enumerate(PHASES)}
+        # One extra model slot collects calls to models missing from the config.
+        self.row_size = BUCKETS + 1  # Bucket counts, then the sum of durations.
+        self.device_size = len(PHASES) * (len(self.model_names) + 1) * self.row_size
+        self.histograms = [
+            Array("d", self.device_size, lock=False) for _ in range(device_count)
+        ]
+        self.busy_seconds = Array("d", device_count, lock=False)
+        self.shed = Array("i", device_count * (len(self.model_names) + 1), lock=False)
+        self.locks = [Lock() for _ in range(device_count)]
+        # Hedges sent and hedges that answered first, per model.
+        self.hedges = Array("i", 2 * (len(self.model_names) + 1))
+        self.rows = {
+            model_name: {phase: self._row(model_name, phase) for phase in PHASES}
+            for model_name in self.model_names + [None]
+        }
+
+    def _row(self, model_name, phase):
+        model_index = self.model_indices.get(model_name, len(self.model_names))
+        return (
+            self.phase_indices[phase] * (len(self.model_names) + 1) + model_index
+        ) * self.row_size
+
+    def record(self, device_position, model_name, phases, seconds, busy_seconds=0.0):
+        """Record `seconds[i]` spent in `phases[i]` for one model on one device."""
+        global _flush_scheduled
+        _pending.append(
+            (self, device_position, model_name, phases, seconds, busy_seconds)
+        )
+        if not _flush_scheduled:
+            _flush_scheduled = True
+            timer().call_later(self.flush_interval, flush)
+
+    def _write(self, device_position, groups, busy_seconds):
+        """Add {(model_name, phases): [seconds, ...]} to one device's histograms."""
+        deltas = {}
+        for (model_name, phases), durations in groups.items():
+            rows = self.rows.get(model_name) or self.rows[None]
+            if np is None:
+                for record in durations:
+                    for phase, seconds in zip(phases, record):
+                        row = rows[phase]
+                        bucket = int(seconds * 1e6).bit_length()
+                        index = row + (bucket if bucket < BUCKETS else BUCKETS - 1)
+                        deltas[index] = deltas.get(index, 0) + 1
+                        deltas[row + BUCKETS] = deltas.get(row + BUCKETS, 0.0) + seconds
+                continue
+            values = np.array(durations, dtype=float)
+            # The exponent of floor(us) is its bit length, as in the loop above.
+            buckets = np.frexp(np.floor(np.maximum(values, 0.0) * 1e6))[1]
+            buckets = np.minimum(buckets, BUCKETS - 1)
+            for column, phase in enumerate(phases):
+                row = rows[phase]
+                counts = np.bincount(buckets[:, column], minlength=BUCKETS)
+                for bucket in np.flatnonzero(counts).tolist():
+                    index = row + bucket
+                    deltas[index] = deltas.get(index, 0) + int(counts[bucket])
+                total = float(values[:, column].sum())
+                deltas[row + BUCKETS] = deltas.get(row + BUCKETS, 0.0) + total
+        histogram = self.histograms[device_position]
+        with self.locks[device_position]:
+            for index, delta in deltas.items():
+                histogram[index] += delta
+            if busy_seconds:
+                self.busy_seconds[device_position] += busy_seconds
+
+    def record_shed(self, device_position, model_name):
+        model_index = self.model_indices.get(model_name, len(self.model_names))
+        with self.locks[device_position]:
+            self.shed[device_position * (len(self.model_names) + 1) + model_index] += 1
+
+    def shed_counts(self, device_names=None):
+        """{model: {device: count}} of requests dropped after their deadline."""
+        device_names = device_names or list(range(self.device_count))
+        counts = {}
+        for position, device in enumerate(device_names):
+            for model_index, model_name in enumerate(self.model_names + ["<unknown>"]):
+                count = self.shed[position * (len(self.model_names) + 1) + model_index]
+                if count:
+                    counts.setdefault(model_name, {})[device] = count
+        return counts
+
+    def record_hedge(self, model_name, won=False):
+        model_index = self.model_indices.get(model_name, len(self.model_names))
+        with self.hedges.get_lock():
+            self.hedges[2 * model_index + won] += 1
+
+    def hedge_counts(self):
+        """{model: {"sent": n, "won": n}} for every model that was hedged."""
+        with self.hedges.get_lock():
+            hedges = self.hedges[:]
+        return {
+            model_name: {"sent": hedges[2 * i], "won": hedges[2 * i + 1]}
+            for i, model_name in enumerate(self.model_names + ["<unknown>"])
+            if hedges[2 * i]
+        }
+
+    def snapshot(self, device_names=None):
+        """Nested {phase: {model: {device: summary}}} of every non-empty histogram.
+
+        Each summary holds the count, total and mean seconds, p50/p90/p99 (the
+        upper bound of the bucket holding the quantile) and the bucket counts.
+        """
+        flush()
+        device_names = device_names or list(range(self.device_count))
+        model_names = self.model_names + ["<unknown>"]
+        phases = {}
+        for position, device in enumerate(device_names):
+            with self.locks[position]:
+                histogram = self.histograms[position][:]
+            for phase in PHASES:
+                for model_name in model_names:
+                    row = self._row(model_name, phase)
+                    buckets = [int(count) for count in histogram[row : row + BUCKETS]]
+                    count = sum(buckets)
+                    if not count:
+                        continue
+                    total = histogram[row + BUCKETS]
+                    summary = {
+                        "count": count,
+                        "sum": total,
+                        "mean": total / count,
+                        "buckets": buckets,
+                    }
+                    for quantile in (0.5, 0.9, 0.99):
+                        summary[f"p{round(quantile * 100)}"] = _quantile(
+                            buckets, count, quantile
+                        )
+                    phases.setdefault(phase, {}).setdefault(model_name, {})[
+                        device
+                    ] = summary
+        return phases
+
+
+# Records waiting to be written, from every FleetStats used in this process.
+_pending = deque()
+_flush_scheduled = False
+_flush_lock = threading.Lock()
+
+
+def flush():
+    """Write this process's queued records into the shared arrays."""
+    global _flush_scheduled
+    _flush_scheduled = False
+    with _flush_lock:
+        devices = {}
+        while True:
+            try:
+                record = _pending.popleft()
+            except IndexError:
+                break
+            stats, device_position, model_name, phases, seconds, busy = record
+            device = devices.get((stats, device_position))
+            if device is None:
+                device = devices[stats, device_position] = [{}, 0.0]
+            device[0].setdefault((model_name, phases), []).append(seconds)
+            device[1] += busy
+        for (stats, device_position), (groups, busy) in devices.items():
+            stats._write(device_position, groups, busy)
+
+
+def _forget_pending():
+    global _flush_scheduled
+    _pending.clear()
+    _flush_scheduled = False
+
+
+# A forked child starts without its parent's queued records or timer.
+os.register_at_fork(after_in_child=_forget_pending)
+
+
+def bucket_upper_bound(bucket):
+    return (1 << bucket) / 1e6
+
+
+def _quantile(buckets, count, quantile):
+    target = quantile * count
+    seen = 0
+    for bucket, bucket_count in enumerate(buckets):
+        seen += bucket_count
+        if seen >= target:
+            return bucket_upper_bound(bucket)
+    return bucket_upper_bound(BUCKETS - 1)
+
+
+def prometheus_text(stats):
+    """Render a MultiDeviceFleet.stats() snapshot in the Prometheus text format."""
+    lines = [
+        "# HELP streamliner_phase_seconds Fleet call latency by phase.",
+        "# TYPE streamliner_phase_seconds histogram",
+    ]
+    for phase, models in stats["phases"].items():
+        for model_name, devices in models.items():
+            for device, summary in devices.items():
+                labels = f'phase="{phase}",model="{model_name}",device="{device}"'
+                cumulative = 0
+                for bucket, count in enumerate(summary["buckets"]):
+                    cumulative += count
+                    bound = bucket_upper_bound(bucket)
+                    lines.append(
+                        f'streamliner_phase_seconds_bucket{{{labels},le="{bound:g}"}} '
+                        f"{cumulative}"
+                    )
+                lines.append(
+                    f'streamliner_phase_seconds_bucket{{{labels},le="+Inf"}} '
+                    f"{summary['count']}"
+                )
+                lines.append(
+                    f"streamliner_phase_seconds_sum{{{labels}}} {summary['sum']}"
+                )
+                lines.append(
+                    f"streamliner_phase_seconds_count{{{labels}}} {summary['count']}"
+                )
+
+    device_metrics = (
+        ("in_flight", "gauge", "Requests outstanding on the device."),
+        ("pending_builds", "gauge", "Model builds in progress on the device."),
+        ("busy_seconds", "counter", "Seconds the device spent executing calls."),
+        ("shed", "counter", "Requests dropped because their deadline passed."),
+    )
+    cache_metrics = (
+        ("hits", "counter", "Result cache hits."),
+        ("misses", "counter", "Result cache misses."),
+        ("evictions", "counter", "Result cache evictions."),
+        ("coalesced", "counter", "Calls served by an identical call in flight."),
+        ("entries", "gauge", "Results held in the cache."),
+    )
+    hedge_metrics = (
+        ("sent", "counter", "Duplicate calls sent to another device."),
+        ("won", "counter", "Duplicate calls that answered first."),
+    )
+    for prefix, label, values, metrics in (
+        ("device", "device", stats["devices"], device_metrics),
+        ("cache", "model", stats.get("cache", {}), cache_metrics),
+        ("hedge", "model", stats.get("hedges", {}), hedge_metrics),
+    ):
+        if not values:
+            continue
+        for name, kind, description in metrics:
+            metric = f"streamliner_{prefix}_{name}"
+            if kind == "counter":
+                metric += "_total"
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for key, key_stats in values.items():
+                lines.append(f'{metric}{{{label}="{key}"}} {key_stats[name]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,70 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    """Runs callbacks at their due time on one background thread."""
+
+    def __init__(self):
+        self.heap = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def call_later(self, delay, callback):
+        """Schedule `callback()`, returning an entry to pass to `cancel`."""
+        entry = [perf_counter() + delay, next(self.sequence), callback]
+        with self.condition:
+            heapq.heappush(self.heap, entry)
+            if self.heap[0] is entry:
+                self.condition.notify()
+        return entry
+
+    @staticmethod
+    def cancel(entry):
+        entry[2] = None
+
+    def _run(self):
+        with self.condition:
+            while True:
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+                wait = self.heap[0][0] - perf_counter()
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                callback = heapq.heappop(self.heap)[2]
+                if callback is None:
+                    continue
+                self.condition.release()
+                try:
+                    callback()
+                except Exception:
+                    # One failing callback must not stop the others.
+                    logger.exception("Timer callback %r failed.", callback)
+                finally:
+                    self.condition.acquire()
+
+
+_timer_lock = threading.Lock()
+_timer = None
+_timer_pid = None
+
+
+def timer():
+    """This process's Timer, started on first use."""
+    global _timer, _timer_pid
+    if _timer_pid != os.getpid():
+        with _timer_lock:
+            if _timer_pid != os.getpid():
+                _timer = Timer()
+                _timer_pid = os.getpid()
+    return _timer
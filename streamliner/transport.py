@@ -0,0 +1,184 @@
+import threading
+import weakref
+from collections import deque
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.util import Finalize
+
+try:
+    import numpy as np
+except ImportError:  # Only buffer-protocol objects are transported without numpy.
+    np = None
+
+
+class SharedBuffer:
+    """Picklable handle to an array or buffer placed in a SharedMemoryPool slot."""
+
+    __slots__ = ("slot", "nbytes", "kind", "dtype", "shape")
+
+    def __init__(self, slot, nbytes, kind, dtype=None, shape=None):
+        self.slot = slot
+        self.nbytes = nbytes
+        self.kind = kind
+        self.dtype = dtype
+        self.shape = shape
+
+    def __getstate__(self):
+        return self.slot, self.nbytes, self.kind, self.dtype, self.shape
+
+    def __setstate__(self, state):
+        self.slot, self.nbytes, self.kind, self.dtype, self.shape = state
+
+
+class SharedMemoryPool:
+    """
+    Fixed-size slots carved out of shared memory segments.
+
+    Slots come in power-of-two size classes. A segment of `slots_per_segment`
+    slots is created the first time a size class runs dry, and freed slots go back
+    on the free list, so steady-state traffic allocates nothing. A slot is
+    (segment_name, offset, slot_size). Only the owning process allocates and
+    frees; other processes attach to the segments by name.
+    """
+
+    def __init__(self, min_slot_bytes=1 << 16, slots_per_segment=4):
+        self.min_slot_bytes = min_slot_bytes
+        self.slots_per_segment = slots_per_segment
+        self.segments = {}
+        self.free_slots = {}
+        self.lock = threading.Lock()
+        # multiprocessing's Finalize also runs when a child process exits.
+        self._finalizer = Finalize(
+            self, self._unlink, args=(self.segments,), exitpriority=0
+        )
+
+    def allocate(self, nbytes):
+        slot_size = max(1 << (nbytes - 1).bit_length(), self.min_slot_bytes)
+        with self.lock:
+            free_slots = self.free_slots.setdefault(slot_size, [])
+            if not free_slots:
+                segment = SharedMemory(
+                    create=True, size=slot_size * self.slots_per_segment
+                )
+                self.segments[segment.name] = segment
+                free_slots.extend(
+                    (segment.name, i * slot_size, slot_size)
+                    for i in reversed(range(self.slots_per_segment))
+                )
+            return free_slots.pop()
+
+    def free(self, slot):
+        with self.lock:
+            self.free_slots[slot[2]].append(slot)
+
+    def buffer(self, segment_name):
+        return self.segments[segment_name].buf
+
+    def close(self):
+        self._finalizer()
+
+    @staticmethod
+    def _unlink(segments):
+        for segment in segments.values():
+            try:
+                segment.close()
+            except BufferError:
+                pass  # A view is still alive; unlinking still frees the segment.
+            segment.unlink()
+        segments.clear()
+
+
+class SharedMemoryTransport:
+    """
+    Moves large arrays and buffers between processes through shared memory.
+
+    `export` copies every NumPy array or bytes-like object of at least
+    `min_bytes` found in (nested tuples, lists and dicts of) an object into a
+    pooled slot and swaps it for a SharedBuffer handle, so only handles are
+    pickled. `load` swaps handles back for NumPy arrays that map the slot
+    directly. Bytes-like objects come back as their own type; memoryviews map
+    the slot directly unless their release is tracked, in which case they are
+    copied, since slices of them would not keep the slot alive.
+
+    Slot lifetime is explicit. The exporter keeps a slot until the receiver
+    signals it is done with it. For call arguments, that signal is the reply. For
+    results, it is `released`, which collects the slots whose loaded views were
+    garbage collected so they can be handed back to the exporting process.
+    """
+
+    def __init__(self, min_bytes=1 << 16):
+        self.min_bytes = min_bytes
+        self.pool = SharedMemoryPool(min_slot_bytes=min_bytes)
+        self.attachments = {}
+        self.released = deque()
+
+    def export(self, obj, slots):
+        if isinstance(obj, tuple):
+            return tuple(self.export(item, slots) for item in obj)
+        if isinstance(obj, list):
+            return [self.export(item, slots) for item in obj]
+        if isinstance(obj, dict):
+            return {key: self.export(value, slots) for key, value in obj.items()}
+
+        if np is not None and isinstance(obj, np.ndarray):
+            if obj.nbytes < self.min_bytes or obj.dtype.hasobject:
+                return obj
+            slot = self.pool.allocate(obj.nbytes)
+            shared = np.ndarray(
+                obj.shape, obj.dtype, buffer=self.pool.buffer(slot[0]), offset=slot[1]
+            )
+            shared[...] = obj
+            slots.append(slot)
+            return SharedBuffer(slot, obj.nbytes, "ndarray", obj.dtype.str, obj.shape)
+
+        if isinstance(obj, (bytes, bytearray, memoryview)):
+            view = memoryview(obj)
+            if view.nbytes < self.min_bytes or not view.c_contiguous:
+                return obj
+            slot = self.pool.allocate(view.nbytes)
+            self.pool.buffer(slot[0])[slot[1] : slot[1] + view.nbytes] = view.cast("B")
+            slots.append(slot)
+            return SharedBuffer(slot, view.nbytes, type(obj).__name__)
+
+        return obj
+
+    def load(self, obj, track_release=False):
+        if isinstance(obj, tuple):
+            return tuple(self.load(item, track_release) for item in obj)
+        if isinstance(obj, list):
+            return [self.load(item, track_release) for item in obj]
+        if isinstance(obj, dict):
+            return {key: self.load(value, track_release) for key, value in obj.items()}
+        if not isinstance(obj, SharedBuffer):
+            return obj
+
+        segment_name, offset, _ = obj.slot
+        if segment_name not in self.attachments:
+            self.attachments[segment_name] = SharedMemory(name=segment_name)
+        buffer = self.attachments[segment_name].buf
+
+        if obj.kind == "ndarray":
+            loaded = np.ndarray(obj.shape, obj.dtype, buffer=buffer, offset=offset)
+        elif obj.kind == "memoryview" and not track_release:
+            return buffer[offset : offset + obj.nbytes]
+        else:
+            data = buffer[offset : offset + obj.nbytes]
+            if obj.kind == "memoryview":
+                loaded = memoryview(bytes(data))
+            else:
+                loaded = (bytes if obj.kind == "bytes" else bytearray)(data)
+            if track_release:
+                self.released.append(obj.slot)
+            return loaded
+
+        if track_release:
+            weakref.finalize(loaded, self.released.append, obj.slot)
+        return loaded
+
+    def take_released(self):
+        released = []
+        while self.released:
+            released.append(self.released.popleft())
+        return released
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,420 @@
+import itertools
+import math
+import numbers
+from collections import deque
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+from multiprocessing.reduction import ForkingPickler
+from queue import PriorityQueue
+from threading import Lock, Thread
+from time import perf_counter, time
+
+from .batching import batch_policies
+from .channel import REPLY_HEADER
+from .errors import encode_error
+from .timer import timer
+from .profiling import WorkerProfiler
+
+PROFILE_POLL_SECONDS = 0.1
+
+
+def check_number(name, value):
+    """Return value if it is None or a real number, else raise ValueError."""
+    if value is None:
+        return value
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        raise ValueError(f"{name} must be a number, got {value!r}.")
+    if math.isnan(value):
+        raise ValueError(f"{name} must not be NaN.")
+    return value
+
+
+def reconstruct_and_call(fleet, call_dict):
+    model_name = call_dict["model_name"]
+    method_name = call_dict["method_name"]
+    args = call_dict["args"]
+    kwargs = call_dict["kwargs"]
+
+    if method_name:
+        result = getattr(fleet[model_name], method_name)(*args, **kwargs)
+    else:
+        result = fleet[model_name](*args, **kwargs)
+
+    return result
+
+
+class WorkerConnection:
+    """A caller's connection to a worker, with the state its requests share."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.send_lock = Lock()
+        self.exported = set()  # Result slots the caller has yet to release.
+        self.unanswered = set()
+        self.cancelled = set()
+
+    def cancel(self, request_id):
+        with self.send_lock:
+            if request_id in self.unanswered:
+                self.cancelled.add(request_id)
+
+
+class WorkerRequest:
+    def __init__(self, connection, request_id, op, call_dict, transport=None):
+        self.connection = connection
+        self.request_id = request_id
+        self.op = op
+        self.call_dict = call_dict
+        self.transport = transport
+        self.received = perf_counter()
+        options = call_dict if isinstance(call_dict, dict) else {}
+        self.priority = check_number("priority", options.get("priority")) or 0
+        self.deadline = check_number("deadline", options.get("deadline"))
+
+    def expired(self):
+        return self.deadline is not None and time() > self.deadline
+
+    def cancelled(self):
+        return self.request_id in self.connection.cancelled
+
+    def reply(self, ok, payload):
+        try:
+            if ok and self.transport is not None:
+                slots = []
+                payload = self.transport.export(payload, slots)
+                self.connection.exported.update(slots)
+            message = ForkingPickler.dumps(payload if ok else encode_error(payload))
+        except Exception as e:
+            ok = False
+            error = RuntimeError(f"Unable to send reply: {e!r}")
+            message = ForkingPickler.dumps(encode_error(error))
+        with self.connection.send_lock:
+            self.connection.unanswered.discard(self.request_id)
+            self.connection.cancelled.discard(self.request_id)
+            try:
+                self.connection.conn.send_bytes(REPLY_HEADER.pack(self.request_id, ok))
+                self.connection.conn.send_bytes(message)
+            except (EOFError, OSError):
+                pass  # The caller's process has gone away.
+
+
+class RequestQueue:
+    """
+    Pending requests, highest priority first and in arrival order within one.
+
+    A call_dict may carry a "priority" (any number, default 0) and a "deadline"
+    (a time.time() timestamp). None, the stop signal, is served after everything
+    already queued.
+    """
+
+    def __init__(self):
+        self.queue = PriorityQueue()
+        self.arrivals = itertools.count()
+
+    def put(self, request):
+        priority = float("-inf") if request is None else request.priority
+        self.queue.put((-priority, next(self.arrivals), request))
+
+    def get(self, timeout=None):
+        return self.queue.get(timeout=timeout)[2]
+
+
+class DeviceWorker:
+    """
+    Serves one device of a MultiDeviceFleet.
+
+    Background threads read requests from the fleet's pipe and from every
+    process that connects to the worker's listener into one local queue, so the
+    queue stays full while a model runs. The main thread executes calls, highest
+    priority first, batching them where the model's config allows. Calls whose
+    deadline has passed are answered with a TimeoutError instead of run, and
+    calls cancelled by their caller with a CancelledError. Builds
+    requested ahead of traffic run on a small thread pool so several models can
+    load at once.
+
+    With a FleetStats, time spent queued, executing and replying is recorded per
+    model under `device_position`. With a GraphRunner, "graph" requests run the
+    fleet's registered graphs on their own threads, since they wait on calls to
+    this and other workers.
+
+    A "profile" request runs a WorkerProfiler over the calls that follow and is
+    answered with the profile when it is done. Only while it runs are `_execute`
+    and `_record` swapped for profiled versions, so an unprofiled worker pays
+    nothing. Calls are counted in `profiled_calls` when the fleet shares one, so
+    a profile of N calls ends once the fleet's workers have served N between
+    them.
+    """
+
+    def __init__(
+        self,
+        fleet,
+        conn,
+        authkey,
+        transport=None,
+        build_threads=4,
+        stats=None,
+        device_position=None,
+        graph_runner=None,
+        graph_threads=8,
+        profiled_calls=None,
+    ):
+        self.fleet = fleet
+        self.conn = conn
+        self.transport = transport
+        self.policies = batch_policies(fleet.model_builder.config)
+        self.requests = RequestQueue()
+        self.listener = Listener(authkey=authkey)
+        self.build_executor = ThreadPoolExecutor(build_threads)
+        self.stats = stats
+        self.device_position = device_position
+        self.graph_runner = graph_runner
+        self.graph_executor = (
+            ThreadPoolExecutor(graph_threads) if graph_runner is not None else None
+        )
+        self.profiling = None  # The "profile" request being served.
+        self.profiled_calls = profiled_calls
+
+    def run(self):
+        self._start_daemon(self._accept_connections)
+        self._start_daemon(self._read_requests, self.conn, True)
+        self.conn.send(self.listener.address)
+
+        held = deque()
+        while True:
+            request = held.popleft() if held else self._next_request()
+            if request is None:
+                break
+            if request.expired() or request.cancelled():
+                self._drop(request)
+            elif request.op == "build":
+                self.build_executor.submit(self._build, request)
+            elif request.op == "graph":
+                self.graph_executor.submit(self._run_graph, request)
+            elif request.op == "profile":
+                self._profile(request)
+            else:
+                held.extend(self._execute(request))
+
+        self.listener.close()
+        self.build_executor.shutdown()
+        if self.graph_executor is not None:
+            self.graph_executor.shutdown(wait=False)
+        if self.transport is not None:
+            self.transport.close()
+
+    def _execute(self, request):
+        """Run a call, or a batch starting with it; return requests held back."""
+        policy = self.policies.get(request.call_dict["model_name"])
+        if policy is None or not policy.accepts(request.call_dict):
+            start = perf_counter()
+            try:
+                results = reconstruct_and_call(self.fleet, request.call_dict)
+            except Exception as e:
+                ok, results = False, e
+            else:
+                ok = True
+            executed = perf_counter()
+            request.reply(ok, results)
+            self._record([request], start, executed)
+            return []
+
+        batch, held_back = [request], []
+        start = perf_counter()
+        try:
+            batch, held_back = policy.gather(request, self._next_request)
+            start = perf_counter()
+            model = self.fleet[request.call_dict["model_name"]]
+            results = policy.execute(model, [r.call_dict for r in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+            ok = False
+        else:
+            ok = True
+        executed = perf_counter()
+        for batched_request, result in zip(batch, results):
+            batched_request.reply(ok, result)
+        self._record(batch, start, executed)
+        return held_back
+
+    def _execute_profiled(self, request):
+        profiler = self.profiling.profiler
+        call_dict = request.call_dict
+        with profiler.measure(call_dict["model_name"], call_dict["method_name"]):
+            held_back = DeviceWorker._execute(self, request)
+        if profiler.done():
+            self._stop_profile()
+        return held_back
+
+    def _record_profiled(self, batch, start, executed):
+        DeviceWorker._record(self, batch, start, executed)
+        call_dict = batch[0].call_dict
+        self.profiling.profiler.count(
+            call_dict["model_name"],
+            call_dict["method_name"],
+            len(batch),
+            perf_counter() - start,
+        )
+
+    def _profile(self, request):
+        """Start a profile, or check on it when its request comes back.
+
+        The request is put back on the queue at the deadline, and while counting
+        calls every PROFILE_POLL_SECONDS, since calls served by other workers can
+        finish it. Checking here rather than on the timer thread means the
+        profiler is only touched by this thread.
+        """
+        if hasattr(request, "profiler"):
+            if self.profiling is request:
+                profiler = request.profiler
+                if profiler.done() or profiler.remaining() == 0:
+                    self._stop_profile()
+                else:
+                    self._check_profile_later(request)
+            return
+        if self.profiling is not None:
+            request.reply(False, RuntimeError("The worker is already profiling."))
+            return
+        try:
+            request.profiler = WorkerProfiler(
+                **request.call_dict, shared_calls=self.profiled_calls
+            )
+        except Exception as e:
+            request.reply(False, e)
+            return
+        self.profiling = request
+        self._execute = self._execute_profiled
+        self._record = self._record_profiled
+        self._check_profile_later(request)
+
+    def _check_profile_later(self, request):
+        profiler = request.profiler
+        delay = profiler.remaining()
+        if profiler.calls is not None:
+            delay = (
+                PROFILE_POLL_SECONDS
+                if delay is None
+                else min(delay, PROFILE_POLL_SECONDS)
+            )
+        if delay is not None:
+            timer().call_later(delay, lambda: self.requests.put(request))
+
+    def _stop_profile(self):
+        request, self.profiling = self.profiling, None
+        del self._execute
+        del self._record
+        request.reply(True, request.profiler.stop())
+
+    def _next_request(self, timeout=None):
+        """Return the next live request, dropping cancelled and expired ones."""
+        end = None if timeout is None else perf_counter() + timeout
+        while True:
+            request = self.requests.get(
+                timeout=None if end is None else max(end - perf_counter(), 0)
+            )
+            if request is None or not (request.expired() or request.cancelled()):
+                return request
+            self._drop(request)
+
+    def _drop(self, request):
+        if request.cancelled():
+            request.reply(False, CancelledError())
+            return
+        request.reply(
+            False, TimeoutError("Deadline passed before the call could run.")
+        )
+        if self.stats is not None:
+            model_name = request.call_dict.get("model_name")
+            self.stats.record_shed(self.device_position, model_name)
+
+    def _record(self, batch, start, executed):
+        if self.stats is None:
+            return
+        replied = perf_counter()
+        exec_seconds = executed - start
+        reply_seconds = (replied - executed) / len(batch)
+        for request in batch:
+            self.stats.record(
+                self.device_position,
+                request.call_dict["model_name"],
+                ("queue", "exec", "reply"),
+                (start - request.received, exec_seconds, reply_seconds),
+                busy_seconds=exec_seconds if request is batch[0] else 0.0,
+            )
+
+    def _build(self, request):
+        try:
+            self.fleet.load_model(request.call_dict)
+        except Exception as e:
+            request.reply(False, e)
+        else:
+            request.reply(True, None)
+
+    def _run_graph(self, request):
+        try:
+            result = self.graph_runner.run(
+                request.call_dict["name"], request.call_dict["inputs"]
+            )
+        except Exception as e:
+            request.reply(False, e)
+        else:
+            request.reply(True, result)
+
+    @staticmethod
+    def _start_daemon(target, *args):
+        thread = Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    def _accept_connections(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except AuthenticationError:
+                continue
+            except OSError:
+                break
+            self._start_daemon(self._read_requests, conn, False)
+
+    def _read_requests(self, conn, is_main_conn):
+        connection = WorkerConnection(conn)
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                message = None
+            if message is None:
+                # Only the fleet's own pipe can stop the worker.
+                if is_main_conn:
+                    self.requests.put(None)
+                break
+
+            request_id, op, payload = message
+            if op == "release":
+                for slot in payload:
+                    connection.exported.discard(slot)
+                    self.transport.pool.free(slot)
+                continue
+            if op == "cancel":
+                connection.cancel(payload)
+                continue
+            if op == "peers":
+                if self.graph_runner is not None:
+                    self.graph_runner.connect(payload)
+                continue
+            if self.transport is not None:
+                payload = self.transport.load(payload)
+            connection.unanswered.add(request_id)
+            try:
+                request = WorkerRequest(
+                    connection, request_id, op, payload, self.transport
+                )
+            except ValueError as e:
+                # Answer a malformed request here rather than stop reading.
+                WorkerRequest(connection, request_id, op, None).reply(False, e)
+                continue
+            self.requests.put(request)
+
+        if self.transport is not None:
+            for slot in list(connection.exported):
+                self.transport.pool.free(slot)
@@ -0,0 +1,129 @@
+import hashlib
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from streamliner.model_builder import DirectoryBuilder, HTTPBuilder, RemoteBuilder
+from streamliner.registry import register as REGISTER
+
+WEIGHTS = b"weights" * 1000
+
+
+@REGISTER
+class WeightsFileModel:
+    def __init__(self, weights, device=0):
+        self.weights = Path(weights).read_bytes()
+
+
+def sha256(data):
+    return "sha256:" + hashlib.sha256(data).hexdigest()
+
+
+def model_config(model_dir, checksum=None):
+    model_cfg = {
+        "model_class": "WeightsFileModel",
+        "init_files": {"weights": "weights.bin"},
+    }
+    if checksum is not None:
+        model_cfg["checksums"] = {"weights": checksum}
+    return {"model_dir": str(model_dir), "models": {"model": model_cfg}}
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    source_dir = tmp_path / "source"
+    (source_dir / "model").mkdir(parents=True)
+    (source_dir / "model" / "weights.bin").write_bytes(WEIGHTS)
+    return source_dir
+
+
+@pytest.fixture
+def http_url(source_dir):
+    handler = partial(SimpleHTTPRequestHandler, directory=str(source_dir))
+    handler.log_message = lambda *args: None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def directory_builder(tmp_path, source_dir, checksum=None):
+    config = model_config(tmp_path / "models", checksum)
+    return DirectoryBuilder(config, source_dir, cache_dir=tmp_path / "cache")
+
+
+def http_builder(tmp_path, url, checksum=None):
+    config = model_config(tmp_path / "models", checksum)
+    return HTTPBuilder(config, url, cache_dir=tmp_path / "cache")
+
+
+@pytest.mark.parametrize("checksum", [None, sha256(WEIGHTS)])
+def test_directory_builder_fetches_missing_files(tmp_path, source_dir, checksum):
+    model = directory_builder(tmp_path, source_dir, checksum).build("model")
+    assert model.weights == WEIGHTS
+    assert (tmp_path / "models" / "model" / "weights.bin").read_bytes() == WEIGHTS
+
+
+@pytest.mark.parametrize("checksum", [None, sha256(WEIGHTS)])
+def test_http_builder_fetches_missing_files(tmp_path, http_url, checksum):
+    model = http_builder(tmp_path, http_url, checksum).build("model")
+    assert model.weights == WEIGHTS
+
+
+def test_directory_builder_rejects_checksum_mismatch(tmp_path, source_dir):
+    builder = directory_builder(tmp_path, source_dir, sha256(b"other weights"))
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        builder.build("model")
+    assert not (tmp_path / "models" / "model" / "weights.bin").exists()
+
+
+def test_http_builder_rejects_checksum_mismatch(tmp_path, http_url):
+    builder = http_builder(tmp_path, http_url, sha256(b"other weights"))
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        builder.build("model")
+    assert not (tmp_path / "models" / "model" / "weights.bin").exists()
+
+
+def test_intact_file_on_disk_is_not_fetched(tmp_path, source_dir):
+    model_path = tmp_path / "models" / "model" / "weights.bin"
+    model_path.parent.mkdir(parents=True)
+    model_path.write_bytes(WEIGHTS)
+    (source_dir / "model" / "weights.bin").unlink()
+    builder = directory_builder(tmp_path, source_dir, sha256(WEIGHTS))
+    assert builder.build("model").weights == WEIGHTS
+
+
+def test_corrupted_file_on_disk_is_fetched_again(tmp_path, http_url):
+    builder = http_builder(tmp_path, http_url, sha256(WEIGHTS))
+    builder.build("model")
+    model_path = tmp_path / "models" / "model" / "weights.bin"
+    # Truncating in place also corrupts the cached copy it is linked to.
+    with open(model_path, "r+b") as file:
+        file.truncate(10)
+    assert builder.build("model").weights == WEIGHTS
+    assert model_path.read_bytes() == WEIGHTS
+
+
+def test_subclass_may_override_acquire_files_alone(tmp_path):
+    class CopyingBuilder(RemoteBuilder):
+        def _acquire_files(self, model_name, files):
+            for file_name in files.values():
+                path = Path(self.config["model_dir"]) / model_name / file_name
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(WEIGHTS)
+
+    config = model_config(tmp_path / "models")
+    builder = CopyingBuilder(config, cache_dir=tmp_path / "cache")
+    assert builder.build("model").weights == WEIGHTS
+
+
+def test_subclass_must_fetch_files_somehow(tmp_path):
+    class IncompleteBuilder(RemoteBuilder):
+        pass
+
+    with pytest.raises(TypeError, match="_fetch_file or _acquire_files"):
+        IncompleteBuilder(model_config(tmp_path / "models"))
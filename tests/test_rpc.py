@@ -0,0 +1,127 @@
+import threading
+from concurrent.futures import CancelledError
+
+import numpy as np
+import pytest
+
+from streamliner.errors import RemoteError
+from streamliner.rpc import RPCClient, RPCServer
+
+
+class ShapeError(Exception):
+    def __init__(self, expected, got):
+        super().__init__(f"expected {expected}, got {got}")
+
+
+release = threading.Event()
+
+
+def fleet_callable(call_dict):
+    method_name = call_dict["method_name"]
+    args = call_dict["args"]
+    if method_name == "fail":
+        raise ValueError(*args)
+    if method_name == "shape":
+        raise ShapeError(*args)
+    if method_name == "wait":
+        release.wait(10)
+    if method_name == "as_set":
+        return set(args)
+    return args[0] if args else None
+
+
+def call(client, method_name, *args):
+    call_dict = {"model_name": "m", "method_name": method_name, "args": args}
+    return client({**call_dict, "kwargs": {}})
+
+
+def submit(client, method_name, *args):
+    call_dict = {"model_name": "m", "method_name": method_name, "args": args}
+    return client.submit({**call_dict, "kwargs": {}})
+
+
+@pytest.fixture
+def server():
+    server = RPCServer(fleet_callable).start()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def client(server):
+    client = RPCClient(server.address, pool_size=1)
+    yield client
+    client.close()
+
+
+def test_round_trips_native_values_and_arrays(client):
+    value = {"n": None, "b": True, "i": -3, "f": 1.5, "s": "é", "t": (1, [b"x"])}
+    assert call(client, "echo", value) == value
+    array = np.arange(24, dtype=np.float32).reshape(2, 3, 4)
+    result = call(client, "echo", array)
+    assert result.dtype == array.dtype
+    np.testing.assert_array_equal(result, array)
+    np.testing.assert_array_equal(call(client, "echo", array[:, ::2]), array[:, ::2])
+
+
+def test_pipelines_calls_on_one_connection(client):
+    futures = [submit(client, "echo", i) for i in range(100)]
+    assert [future.result(5) for future in futures] == list(range(100))
+
+
+def test_errors_come_back_without_pickle(client):
+    with pytest.raises(ValueError, match="bad input"):
+        call(client, "fail", "bad input")
+    with pytest.raises(RemoteError, match="ShapeError: expected 3, got 4"):
+        call(client, "shape", 3, 4)
+    assert call(client, "echo", 1) == 1
+
+
+def test_server_refuses_pickled_requests(client):
+    with pytest.raises(TypeError, match="Pickled values are not accepted"):
+        call(client, "echo", {1, 2})
+    assert call(client, "echo", 2) == 2
+
+
+def test_client_refuses_pickled_replies(server, client):
+    with pytest.raises(TypeError, match="Pickled values are not accepted"):
+        call(client, "as_set", 1)
+    pickling_client = RPCClient(server.address, allow_pickle=True)
+    try:
+        assert call(pickling_client, "as_set", 1) == {1}
+    finally:
+        pickling_client.close()
+
+
+def test_cancelled_call_leaves_connection_usable(client):
+    release.clear()
+    future = submit(client, "wait")
+    assert future.cancel()
+    release.set()
+    with pytest.raises(CancelledError):
+        future.result()
+    assert submit(client, "echo", 3).result(5) == 3
+    assert not client.connections[0].closed
+
+
+def test_oversized_reply_closes_connection(server):
+    client = RPCClient(server.address, pool_size=1, max_frame_bytes=1024)
+    try:
+        assert call(client, "echo", b"x" * 100) == b"x" * 100
+        with pytest.raises(RuntimeError, match="closed"):
+            call(client, "echo", b"x" * 2048)
+        assert call(client, "echo", 4) == 4  # On a new connection.
+    finally:
+        client.close()
+
+
+def test_server_closes_connection_on_oversized_request():
+    server = RPCServer(fleet_callable, max_frame_bytes=1024).start()
+    client = RPCClient(server.address, pool_size=1)
+    try:
+        with pytest.raises(RuntimeError, match="closed"):
+            call(client, "echo", b"x" * 2048)
+        assert call(client, "echo", 5) == 5
+    finally:
+        client.close()
+        server.close()